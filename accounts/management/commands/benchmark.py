@@ -0,0 +1,118 @@
+import json
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from healthcare import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the hot request paths (searches, doctor detail, booking, dashboards, hospital '
+        'admin lists) with the test client: p50/p95 latency, queries and allocations per request. '
+        'By default a throwaway test database is created and filled with seed_load; --existing '
+        'uses the configured database and its seed_load data instead.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=30, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests before timing')
+        parser.add_argument('--alloc-rounds', type=int, default=5,
+                            help='Extra requests traced with tracemalloc (0 = skip allocations)')
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=sorted(benchmark.SCENARIOS),
+                            help='Run only this scenario (repeatable)')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--compare', help='JSON file of an earlier run to compare against')
+        parser.add_argument('--existing', action='store_true',
+                            help='Use the configured database (already seeded with seed_load)')
+        parser.add_argument('--prefix', default='load', help='seed_load prefix of the benchmark subjects')
+        # Size of the throwaway data set
+        parser.add_argument('--hospitals', type=int, default=100)
+        parser.add_argument('--doctors', type=int, default=1000)
+        parser.add_argument('--patients', type=int, default=5000)
+        parser.add_argument('--appointments', type=int, default=25000)
+        parser.add_argument('--admissions', type=int, default=2500)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = json.loads(Path(options['compare']).read_text())['results']
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f'Cannot read {options["compare"]}: {exc}')
+
+        try:
+            setup_test_environment()
+            own_environment = True
+        except RuntimeError:
+            # Already set up (called from the test runner)
+            own_environment = False
+        old_name = None
+        try:
+            if not options['existing']:
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                self.stdout.write('Seeding the benchmark database...')
+                call_command(
+                    'seed_load', prefix=options['prefix'], seed=options['seed'],
+                    hospitals=options['hospitals'], doctors=options['doctors'], patients=options['patients'],
+                    appointments=options['appointments'], admissions=options['admissions'],
+                    stdout=self.stdout,
+                )
+            # Measure the application, not the per-request SQL profiler
+            with override_settings(SQL_INSTRUMENTATION=False):
+                report = self.run_benchmarks(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            if own_environment:
+                teardown_test_environment()
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
+        if baseline is not None:
+            self.write_comparison(benchmark.compare(baseline, report['results']))
+
+    def run_benchmarks(self, options):
+        try:
+            subjects = benchmark.Subjects(options['prefix'])
+        except benchmark.SubjectsMissing as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(f'{"scenario":<26}{"status":>8}{"p50 ms":>10}{"p95 ms":>10}{"queries":>9}{"peak KiB":>10}')
+
+        def progress(name, result):
+            alloc = result.get('alloc_kib', {}).get('peak', '-')
+            self.stdout.write(
+                f'{name:<26}{",".join(map(str, result["status"])):>8}{result["latency_ms"]["p50"]:>10.2f}'
+                f'{result["latency_ms"]["p95"]:>10.2f}{result["queries"]:>9}{alloc:>10}'
+            )
+
+        results = benchmark.run(
+            subjects, names=options['scenarios'], rounds=options['rounds'], warmup=options['warmup'],
+            alloc_rounds=options['alloc_rounds'], progress=progress,
+        )
+        if subjects.free_slot is None and 'book_appointment' not in results:
+            self.stdout.write(self.style.WARNING('book_appointment skipped: no free slot for the benchmark doctor.'))
+        errors = [name for name, result in results.items() if any(code >= 400 for code in result['status'])]
+        if errors:
+            self.stdout.write(self.style.ERROR(f'Scenarios with error responses: {", ".join(errors)}'))
+        return {
+            'environment': benchmark.environment(),
+            'options': {k: options[k] for k in ('rounds', 'warmup', 'alloc_rounds', 'existing', 'prefix')},
+            'dataset': None if options['existing'] else {
+                k: options[k] for k in ('hospitals', 'doctors', 'patients', 'appointments', 'admissions', 'seed')
+            },
+            'results': results,
+        }
+
+    def write_comparison(self, rows):
+        self.stdout.write('')
+        self.stdout.write(f'{"scenario":<26}{"metric":<9}{"before":>10}{"after":>10}{"change":>9}')
+        for name, metric, before, after, change in rows:
+            style = self.style.ERROR if change > 10 else self.style.SUCCESS if change < -10 else str
+            self.stdout.write(style(f'{name:<26}{metric:<9}{before:>10}{after:>10}{change:>8}%'))
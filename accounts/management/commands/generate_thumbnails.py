@@ -0,0 +1,41 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from healthcare import thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the WebP/JPEG thumbnails of profile pictures and hospital logos uploaded '
+        'before renditions were created on upload. Images that already have them are skipped '
+        'unless --force is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate existing renditions too')
+
+    def handle(self, *args, **options):
+        created = skipped = failed = 0
+        for label, field_name in thumbnails.FIELDS.items():
+            model = apps.get_model(label)
+            field = model._meta.get_field(field_name)
+            names = (
+                model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True).distinct().iterator()
+            )
+            for name in names:
+                # Only name and storage are used: no need to load the rows
+                fieldfile = field.attr_class(None, field, name)
+                if not options['force'] and fieldfile.storage.exists(thumbnails.rendition_name(name, thumbnails.SIZES[-1], 'jpg')):
+                    skipped += 1
+                    continue
+                try:
+                    thumbnails.generate(fieldfile)
+                except ValueError as exc:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(str(exc)))
+                    continue
+                created += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated thumbnails for {created} image(s); {skipped} already had them, {failed} could not be read.'
+        ))
@@ -0,0 +1,311 @@
+import math
+import random
+import time as clock
+from datetime import time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from appointments.models import Appointment
+from doctors.models import DoctorProfile, DoctorLeave
+from documents.metadata import inspect_stored
+from documents.models import Document
+from hospitals.models import Hospital, Department, DoctorHospitalAssignment, Admission, HospitalReview
+from patients.models import PatientProfile
+
+FIRST_NAMES = [
+    'Aarav', 'Vivaan', 'Aditya', 'Arjun', 'Ishaan', 'Kabir', 'Rohan', 'Dev', 'Kiran', 'Neel',
+    'Ananya', 'Diya', 'Isha', 'Kavya', 'Meera', 'Nisha', 'Pooja', 'Riya', 'Saanvi', 'Tara',
+]
+LAST_NAMES = [
+    'Patel', 'Shah', 'Mehta', 'Desai', 'Joshi', 'Trivedi', 'Iyer', 'Nair', 'Reddy', 'Rao',
+    'Sharma', 'Verma', 'Gupta', 'Singh', 'Kumar', 'Das', 'Bose', 'Khan', 'Pillai', 'Menon',
+]
+CITIES = [
+    ('Ahmedabad', 'Gujarat'), ('Surat', 'Gujarat'), ('Vadodara', 'Gujarat'), ('Mumbai', 'Maharashtra'),
+    ('Pune', 'Maharashtra'), ('Bengaluru', 'Karnataka'), ('Chennai', 'Tamil Nadu'), ('Hyderabad', 'Telangana'),
+    ('Delhi', 'Delhi'), ('Jaipur', 'Rajasthan'), ('Kolkata', 'West Bengal'), ('Kochi', 'Kerala'),
+]
+DEPARTMENTS = [
+    'Emergency', 'ICU', 'Cardiology', 'Neurology', 'Orthopedics', 'Pediatrics', 'Oncology',
+    'Radiology', 'Dermatology', 'Gynecology', 'General Medicine', 'General Surgery', 'Psychiatry',
+    'Nephrology', 'Pathology', 'Physiotherapy',
+]
+REASONS = ['Routine checkup', 'Follow-up', 'Chest pain', 'Back pain', 'Fever', 'Skin rash', 'Headache', 'Consultation']
+# Weights of 1..5 star reviews
+RATING_WEIGHTS = [5, 8, 17, 35, 35]
+# Working day 09:00-17:00 in 30 minute slots (the DoctorProfile defaults)
+SLOT_TIMES = [time(9 + i // 2, 30 * (i % 2)) for i in range(16)]
+PLACEHOLDER_DOCUMENT = 'medical_documents/seed/sample-report.pdf'
+PLACEHOLDER_PDF = (
+    b'%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n'
+    b'2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n'
+    b'3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n'
+    b'trailer<</Root 1 0 R>>\n%%EOF\n'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a production-sized synthetic data set (hospitals with departments, doctors '
+        'with assignments and leave, patients, appointments in every status, admissions, '
+        'reviews and documents) with bulk_create. The same --seed gives the same data. '
+        'Meant for local performance work; do not run against production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hospitals', type=int, default=200)
+        parser.add_argument('--doctors', type=int, default=2000)
+        parser.add_argument('--patients', type=int, default=10000)
+        parser.add_argument('--appointments', type=int, default=50000,
+                            help='Approximate; slots that would double-book are skipped')
+        parser.add_argument('--admissions', type=int, default=5000, help='Finished (discharged) stays')
+        parser.add_argument('--occupancy', type=float, default=0.6,
+                            help='Average share of beds occupied by stays still running')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (same seed, same data)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--prefix', default='load',
+                            help='Prefix of generated usernames and registration numbers')
+        parser.add_argument('--password', default='load123', help='Password of every generated user')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = prefix = options['prefix']
+        if options['hospitals'] < 1 or options['doctors'] < 1 or options['patients'] < 1:
+            raise CommandError('--hospitals, --doctors and --patients must be at least 1.')
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Users prefixed "{prefix}_" already exist; pass another --prefix.')
+
+        self.now = timezone.now().replace(second=0, microsecond=0)
+        self.today = timezone.localdate(self.now)
+        self.password = make_password(options['password'])
+        started = clock.perf_counter()
+
+        with transaction.atomic():
+            self.users('ADMIN', 1)
+            hospitals = self.create_hospitals(options['hospitals'])
+            doctors = self.create_doctors(options['doctors'], hospitals)
+            patients = self.create_patients(options['patients'])
+            leave = self.create_leave(doctors)
+            appointments = self.create_appointments(options['appointments'], doctors, patients, leave)
+            admissions = self.create_admissions(options['admissions'], options['occupancy'], hospitals, doctors, patients)
+            reviews = self.create_reviews(appointments)
+            documents = self.create_documents(appointments)
+
+            # bulk_create skips save() and signals: rebuild the stored counters
+            Hospital.reconcile_occupied_beds(now=self.now)
+            Hospital.recompute_ratings()
+        call_command('rebuild_search_index', stdout=self.stdout)
+
+        elapsed = clock.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(hospitals)} hospitals, {len(doctors)} doctors, {len(patients)} patients, '
+            f'{len(appointments)} appointments, {len(admissions)} admissions, {len(reviews)} reviews '
+            f'and {len(documents)} documents in {elapsed:.1f}s.'
+        ))
+        self.stdout.write(f'Every generated user has the password "{options["password"]}".')
+
+    def bulk(self, model, objs):
+        return model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+    def name(self):
+        return self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+
+    def users(self, role, count):
+        users = []
+        for i in range(count):
+            first, last = self.name()
+            username = f'{self.prefix}_{role.lower()}_{i}'
+            users.append(User(
+                username=username, email=f'{username}@example.com', password=self.password,
+                first_name=first, last_name=last, role=role, is_approved=True, is_staff=role == 'ADMIN',
+                phone_number=f'9{self.rng.randrange(10 ** 9):09d}',
+            ))
+        return self.bulk(User, users)
+
+    def create_hospitals(self, count):
+        departments = []
+        for name in DEPARTMENTS:
+            department, _ = Department.objects.get_or_create(key=Department.normalize(name), defaults={'name': name})
+            departments.append(department)
+
+        users = self.users('HOSPITAL', count)
+        hospitals = []
+        for i, user in enumerate(users):
+            city, state = self.rng.choice(CITIES)
+            hospitals.append(Hospital(
+                user=user, name=f'{self.rng.choice(LAST_NAMES)} {self.rng.choice(["General", "City", "Care", "Memorial"])} Hospital {i}',
+                registration_number=f'{self.prefix.upper()}-H{i:06d}', city=city, state=state,
+                address=f'{self.rng.randint(1, 400)} Main Road, {city}', total_beds=self.rng.choice([10, 20, 30, 50, 100]),
+            ))
+        hospitals = self.bulk(Hospital, hospitals)
+
+        through = Hospital.departments.through
+        self.bulk(through, [
+            through(hospital_id=hospital.pk, department_id=department.pk)
+            for hospital in hospitals
+            for department in self.rng.sample(departments, self.rng.randint(3, 8))
+        ])
+        return hospitals
+
+    def create_doctors(self, count, hospitals):
+        users = self.users('DOCTOR', count)
+        specializations = [code for code, _ in DoctorProfile.SPECIALIZATION_CHOICES]
+        doctors = self.bulk(DoctorProfile, [
+            DoctorProfile(
+                user=user, license_number=f'{self.prefix.upper()}-D{i:06d}',
+                specialization=self.rng.choice(specializations), qualification=self.rng.choice(['MBBS', 'MBBS, MD', 'MBBS, MS']),
+                years_of_experience=self.rng.randint(1, 35), consultation_fee=self.rng.choice([300, 500, 800, 1200]),
+                hospital=self.rng.choice(hospitals),
+            )
+            for i, user in enumerate(users)
+        ])
+        # A third of the doctors also consult at a second hospital
+        assignments = []
+        for doctor in doctors:
+            if len(hospitals) > 1 and self.rng.random() < 0.33:
+                other = self.rng.choice([h for h in self.rng.sample(hospitals, 2) if h.pk != doctor.hospital_id])
+                assignments.append(DoctorHospitalAssignment(
+                    doctor=doctor, hospital=other, monthly_salary=self.rng.randrange(50000, 300000, 5000),
+                ))
+        self.bulk(DoctorHospitalAssignment, assignments)
+        self.hospitals_of = {doctor.pk: [doctor.hospital_id] for doctor in doctors}
+        for assignment in assignments:
+            self.hospitals_of[assignment.doctor_id].append(assignment.hospital_id)
+        return doctors
+
+    def create_patients(self, count):
+        users = self.users('PATIENT', count)
+        self.bulk(PatientProfile, [
+            PatientProfile(
+                user=user, gender=self.rng.choice('MF'),
+                date_of_birth=self.today - timedelta(days=self.rng.randint(365, 90 * 365)),
+                blood_group=self.rng.choice(['A+', 'B+', 'O+', 'AB+', 'A-', 'O-']),
+            )
+            for user in users
+        ])
+        return users
+
+    def create_leave(self, doctors):
+        """A few upcoming leave days per doctor; {doctor pk: {date, ...}}"""
+        leave = {}
+        rows = []
+        for doctor in doctors:
+            days = {self.today + timedelta(days=d) for d in self.rng.sample(range(1, 60), self.rng.randint(0, 4))}
+            leave[doctor.pk] = days
+            rows.extend(DoctorLeave(doctor=doctor, leave_date=day) for day in days)
+        self.bulk(DoctorLeave, rows)
+        return leave
+
+    def appointment_status(self, day):
+        if day < self.today:
+            return self.rng.choices(['COMPLETED', 'CANCELLED', 'PENDING', 'CONFIRMED'], [75, 17, 4, 4])[0]
+        return self.rng.choices(['PENDING', 'CONFIRMED', 'CANCELLED'], [40, 50, 10])[0]
+
+    def create_appointments(self, count, doctors, patients, leave):
+        """Appointments over the past year and next two months, on distinct slots per doctor.
+        Active (PENDING/CONFIRMED) ones never overlap for a patient either."""
+        first_day, days = -365, 425
+        per_doctor = max(1, min(count // len(doctors), days * len(SLOT_TIMES)))
+        patient_slots = set()
+        appointments = []
+        for doctor in doctors:
+            for slot in self.rng.sample(range(days * len(SLOT_TIMES)), per_doctor):
+                day = self.today + timedelta(days=first_day + slot // len(SLOT_TIMES))
+                at = SLOT_TIMES[slot % len(SLOT_TIMES)]
+                if day in leave[doctor.pk]:
+                    continue
+                patient = self.rng.choice(patients)
+                status = self.appointment_status(day)
+                if status in Appointment.ACTIVE_STATUSES:
+                    if (patient.pk, day, at) in patient_slots:
+                        continue
+                    patient_slots.add((patient.pk, day, at))
+                appointments.append(Appointment(
+                    patient=patient, doctor_id=doctor.user_id, hospital_id=self.rng.choice(self.hospitals_of[doctor.pk]),
+                    appointment_date=day, appointment_time=at, status=status,
+                    reason=self.rng.choice(REASONS), is_emergency=self.rng.random() < 0.02,
+                    prescription='Paracetamol 500mg twice daily' if status == 'COMPLETED' else '',
+                ))
+        return self.bulk(Appointment, appointments)
+
+    def stay(self):
+        """Log-normal length of stay: median 3 days, capped at 60"""
+        return timedelta(hours=min(self.rng.lognormvariate(math.log(72), 0.8), 60 * 24))
+
+    def create_admissions(self, count, occupancy, hospitals, doctors, patients):
+        """``count`` finished stays over the past year, plus stays still running that fill
+        about ``occupancy`` of each hospital's beds (no patient holds two beds)."""
+        doctors_at = {}
+        for doctor in doctors:
+            for hospital_id in self.hospitals_of[doctor.pk]:
+                doctors_at.setdefault(hospital_id, []).append(doctor.user_id)
+        in_bed = iter(self.rng.sample(patients, len(patients)))
+        admissions = []
+
+        def admission(hospital, patient, admitted, discharged):
+            doctor_ids = doctors_at.get(hospital.pk)
+            admissions.append(Admission(
+                patient=patient, hospital=hospital,
+                doctor_id=self.rng.choice(doctor_ids) if doctor_ids else None,
+                admission_time=admitted, discharge_time=discharged,
+                expected_discharge_time=admitted + timedelta(days=self.rng.randint(1, 7)),
+            ))
+
+        for hospital in hospitals:
+            spread = min(1.0, max(0.0, self.rng.gauss(occupancy, 0.15)))
+            for _ in range(round(hospital.total_beds * spread)):
+                patient = next(in_bed, None)
+                if patient is None:
+                    break
+                stay = self.stay()
+                admitted = self.now - stay * self.rng.random()
+                # Half of the current stays have no discharge date yet
+                admission(hospital, patient, admitted, None if self.rng.random() < 0.5 else admitted + stay)
+        for _ in range(count):
+            stay = self.stay()
+            discharged = self.now - timedelta(minutes=self.rng.randint(60, 365 * 24 * 60))
+            admission(self.rng.choice(hospitals), self.rng.choice(patients), discharged - stay, discharged)
+        return self.bulk(Admission, admissions)
+
+    def create_reviews(self, appointments):
+        """One review per (hospital, patient) for about a third of the completed visits"""
+        seen = set()
+        reviews = []
+        for appointment in appointments:
+            key = (appointment.hospital_id, appointment.patient_id)
+            if appointment.status != 'COMPLETED' or key in seen or self.rng.random() >= 0.33:
+                continue
+            seen.add(key)
+            reviews.append(HospitalReview(
+                hospital_id=appointment.hospital_id, patient_id=appointment.patient_id,
+                rating=self.rng.choices(range(1, 6), RATING_WEIGHTS)[0],
+                comment=self.rng.choice(['', 'Helpful staff.', 'Long wait.', 'Clean and well organised.']),
+            ))
+        return self.bulk(HospitalReview, reviews)
+
+    def create_documents(self, appointments):
+        """Reports for a fifth of the completed visits; all rows share one placeholder PDF"""
+        if not default_storage.exists(PLACEHOLDER_DOCUMENT):
+            default_storage.save(PLACEHOLDER_DOCUMENT, ContentFile(PLACEHOLDER_PDF))
+        types = [code for code, _ in Document.DOCUMENT_TYPE_CHOICES]
+        meta = inspect_stored(default_storage, PLACEHOLDER_DOCUMENT)
+        documents = []
+        for appointment in appointments:
+            if appointment.status != 'COMPLETED' or self.rng.random() >= 0.2:
+                continue
+            document_type = self.rng.choice(types)
+            documents.append(Document(
+                patient_id=appointment.patient_id, doctor_id=appointment.doctor_id,
+                hospital_id=appointment.hospital_id, appointment=appointment,
+                document_type=document_type, title=f'{document_type.replace("_", " ").title()} {appointment.appointment_date}',
+                file=PLACEHOLDER_DOCUMENT, uploaded_by_id=appointment.doctor_id, **meta,
+            ))
+        return self.bulk(Document, documents)
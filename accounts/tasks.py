@@ -0,0 +1,11 @@
+from taskqueue.queue import task
+
+from .models import User
+
+
+@task
+def delete_rejected_user(user_id):
+    """Delete a rejected doctor/hospital account with everything that cascades from it"""
+    # Unblocking the account before this ran keeps it
+    for user in User.objects.filter(pk=user_id, is_active=False):
+        user.delete()
@@ -0,0 +1,39 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from healthcare import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail(image, size, alt='', **attrs):
+    """<picture> of an image field's renditions for a ``size`` px box.
+
+    {% thumbnail doctor.profile_picture 80 class="rounded-circle" %}
+
+    The browser picks the WebP (or JPEG) rendition matching ``size`` and the
+    screen density from ``srcset``. Images without renditions yet are shown
+    as the original; an empty field renders nothing.
+    """
+    if not image:
+        return ''
+    size = int(size)
+    extra = format_html_join('', ' {}="{}"', [(key.replace('_', '-'), value) for key, value in attrs.items()])
+    try:
+        storage, name = image.storage, image.name
+        if not thumbnails.has_renditions(storage, name):
+            return format_html('<img src="{}" alt="{}" loading="lazy"{}>', image.url, alt, extra)
+    except ValueError:
+        return ''
+
+    def srcset(ext):
+        return ', '.join(f'{storage.url(thumbnails.rendition_name(name, w, ext))} {w}w' for w in thumbnails.SIZES)
+
+    fallback = next((w for w in thumbnails.SIZES if w >= size), thumbnails.SIZES[-1])
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}px">'
+        '<img src="{}" srcset="{}" sizes="{}px" width="{}" height="{}" alt="{}" loading="lazy"{}></picture>',
+        srcset('webp'), size,
+        storage.url(thumbnails.rendition_name(name, fallback, 'jpg')), srcset('jpg'), size, size, size, alt, extra,
+    )
@@ -1,6 +1,17 @@
-from django.test import TestCase, Client
+import json
+import tempfile
+from io import BytesIO, StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 
+from healthcare import instrumentation
+from healthcare.instrumentation import QueryRecorder, fingerprint
+from healthcare.query_budgets import BUDGETS, BUDGETED_APPS, EXEMPT, QueryBudgetTestCase, route_names
 from .models import User
 
 
@@ -44,3 +55,422 @@ class DoctorDashboardPermissionTests(TestCase):
         self.client.force_login(doctor_user)
         response = self.client.get(reverse('accounts:doctor_dashboard'))
         self.assertEqual(response.status_code, 200)
+
+
+class SQLInstrumentationTests(TestCase):
+    """Per-request query recording, N+1 flagging, Server-Timing and the admin profile page."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log = Path(self.tmp.name) / 'sql.jsonl'
+        self.admin = User.objects.create_user(
+            username='admin1', email='admin@test.com', password='pass', role='ADMIN', is_approved=True,
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fingerprint_normalizes_literals(self):
+        a = fingerprint('SELECT * FROM users WHERE id = 12 AND role IN (%s, %s)')
+        b = fingerprint("SELECT *  FROM users WHERE id = 7 AND role IN (%s)")
+        self.assertEqual(a, b)
+        self.assertEqual(fingerprint("WHERE name = 'O''Brien'"), 'WHERE name = ?')
+
+    def test_recorder_flags_repeated_queries(self):
+        users = [
+            User.objects.create_user(username=f'u{i}', email=f'u{i}@test.com', password='pass')
+            for i in range(6)
+        ]
+        with QueryRecorder() as recorder:
+            for user in users:
+                User.objects.get(pk=user.pk)
+            User.objects.count()
+        self.assertEqual(recorder.count, 7)
+        (key, n, _), = recorder.repeated()
+        self.assertEqual(n, 6)
+        self.assertIn('FROM "users"', key)
+
+    def test_middleware_records_request(self):
+        with override_settings(SQL_INSTRUMENTATION=True, SQL_INSTRUMENTATION_LOG=self.log):
+            self.client.force_login(self.admin)
+            response = self.client.get(reverse('accounts:admin_dashboard'))
+            self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+')
+            record = json.loads(self.log.read_text().splitlines()[-1])
+            self.assertEqual(record['view'], 'accounts:admin_dashboard')
+            self.assertGreater(record['queries'], 0)
+
+            response = self.client.get(reverse('accounts:admin_query_profile'))
+            self.assertContains(response, 'accounts:admin_dashboard')
+
+    def test_log_is_read_backwards_and_summarized(self):
+        lines = [
+            json.dumps({'view': f'v{i % 2}', 'queries': i, 'sql_ms': 1, 'total_ms': i, 'n_plus_one': i == 9,
+                        'repeated': [{'sql': 'SELECT ?', 'count': i, 'ms': 1}]})
+            for i in range(10)
+        ]
+        lines.insert(3, 'not json')
+        self.log.write_text('\n'.join(lines) + '\n')
+        with self.settings(SQL_INSTRUMENTATION_LOG=self.log):
+            records = list(instrumentation.load_records(limit=4))
+        self.assertEqual([r['queries'] for r in records], [9, 8, 7, 6])
+
+        with open(self.log, 'rb') as fh:
+            # Lines split across small blocks are joined again
+            self.assertEqual(list(instrumentation._lines_backwards(fh, block_size=7))[1:], [line.encode() for line in reversed(lines)])
+
+        views, fingerprints = instrumentation.summarize(instrumentation.load_records(self.log, limit=None))
+        self.assertEqual([(v['view'], v['requests'], v['max_queries'], v['n_plus_one']) for v in views],
+                         [('v1', 5, 9, 1), ('v0', 5, 8, 0)])
+        self.assertEqual((fingerprints[0]['total'], fingerprints[0]['worst']), (45, 9))
+
+    def test_query_profile_is_admin_only(self):
+        patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        self.client.force_login(patient)
+        response = self.client.get(reverse('accounts:admin_query_profile'))
+        self.assertEqual(response.status_code, 302)
+
+
+class AccountsQueryBudgetTests(QueryBudgetTestCase):
+    """Every accounts page stays within its query budget and does not scale with the data"""
+    namespace = 'accounts'
+
+    def test_routes_within_budget(self):
+        self.check_budgets()
+
+
+class QueryBudgetRegistryTests(TestCase):
+    """Each route is either budgeted or explicitly exempt"""
+
+    def test_every_route_has_a_budget_or_exemption(self):
+        routes = {name for app in BUDGETED_APPS for name in route_names(app)}
+        self.assertEqual(routes - set(BUDGETS) - set(EXEMPT), set())
+        self.assertEqual((set(BUDGETS) | set(EXEMPT)) - routes, set())
+        self.assertEqual(set(BUDGETS) & set(EXEMPT), set())
+
+
+class SeedLoadCommandTests(TestCase):
+    """seed_load generates consistent, reproducible data"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def seed(self, prefix, seed=7):
+        call_command(
+            'seed_load', hospitals=3, doctors=6, patients=30, appointments=120, admissions=20,
+            seed=seed, prefix=prefix, stdout=StringIO(),
+        )
+
+    def appointments(self, prefix):
+        from appointments.models import Appointment
+        return list(
+            Appointment.objects.filter(patient__username__startswith=f'{prefix}_')
+            .order_by('pk').values_list('appointment_date', 'appointment_time', 'status')
+        )
+
+    def test_generates_related_data_with_counters(self):
+        from hospitals.models import Hospital, Admission, HospitalReview
+        self.seed('a')
+        self.assertEqual(User.objects.filter(username__startswith='a_', role='DOCTOR').count(), 6)
+        self.assertEqual(Hospital.objects.filter(registration_number__startswith='A-').count(), 3)
+        self.assertGreater(len(self.appointments('a')), 100)
+        self.assertEqual(Admission.objects.filter(discharge_time__lt=F('admission_time')).count(), 0)
+        self.assertFalse(Hospital.objects.filter(occupied_beds__gt=F('total_beds')).exists())
+        self.assertEqual(Hospital.recompute_ratings(), 0)
+        self.assertEqual(Hospital.reconcile_occupied_beds(), 0)
+        self.assertTrue(HospitalReview.objects.exists())
+
+    def test_same_seed_same_data(self):
+        self.seed('a')
+        self.seed('b')
+        self.seed('c', seed=8)
+        self.assertEqual(self.appointments('a'), self.appointments('b'))
+        self.assertNotEqual(self.appointments('a'), self.appointments('c'))
+
+    def test_refuses_existing_prefix(self):
+        self.seed('a')
+        with self.assertRaises(CommandError):
+            self.seed('a')
+
+
+class BenchmarkCommandTests(TestCase):
+    """The benchmark runs every scenario against seed_load data and writes JSON"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.media = tempfile.TemporaryDirectory()
+        with override_settings(MEDIA_ROOT=cls.media.name):
+            call_command(
+                'seed_load', hospitals=3, doctors=6, patients=30, appointments=120, admissions=20,
+                prefix='bench', stdout=StringIO(),
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media.cleanup()
+
+    def test_writes_results_for_every_scenario(self):
+        from appointments.models import Appointment
+        from healthcare.benchmark import SCENARIOS
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / 'bench.json'
+            call_command(
+                'benchmark', existing=True, prefix='bench', rounds=2, warmup=0, alloc_rounds=1,
+                output=str(output), stdout=StringIO(),
+            )
+            report = json.loads(output.read_text())
+        self.assertEqual(set(report['results']), set(SCENARIOS))
+        for name, result in report['results'].items():
+            self.assertTrue(all(code < 400 for code in result['status']), name)
+            self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p95'])
+            self.assertIn('peak', result['alloc_kib'])
+        # Bookings are rolled back after each round
+        self.assertFalse(Appointment.objects.filter(reason='Benchmark').exists())
+
+    def test_booking_scenario_books_the_free_slot(self):
+        from healthcare.benchmark import Subjects, book_appointment
+        subjects = Subjects('bench')
+        method, path, data = book_appointment(subjects)
+        self.client.force_login(subjects.patient)
+        response = self.client.post(path, data)
+        self.assertRedirects(response, reverse('appointments:history'), fetch_redirect_response=False)
+
+
+class TestCacheIsolationTests(TestCase):
+    """Tests never touch the developer's cache file, and no cached value outlives its test"""
+
+    def test_cache_is_a_temporary_file(self):
+        from django.conf import settings
+        location = Path(settings.CACHES['default']['LOCATION'])
+        self.assertNotEqual(location.parent, settings.BASE_DIR / 'cache')
+        self.assertTrue(location.parent.name.startswith('healthcare-test-cache-'))
+
+    def test_isolated_caches_moves_file_locations(self):
+        from healthcare.test_runner import isolated_caches
+        config = {
+            'default': {'BACKEND': 'healthcare.sqlite_cache.SQLiteCache', 'LOCATION': '/srv/cache.sqlite3'},
+            'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'x'},
+        }
+        isolated = isolated_caches(config, '/tmp/run')
+        self.assertEqual(isolated['default']['LOCATION'], Path('/tmp/run/default.sqlite3'))
+        self.assertEqual(isolated['local'], config['local'])
+        self.assertEqual(config['default']['LOCATION'], '/srv/cache.sqlite3')
+
+    def test_caches_are_cleared_after_each_test(self):
+        from django.core.cache import cache
+        from healthcare.test_runner import clear_caches
+        self.assertIn(clear_caches, [cleanup for cleanup, args, kwargs in self._cleanups])
+        cache.set('left-over', 1)
+        clear_caches()
+        self.assertIsNone(cache.get('left-over'))
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        from healthcare.sqlite_cache import SQLiteCache
+        tmp = self.enterContext(tempfile.TemporaryDirectory())
+        self.path = Path(tmp) / 'cache.sqlite3'
+        self.make = lambda **options: SQLiteCache(self.path, {'OPTIONS': options})
+        self.cache = self.make()
+
+    def test_set_get_delete(self):
+        self.cache.set('a', {'x': [1, 2]})
+        self.cache.set('n', 5)
+        self.assertEqual(self.cache.get('a'), {'x': [1, 2]})
+        self.assertEqual(self.cache.get_many(['a', 'n', 'missing']), {'a': {'x': [1, 2]}, 'n': 5})
+        self.assertTrue(self.cache.delete('a'))
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.make().get('n'), 5)
+
+    def test_add_and_incr(self):
+        self.assertTrue(self.cache.add('k', 1))
+        self.assertFalse(self.cache.add('k', 2))
+        self.assertEqual(self.cache.incr('k', 10), 11)
+        self.assertEqual(self.cache.decr('k'), 10)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('s', 'text')
+        with self.assertRaises(TypeError):
+            self.cache.incr('s')
+
+    def test_incr_from_two_instances_loses_no_update(self):
+        other = self.make()
+        self.cache.set('counter', 0)
+        for _ in range(50):
+            self.cache.incr('counter')
+            other.incr('counter')
+        self.assertEqual(self.cache.get('counter'), 100)
+        self.assertEqual(other.get('counter'), 100)
+
+    def test_expired_entries_are_misses(self):
+        self.cache.set('old', 'value', 60)
+        with self.cache._connection() as conn:
+            conn.execute('UPDATE cache_entries SET expires = 1')
+        self.assertIsNone(self.make().get('old'))
+        self.assertTrue(self.cache.add('old', 'new'))
+        self.assertEqual(self.cache.get('old'), 'new')
+
+    def test_l1_is_dropped_when_another_process_writes(self):
+        other = self.make()
+        self.cache.set('k', 'first')
+        self.assertEqual(other.get('k'), 'first')
+        self.cache.set('k', 'second')
+        self.assertEqual(other.get('k'), 'second')
+        self.cache.delete('k')
+        self.assertIsNone(other.get('k'))
+
+    def test_write_racing_another_process_does_not_hide_its_commit(self):
+        from unittest import mock
+        other = self.make()
+        self.cache.set('k', 'first')
+        self.assertEqual(self.cache.get('k'), 'first')
+        sync = self.cache._sync_l1
+
+        def sync_then_other_writes(conn):
+            sync(conn)
+            other.set('k', 'second')
+
+        # The other process commits between this connection's L1 check and its own write
+        with mock.patch.object(self.cache, '_sync_l1', side_effect=sync_then_other_writes):
+            self.cache.set('unrelated', 1)
+        self.assertEqual(self.cache.get('k'), 'second')
+
+    def test_evicts_least_recently_used_entries(self):
+        cache = self.make(MAX_ENTRIES=10, CULL_FREQUENCY=2, ACCESS_RESOLUTION=0)
+        for i in range(10):
+            cache.set(f'k{i}', i)
+        with cache._connection() as conn:
+            conn.execute('UPDATE cache_entries SET accessed = CAST(substr(key, 2) AS REAL)')
+        self.make(ACCESS_RESOLUTION=0).get('k0')
+        cache.set('k10', 10)
+        entries, _ = cache.stats()
+        self.assertLessEqual(entries, 10)
+        self.assertEqual(cache.get('k0'), 0)
+        self.assertIsNone(cache.get('k1'))
+        self.assertEqual(cache.get('k10'), 10)
+
+    def test_evicts_down_to_max_size(self):
+        cache = self.make(MAX_SIZE=10_000)
+        for i in range(20):
+            cache.set(f'k{i}', b'x' * 1000)
+        entries, size = cache.stats()
+        self.assertLessEqual(size, 10_000)
+        self.assertLess(entries, 20)
+        self.assertEqual(cache.get('k19'), b'x' * 1000)
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        self.media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+        self.user = User.objects.create_user(username='pic', email='pic@example.com', password=None, role='PATIENT')
+
+    def image(self, name='photo.png', size=(600, 400), mode='RGBA'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_generates_square_renditions(self):
+        from PIL import Image
+        from healthcare import thumbnails
+        from taskqueue.worker import run_pending
+        self.user.profile_picture = self.image()
+        self.user.save()
+        name = self.user.profile_picture.name
+        # Generated by the worker, not during save()
+        self.assertFalse((Path(self.media) / thumbnails.rendition_name(name, 64, 'jpg')).exists())
+        run_pending()
+        for size in thumbnails.SIZES:
+            for ext, fmt in thumbnails.FORMATS.items():
+                path = Path(self.media) / thumbnails.rendition_name(name, size, ext)
+                with Image.open(path) as rendition:
+                    self.assertEqual((rendition.format, rendition.size), (fmt, (size, size)))
+        self.assertEqual(thumbnails.rendition_name('user_profiles/photo.png', 64, 'webp'), 'user_profiles/thumbs/photo.png-64.webp')
+        # Same stem, other format: separate renditions
+        self.assertNotEqual(thumbnails.rendition_name('a/x.png', 64, 'jpg'), thumbnails.rendition_name('a/x.jpg', 64, 'jpg'))
+
+    def test_replaced_or_cleared_image_drops_old_renditions(self):
+        from django.core.cache import cache
+        from healthcare import thumbnails
+        from taskqueue.worker import run_pending
+        self.user.profile_picture = self.image('first.png')
+        self.user.save()
+        run_pending()
+        first = self.user.profile_picture.name
+        self.assertTrue(cache.get(f'thumbnails:{first}'))
+
+        self.user.profile_picture = self.image('second.png')
+        self.user.save()
+        run_pending()
+        second = self.user.profile_picture.name
+        self.assertFalse(any((Path(self.media) / n).exists() for n in thumbnails.rendition_names(first)))
+        self.assertIsNone(cache.get(f'thumbnails:{first}'))
+        self.assertTrue(all((Path(self.media) / n).exists() for n in thumbnails.rendition_names(second)))
+
+        # Saves that leave the image alone do not touch its renditions
+        self.user.first_name = 'Pic'
+        self.user.save()
+        run_pending()
+        self.assertTrue(all((Path(self.media) / n).exists() for n in thumbnails.rendition_names(second)))
+
+        self.user.profile_picture = None
+        self.user.save()
+        run_pending()
+        self.assertFalse(any((Path(self.media) / n).exists() for n in thumbnails.rendition_names(second)))
+
+    def test_tag_renders_srcset_or_falls_back_to_original(self):
+        from django.template import Context, Template
+        from django.core.files.storage import default_storage
+        template = Template('{% load thumbnails %}{% thumbnail image 40 alt="Me" class="rounded" %}')
+        self.assertEqual(template.render(Context({'image': self.user.profile_picture})), '')
+
+        name = default_storage.save('user_profiles/old.png', self.image())
+        User.objects.filter(pk=self.user.pk).update(profile_picture=name)
+        self.user.refresh_from_db()
+        html = template.render(Context({'image': self.user.profile_picture}))
+        self.assertEqual(html, '<img src="/media/user_profiles/old.png" alt="Me" loading="lazy" class="rounded">')
+
+        out = StringIO()
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn('Generated thumbnails for 1 image(s)', out.getvalue())
+        html = template.render(Context({'image': self.user.profile_picture}))
+        self.assertIn('srcset="/media/user_profiles/thumbs/old.png-64.webp 64w, /media/user_profiles/thumbs/old.png-160.webp 160w', html)
+        self.assertIn('<img src="/media/user_profiles/thumbs/old.png-64.jpg"', html)
+        self.assertIn('sizes="40px"', html)
+
+    def test_backfill_skips_done_and_reports_unreadable_files(self):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from hospitals.models import Hospital
+        from taskqueue.worker import run_pending
+        self.user.profile_picture = self.image()
+        self.user.save()
+        run_pending()
+        hospital_user = User.objects.create_user(username='logo', email='logo@example.com', password=None, role='HOSPITAL')
+        broken = default_storage.save('hospital_logos/broken.png', ContentFile(b'not an image'))
+        Hospital.objects.create(user=hospital_user, name='H', registration_number='R1', logo=broken)
+        out = StringIO()
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn('for 0 image(s); 1 already had them, 1 could not be read', out.getvalue())
+
+
+class RejectAccountTests(TestCase):
+    def test_rejected_doctor_is_deactivated_then_deleted_by_worker(self):
+        from taskqueue.worker import run_pending
+        admin = User.objects.create_user(username='admin1', email='admin@test.com', password='pass', role='ADMIN', is_approved=True)
+        doctor = User.objects.create_user(username='newdoc', email='newdoc@test.com', password='pass', role='DOCTOR')
+        self.client.force_login(admin)
+        self.client.post(reverse('accounts:reject_doctor', args=[doctor.pk]))
+        doctor.refresh_from_db()
+        self.assertFalse(doctor.is_active)
+        response = self.client.get(reverse('accounts:admin_dashboard'))
+        self.assertEqual(response.context['pending_doctors'], [])
+
+        run_pending()
+        self.assertFalse(User.objects.filter(pk=doctor.pk).exists())
@@ -19,6 +19,7 @@ urlpatterns = [
     path('admin/doctors/', views.AdminDoctorListView.as_view(), name='admin_doctor_list'),
     path('admin/hospitals/', views.AdminHospitalListView.as_view(), name='admin_hospital_list'),
     path('admin/user/<int:pk>/', views.AdminUserProfileView.as_view(), name='admin_user_profile'),
+    path('admin/query-profile/', views.AdminQueryProfileView.as_view(), name='admin_query_profile'),
     path('admin/doctor-profile-requests/', views.AdminDoctorProfileUpdateRequestListView.as_view(), name='admin_doctor_profile_requests'),
     path('admin/doctor-profile-request/<int:pk>/', views.AdminDoctorProfileUpdateRequestDetailView.as_view(), name='admin_doctor_profile_request_detail'),
     path('admin/doctor-profile-request/<int:pk>/approve/', views.admin_approve_doctor_profile_request, name='admin_approve_doctor_profile_request'),
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.views import LogoutView
@@ -18,11 +19,13 @@ from .mixins import (
     PatientRequiredMixin, HospitalRequiredMixin
 )
 from .models import User
+from .tasks import delete_rejected_user
 from patients.models import PatientProfile
 from doctors.models import DoctorProfile, DoctorProfileUpdateRequest
 from hospitals.models import Hospital
 from appointments.models import Appointment
 from documents.models import Document
+from healthcare import instrumentation
 
 
 class RegisterView(CreateView):
@@ -177,15 +180,18 @@ class AdminDashboardView(AdminRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         
         # Statistics
-        context['total_users'] = User.objects.count()
-        context['total_patients'] = User.objects.filter(role='PATIENT').count()
-        context['total_doctors'] = User.objects.filter(role='DOCTOR').count()
-        context['total_hospitals'] = User.objects.filter(role='HOSPITAL').count()
-        context['total_appointments'] = Appointment.objects.count()
+        user_counts = User.objects.aggregate(
+            total_users=Count('pk'),
+            total_patients=Count('pk', filter=Q(role='PATIENT')),
+            total_doctors=Count('pk', filter=Q(role='DOCTOR')),
+            total_hospitals=Count('pk', filter=Q(role='HOSPITAL')),
+        )
+        context.update(user_counts)
+        context['total_appointments'] = Appointment.objects.stats()['total']
         
         # Pending approvals with profile information
         pending_doctors_list = []
-        for doctor_user in User.objects.filter(role='DOCTOR', is_approved=False).select_related('doctor_profile'):
+        for doctor_user in User.objects.filter(role='DOCTOR', is_approved=False, is_active=True).select_related('doctor_profile'):
             doctor_profile = getattr(doctor_user, 'doctor_profile', None)
             pending_doctors_list.append({
                 'user': doctor_user,
@@ -195,7 +201,7 @@ class AdminDashboardView(AdminRequiredMixin, TemplateView):
         context['pending_doctors'] = pending_doctors_list
         
         pending_hospitals_list = []
-        for hospital_user in User.objects.filter(role='HOSPITAL', is_approved=False).select_related('hospital_profile'):
+        for hospital_user in User.objects.filter(role='HOSPITAL', is_approved=False, is_active=True).select_related('hospital_profile'):
             hospital = getattr(hospital_user, 'hospital_profile', None)
             pending_hospitals_list.append({
                 'user': hospital_user,
@@ -219,7 +225,8 @@ class DoctorDashboardView(DoctorRequiredMixin, TemplateView):
         today = timezone.now().date()
 
         base_qs = Appointment.objects.filter(doctor=user)
-        context['today_appointments'] = base_qs.filter(appointment_date=today).count()
+        stats = base_qs.stats(today)
+        context['today_appointments'] = stats['today']
         context['today_appointments_list'] = base_qs.filter(
             appointment_date=today,
             status__in=['PENDING', 'CONFIRMED']
@@ -228,8 +235,8 @@ class DoctorDashboardView(DoctorRequiredMixin, TemplateView):
             appointment_date__gte=today,
             status__in=['PENDING', 'CONFIRMED']
         ).select_related('patient', 'hospital').order_by('appointment_date', 'appointment_time')[:10]
-        context['total_completed_appointments'] = base_qs.filter(status='COMPLETED').count()
-        context['pending_requests'] = base_qs.filter(status='PENDING').count()
+        context['total_completed_appointments'] = stats['completed']
+        context['pending_requests'] = stats['pending']
         context['doctor_profile'] = doctor_profile
         context['pending_profile_requests'] = DoctorProfileUpdateRequest.objects.filter(
             doctor=doctor_profile, status='PENDING'
@@ -319,14 +326,13 @@ class PatientDashboardView(PatientRequiredMixin, TemplateView):
         
         # Statistics
         all_appointments = Appointment.objects.filter(patient=self.request.user)
-        context['total_appointments'] = all_appointments.count()
-        context['past_appointments_count'] = all_appointments.filter(
-            Q(appointment_date__lt=today) | Q(status='COMPLETED')
-        ).count()
+        stats = all_appointments.stats(today)
+        context['total_appointments'] = stats['total']
+        context['past_appointments_count'] = stats['past']
         context['upcoming_appointments'] = all_appointments.filter(
             appointment_date__gte=today,
             status__in=['PENDING', 'CONFIRMED']
-        ).order_by('appointment_date', 'appointment_time')[:10]
+        ).select_related('doctor', 'hospital').order_by('appointment_date', 'appointment_time')[:10]
         context['total_documents'] = Document.objects.filter(patient=self.request.user).count()
         context['patient_profile'] = patient_profile
         
@@ -344,17 +350,15 @@ class HospitalDashboardView(HospitalRequiredMixin, TemplateView):
         
         # Statistics
         if hospital:
+            stats = Appointment.objects.filter(hospital=hospital).stats()
             context['total_doctors'] = hospital.get_doctors().count()
-            context['total_appointments'] = Appointment.objects.filter(hospital=hospital).count()
-            context['today_appointments'] = Appointment.objects.filter(
-                hospital=hospital,
-                appointment_date=timezone.now().date()
-            ).count()
+            context['total_appointments'] = stats['total']
+            context['today_appointments'] = stats['today']
             context['upcoming_appointments'] = Appointment.objects.filter(
                 hospital=hospital,
                 appointment_date__gte=timezone.now().date(),
                 status__in=['PENDING', 'CONFIRMED']
-            ).order_by('appointment_date', 'appointment_time')[:10]
+            ).select_related('patient', 'doctor').order_by('appointment_date', 'appointment_time')[:10]
         
         context['hospital'] = hospital
         
@@ -362,6 +366,22 @@ class HospitalDashboardView(HospitalRequiredMixin, TemplateView):
 
 
 # Admin list and profile views
+class AdminQueryProfileView(AdminRequiredMixin, TemplateView):
+    """Admin: slowest views and most repeated SQL from the instrumentation log"""
+    template_name = 'accounts/admin_query_profile.html'
+    record_limit = 5000
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        views, fingerprints = instrumentation.summarize(instrumentation.load_records(limit=self.record_limit))
+        context['record_count'] = sum(view['requests'] for view in views)
+        context['view_stats'] = views[:50]
+        context['fingerprints'] = fingerprints[:50]
+        context['n_plus_one_threshold'] = instrumentation.n_plus_one_threshold()
+        context['instrumentation_log'] = getattr(settings, 'SQL_INSTRUMENTATION_LOG', None)
+        return context
+
+
 class AdminUserListView(AdminRequiredMixin, ListView):
     """Admin: list all users"""
     model = User
@@ -568,7 +588,10 @@ def reject_doctor(request, user_id):
     if request.method == 'POST':
         try:
             user = User.objects.get(id=user_id, role='DOCTOR')
-            user.delete()  # Or you can add a rejection_reason field
+            # Deleting cascades through the profile and its appointments: do it in the background
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+            delete_rejected_user.delay(user.pk)
             messages.success(request, f'Doctor {user.get_full_name() or user.username} has been rejected and removed.')
         except User.DoesNotExist:
             messages.error(request, 'Doctor not found.')
@@ -585,7 +608,10 @@ def reject_hospital(request, user_id):
     if request.method == 'POST':
         try:
             user = User.objects.get(id=user_id, role='HOSPITAL')
-            user.delete()  # Or you can add a rejection_reason field
+            # Deleting cascades through the profile and its appointments: do it in the background
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+            delete_rejected_user.delay(user.pk)
             messages.success(request, f'Hospital {user.get_full_name() or user.username} has been rejected and removed.')
         except User.DoesNotExist:
             messages.error(request, 'Hospital not found.')
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from appointments.models import Appointment
+from healthcare.archive import horizon_date
+from hospitals.models import Admission
+
+
+class Command(BaseCommand):
+    help = (
+        'Move admissions discharged and finished appointments dated more than ARCHIVE_AFTER_DAYS ago to '
+        'the archive tables, in batches. Appointments with documents or live admissions are kept. The '
+        'task worker runs this daily.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows moved per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        # Admissions first: an appointment with a live admission is kept
+        admissions = Admission.archive_old(batch_size=batch_size)
+        appointments = Appointment.archive_old(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {appointments} appointment(s) and {admissions} admission(s) from before '
+            f'{horizon_date():%Y-%m-%d} ({settings.ARCHIVE_AFTER_DAYS} days).'
+        ))
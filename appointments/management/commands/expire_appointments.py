@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from appointments.models import Appointment
+
+
+class Command(BaseCommand):
+    help = (
+        'Mark PENDING/CONFIRMED appointments APPOINTMENT_EXPIRY_DAYS or more past their date as EXPIRED, '
+        'and discharge open admissions of those that were never confirmed. The task worker runs this '
+        'hourly; use it by hand after imports or when no worker is running.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Appointments updated per transaction')
+
+    def handle(self, *args, **options):
+        expired, discharged = Appointment.expire_overdue(batch_size=max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {expired} appointment(s) older than {settings.APPOINTMENT_EXPIRY_DAYS} day(s); '
+            f'discharged {discharged} admission(s).'
+        ))
@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-17 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def release_duplicate_slots(apps, schema_editor):
+    """Older rows could double-book a slot; keep the first booking active and
+    mark later duplicates RESCHEDULED so the unique constraints can be created."""
+    Appointment = apps.get_model('appointments', 'Appointment')
+    active = Appointment.objects.filter(status__in=['PENDING', 'CONFIRMED']).order_by('id')
+    seen_doctor, seen_patient, duplicates = set(), set(), []
+    for apt_id, doctor_id, patient_id, apt_date, apt_time in active.values_list(
+        'id', 'doctor_id', 'patient_id', 'appointment_date', 'appointment_time'
+    ):
+        doctor_key = (doctor_id, apt_date, apt_time)
+        patient_key = (patient_id, apt_date, apt_time)
+        if doctor_key in seen_doctor or patient_key in seen_patient:
+            duplicates.append(apt_id)
+            continue
+        seen_doctor.add(doctor_key)
+        seen_patient.add(patient_key)
+    if duplicates:
+        Appointment.objects.filter(pk__in=duplicates).update(status='RESCHEDULED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_appointment_is_emergency'),
+        ('hospitals', '0006_doctorhospitalrequest_expected_monthly_salary_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(release_duplicate_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'CONFIRMED'])), fields=('doctor', 'appointment_date', 'appointment_time'), name='uniq_active_doctor_slot'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'CONFIRMED'])), fields=('patient', 'appointment_date', 'appointment_time'), name='uniq_active_patient_slot'),
+        ),
+    ]
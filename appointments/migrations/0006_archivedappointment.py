@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-17 18:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_appointment_expired_status'),
+        ('hospitals', '0012_archivedadmission'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('appointment_date', models.DateField()),
+                ('appointment_time', models.TimeField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('CONFIRMED', 'Confirmed'), ('CANCELLED', 'Cancelled'), ('COMPLETED', 'Completed'), ('RESCHEDULED', 'Rescheduled'), ('EXPIRED', 'Expired')], max_length=20)),
+                ('is_emergency', models.BooleanField(default=False)),
+                ('reason', models.TextField()),
+                ('notes', models.TextField(blank=True)),
+                ('prescription', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_doctor_appointments', to=settings.AUTH_USER_MODEL)),
+                ('hospital', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='hospitals.hospital')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_patient_appointments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'appointments_archive',
+                'ordering': ['-appointment_date', '-appointment_time'],
+                'indexes': [models.Index(fields=['patient', 'appointment_date'], name='appt_arch_patient_date_idx'), models.Index(fields=['doctor', 'appointment_date'], name='appt_arch_doctor_date_idx'), models.Index(fields=['hospital', 'appointment_date'], name='appt_arch_hospital_date_idx')],
+            },
+        ),
+    ]
@@ -1,7 +1,36 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.conf import settings
 
 
+class SlotAlreadyBooked(Exception):
+    """Raised by Appointment.reserve when the slot is already held"""
+
+    def __init__(self, by_doctor):
+        self.by_doctor = by_doctor  # True: doctor is busy; False: patient has another appointment
+        super().__init__('doctor slot taken' if by_doctor else 'patient slot taken')
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def stats(self, today=None):
+        """All dashboard counters for these appointments in one aggregate query:
+        total, today, today_active, upcoming (after today, active), past (before
+        today or completed), pending, completed and cancelled."""
+        from django.db.models import Count, Q
+        from django.utils import timezone
+        today = today or timezone.now().date()
+        active = Q(status__in=Appointment.ACTIVE_STATUSES)
+        return self.order_by().aggregate(
+            total=Count('pk'),
+            today=Count('pk', filter=Q(appointment_date=today)),
+            today_active=Count('pk', filter=Q(appointment_date=today) & active),
+            upcoming=Count('pk', filter=Q(appointment_date__gt=today) & active),
+            past=Count('pk', filter=Q(appointment_date__lt=today) | Q(status='COMPLETED')),
+            pending=Count('pk', filter=Q(status='PENDING')),
+            completed=Count('pk', filter=Q(status='COMPLETED')),
+            cancelled=Count('pk', filter=Q(status='CANCELLED')),
+        )
+
+
 class Appointment(models.Model):
     """Appointment model connecting Patients, Doctors, and Hospitals"""
     
@@ -11,7 +40,10 @@ class Appointment(models.Model):
         ('CANCELLED', 'Cancelled'),
         ('COMPLETED', 'Completed'),
         ('RESCHEDULED', 'Rescheduled'),
+        ('EXPIRED', 'Expired'),
     ]
+    # Statuses that hold a time slot (enforced unique per doctor and per patient)
+    ACTIVE_STATUSES = ('PENDING', 'CONFIRMED')
     
     patient = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -41,12 +73,38 @@ class Appointment(models.Model):
     prescription = models.TextField(blank=True, help_text="Prescription details")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AppointmentQuerySet.as_manager()
     
     class Meta:
         db_table = 'appointments'
         verbose_name = 'Appointment'
         verbose_name_plural = 'Appointments'
         ordering = ['-appointment_date', '-appointment_time']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status__in=['PENDING', 'CONFIRMED']),
+                name='uniq_active_doctor_slot',
+            ),
+            models.UniqueConstraint(
+                fields=['patient', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status__in=['PENDING', 'CONFIRMED']),
+                name='uniq_active_patient_slot',
+            ),
+        ]
+        # Hot paths: dashboards, lists and availability filter by owner + date (+ status).
+        # Active-slot lookups are also served by the partial unique indexes above.
+        indexes = [
+            models.Index(fields=['doctor', 'appointment_date', 'status'], name='appt_doctor_date_status_idx'),
+            models.Index(fields=['patient', 'appointment_date', 'status'], name='appt_patient_date_status_idx'),
+            models.Index(fields=['hospital', 'appointment_date'], name='appt_hospital_date_idx'),
+            # Overdue active appointments for expire_overdue(); stays small while the job runs
+            models.Index(
+                fields=['appointment_date'], condition=models.Q(status__in=['PENDING', 'CONFIRMED']),
+                name='appt_active_date_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"Appointment: {self.patient.username} with Dr. {self.doctor.username} on {self.appointment_date}"
@@ -58,3 +116,129 @@ class Appointment(models.Model):
     def can_be_rescheduled(self):
         """Check if appointment can be rescheduled"""
         return self.status in ['PENDING', 'CONFIRMED']
+
+    @classmethod
+    def reserve(cls, **fields):
+        """Create an active appointment; the INSERT itself is the conflict check.
+
+        The partial unique constraints reject a second active booking for the
+        same doctor or patient at the same date/time, so concurrent requests
+        cannot both win. Raises SlotAlreadyBooked on conflict.
+        """
+        try:
+            with transaction.atomic():
+                return cls.objects.create(**fields)
+        except IntegrityError:
+            # Failure path only: find out which side holds the slot for the message
+            doctor_busy = cls.objects.filter(
+                doctor=fields['doctor'],
+                appointment_date=fields['appointment_date'],
+                appointment_time=fields['appointment_time'],
+                status__in=cls.ACTIVE_STATUSES,
+            ).exists()
+            raise SlotAlreadyBooked(by_doctor=doctor_busy)
+
+    @classmethod
+    def expire_overdue(cls, today=None, batch_size=500):
+        """Move PENDING/CONFIRMED appointments whose date is APPOINTMENT_EXPIRY_DAYS or more
+        in the past to EXPIRED, ``batch_size`` rows per UPDATE and transaction.
+
+        Open admissions linked to an appointment that was still PENDING (never confirmed,
+        so the patient was not seen) are discharged now and their beds released. Returns
+        (appointments expired, admissions discharged).
+        """
+        from datetime import timedelta
+        from django.utils import timezone
+        from hospitals.models import Admission, Hospital
+        today = today or timezone.now().date()
+        cutoff = today - timedelta(days=settings.APPOINTMENT_EXPIRY_DAYS - 1)
+        overdue = cls.objects.filter(status__in=cls.ACTIVE_STATUSES, appointment_date__lt=cutoff)
+        expired = discharged = 0
+        while True:
+            with transaction.atomic():
+                batch = list(overdue.order_by().values_list('pk', 'status')[:batch_size])
+                if not batch:
+                    return expired, discharged
+                now = timezone.now()
+                ids = [pk for pk, _ in batch]
+                expired += cls.objects.filter(pk__in=ids, status__in=cls.ACTIVE_STATUSES).update(
+                    status='EXPIRED', updated_at=now,
+                )
+                unseen = Admission.objects.filter(
+                    appointment__in=[pk for pk, status in batch if status == 'PENDING'], discharge_time__isnull=True,
+                )
+                # Only admissions that have started hold a bed. Beds are released per rows
+                # this UPDATE discharged: one discharged concurrently frees its own bed.
+                hospitals = unseen.order_by().values_list('hospital', flat=True).distinct()
+                for hospital_id in list(hospitals):
+                    n = unseen.filter(hospital=hospital_id, admission_time__lte=now).update(
+                        discharge_time=now, updated_at=now,
+                    )
+                    if n:
+                        Hospital.release_beds(hospital_id, n)
+                    discharged += n
+                discharged += unseen.update(discharge_time=now, updated_at=now)
+
+    @classmethod
+    def archive_old(cls, today=None, batch_size=500):
+        """Move finished appointments dated before the archive horizon to ArchivedAppointment.
+
+        Appointments that still have documents or live admissions stay, so no link is lost.
+        Returns the number moved.
+        """
+        from healthcare import cache
+        from healthcare.archive import horizon_date, move_to_archive
+        old = cls.objects.filter(appointment_date__lt=horizon_date(today)).exclude(
+            status__in=cls.ACTIVE_STATUSES,
+        ).filter(documents__isnull=True, admissions__isnull=True)
+        return move_to_archive(old, ArchivedAppointment, batch_size, owner=(cache.ARCHIVED_APPOINTMENTS, 'patient_id'))
+
+
+class ArchivedAppointment(models.Model):
+    """An Appointment older than ARCHIVE_AFTER_DAYS, moved out of the live table with its id
+    (healthcare/archive.py). Read-only."""
+
+    STATUS_CHOICES = Appointment.STATUS_CHOICES
+
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_patient_appointments')
+    doctor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_doctor_appointments')
+    hospital = models.ForeignKey('hospitals.Hospital', on_delete=models.CASCADE, related_name='archived_appointments', null=True, blank=True)
+    appointment_date = models.DateField()
+    appointment_time = models.TimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    is_emergency = models.BooleanField(default=False)
+    reason = models.TextField()
+    notes = models.TextField(blank=True)
+    prescription = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'appointments_archive'
+        ordering = ['-appointment_date', '-appointment_time']
+        indexes = [
+            models.Index(fields=['patient', 'appointment_date'], name='appt_arch_patient_date_idx'),
+            models.Index(fields=['doctor', 'appointment_date'], name='appt_arch_doctor_date_idx'),
+            models.Index(fields=['hospital', 'appointment_date'], name='appt_arch_hospital_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived appointment: {self.patient_id} with {self.doctor_id} on {self.appointment_date}"
+
+    @classmethod
+    def counts_for(cls, patient):
+        """Cached {'past', 'cancelled'} counts of a patient's archived appointments"""
+        from django.db.models import Count, Q
+        from healthcare import cache
+        return cache.get_or_build(cache.ARCHIVED_APPOINTMENTS, patient.pk, lambda: cls.objects.filter(
+            patient=patient,
+        ).aggregate(past=Count('pk'), cancelled=Count('pk', filter=Q(status='CANCELLED'))))
+
+    def can_be_cancelled(self):
+        return False
+
+    def can_be_rescheduled(self):
+        return False
+
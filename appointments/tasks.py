@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from taskqueue.queue import task
+
+from .models import Appointment
+
+
+@task(every=timedelta(hours=1))
+def expire_appointments():
+    """Expire overdue PENDING/CONFIRMED appointments (see expire_appointments command)"""
+    return Appointment.expire_overdue()
+
+
+@task(every=timedelta(days=1))
+def archive_history():
+    """Move old admissions, then old appointments, to the archive tables (see archive_history command)"""
+    from hospitals.models import Admission
+    # Admissions first: an appointment with a live admission is kept
+    return Admission.archive_old(), Appointment.archive_old()
@@ -0,0 +1,93 @@
+"""Query-plan regression tests for the hot Appointment, Admission and Document querysets.
+
+Each test runs ``EXPLAIN QUERY PLAN`` on a queryset built the way the views
+build it and fails if SQLite stops searching it through the expected index
+(e.g. after a model or migration change drops it). Skipped on other databases.
+"""
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import User
+from documents.models import Document
+from hospitals.models import Hospital, Admission, occupying_bed
+from .models import Appointment
+
+
+def query_plan(queryset):
+    """Detail lines of SQLite's EXPLAIN QUERY PLAN for a queryset"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        cls.doctor = User.objects.create_user(
+            username='doc', email='doc@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+        hosp_user = User.objects.create_user(
+            username='h', email='h@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        cls.hospital = Hospital.objects.create(name='H', registration_number='REG1', user=hosp_user)
+        cls.today = timezone.now().date()
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = query_plan(queryset)
+        self.assertTrue(
+            any(f'INDEX {index_name} ' in f'{line} ' for line in plan),
+            f'expected index {index_name!r}, got plan:\n' + '\n'.join(plan),
+        )
+
+    def test_doctor_dashboard_today(self):
+        qs = Appointment.objects.filter(
+            doctor=self.doctor, appointment_date=self.today, status__in=Appointment.ACTIVE_STATUSES,
+        ).order_by('appointment_time')
+        self.assertUsesIndex(qs, 'appt_doctor_date_status_idx')
+
+    def test_doctor_appointment_list(self):
+        qs = Appointment.objects.filter(doctor=self.doctor).order_by('-appointment_date', '-appointment_time')
+        self.assertUsesIndex(qs, 'appt_doctor_date_status_idx')
+
+    def test_patient_upcoming(self):
+        qs = Appointment.objects.filter(
+            patient=self.patient, appointment_date__gte=self.today, status__in=Appointment.ACTIVE_STATUSES,
+        ).order_by('appointment_date', 'appointment_time')
+        self.assertUsesIndex(qs, 'appt_patient_date_status_idx')
+
+    def test_hospital_upcoming(self):
+        qs = Appointment.objects.filter(
+            hospital=self.hospital, appointment_date__gte=self.today, status__in=Appointment.ACTIVE_STATUSES,
+        ).order_by('appointment_date', 'appointment_time')
+        self.assertUsesIndex(qs, 'appt_hospital_date_idx')
+
+    def test_availability_window(self):
+        from doctors.availability import DoctorAvailability
+        from doctors.models import DoctorProfile
+        profile = DoctorProfile.objects.create(
+            user=self.doctor, license_number='L1', qualification='MBBS', specialization='GENERAL',
+        )
+        availability = DoctorAvailability(profile, include_bookings=False)
+        qs = availability.booked_appointments(self.patient).order_by()
+        self.assertUsesIndex(qs, 'appt_doctor_date_status_idx')
+        self.assertUsesIndex(qs, 'appt_patient_date_status_idx')
+
+    def test_occupied_beds(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            Admission.objects.filter(occupying_bed(now, hospital=self.hospital)).order_by(),
+            'adm_hospital_discharge_idx',
+        )
+
+    def test_appointment_documents(self):
+        qs = Document.objects.filter(appointment_id=1, patient=self.patient)
+        self.assertUsesIndex(qs, 'doc_patient_appointment_idx')
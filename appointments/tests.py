@@ -7,6 +7,7 @@ from accounts.models import User
 from doctors.models import DoctorProfile
 from hospitals.models import Hospital, DoctorHospitalAssignment
 from .models import Appointment
+from healthcare.query_budgets import QueryBudgetTestCase
 
 
 class BookingValidationTests(TestCase):
@@ -60,3 +61,385 @@ class BookingValidationTests(TestCase):
             'reason': 'Checkup',
         })
         self.assertEqual(Appointment.objects.filter(patient=self.patient).count(), count_before)
+
+    def _book(self, day, slot='10:00', **extra):
+        return self.client.post(reverse('appointments:book_normal', kwargs={'doctor_id': self.doctor.pk}), data={
+            'hospital_id': self.hospital.pk,
+            'date': day.strftime('%Y-%m-%d'),
+            'time': slot,
+            'reason': 'Checkup',
+            **extra,
+        })
+
+    def test_booking_free_slot_succeeds(self):
+        self.client.force_login(self.patient)
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        self._book(tomorrow)
+        self.assertTrue(Appointment.objects.filter(patient=self.patient, appointment_date=tomorrow).exists())
+
+    def test_booking_attaches_chunked_uploads(self):
+        import tempfile
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import override_settings
+        from documents.models import Document, UploadSession
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        uploaded, unrelated = [
+            Document.objects.create(
+                patient=self.patient, document_type='MRI', title=name, file=SimpleUploadedFile(name, b'%PDF-1.4 ' + name.encode()),
+            )
+            for name in ('mri.pdf', 'other.pdf')
+        ]
+        UploadSession.objects.create(
+            user=self.patient, filename='mri.pdf', total_size=1, sha256=uploaded.sha256, status='COMPLETE', document=uploaded,
+        )
+        self.client.force_login(self.patient)
+        self._book(timezone.now().date() + timedelta(days=1), uploaded_documents=[uploaded.pk, unrelated.pk])
+        appointment = Appointment.objects.get(patient=self.patient)
+        self.assertEqual(list(appointment.documents.all()), [uploaded])
+        uploaded.refresh_from_db()
+        self.assertEqual((uploaded.doctor, uploaded.hospital), (self.doctor_user, self.hospital))
+
+    def test_booking_on_leave_date_rejected(self):
+        from doctors.models import DoctorLeave
+        self.client.force_login(self.patient)
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        DoctorLeave.objects.create(doctor=self.doctor, leave_date=tomorrow)
+        self._book(tomorrow)
+        self.assertFalse(Appointment.objects.filter(patient=self.patient).exists())
+
+    def test_booking_off_schedule_time_rejected(self):
+        self.client.force_login(self.patient)
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        self._book(tomorrow, '10:10')
+        self._book(tomorrow, '20:00')
+        self.assertFalse(Appointment.objects.filter(patient=self.patient).exists())
+
+
+class SlotReservationTests(TestCase):
+    """Double booking is rejected by the partial unique constraints on insert."""
+
+    def setUp(self):
+        from datetime import time
+        self.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        self.other_patient = User.objects.create_user(
+            username='pat2', email='pat2@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        self.doctor_user = User.objects.create_user(
+            username='doc', email='doc@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+        self.other_doctor = User.objects.create_user(
+            username='doc2', email='doc2@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+        self.day = timezone.now().date() + timedelta(days=1)
+        self.slot = time(10, 0)
+
+    def _reserve(self, patient, doctor, status='PENDING'):
+        return Appointment.reserve(
+            patient=patient, doctor=doctor, appointment_date=self.day,
+            appointment_time=self.slot, reason='Visit', status=status,
+        )
+
+    def test_doctor_slot_taken(self):
+        from .models import SlotAlreadyBooked
+        self._reserve(self.patient, self.doctor_user)
+        with self.assertRaises(SlotAlreadyBooked) as ctx:
+            self._reserve(self.other_patient, self.doctor_user)
+        self.assertTrue(ctx.exception.by_doctor)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_patient_slot_taken(self):
+        from .models import SlotAlreadyBooked
+        self._reserve(self.patient, self.doctor_user)
+        with self.assertRaises(SlotAlreadyBooked) as ctx:
+            self._reserve(self.patient, self.other_doctor)
+        self.assertFalse(ctx.exception.by_doctor)
+
+    def test_cancelled_appointment_releases_slot(self):
+        first = self._reserve(self.patient, self.doctor_user)
+        first.status = 'CANCELLED'
+        first.save()
+        self._reserve(self.other_patient, self.doctor_user)
+        self.assertEqual(Appointment.objects.filter(status='PENDING').count(), 1)
+
+    def test_booking_view_reports_taken_slot(self):
+        hosp_user = User.objects.create_user(
+            username='h', email='h@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        hospital = Hospital.objects.create(name='H', registration_number='REG1', user=hosp_user)
+        doctor = DoctorProfile.objects.create(
+            user=self.doctor_user, license_number='L1', qualification='MBBS',
+            specialization='GENERAL', hospital=hospital,
+        )
+        self._reserve(self.other_patient, self.doctor_user)
+        self.client.force_login(self.patient)
+        response = self.client.post(reverse('appointments:book_normal', kwargs={'doctor_id': doctor.pk}), data={
+            'hospital_id': hospital.pk,
+            'date': self.day.strftime('%Y-%m-%d'),
+            'time': '10:00',
+            'reason': 'Checkup',
+        }, follow=True)
+        self.assertFalse(Appointment.objects.filter(patient=self.patient).exists())
+        self.assertContains(response, 'This time slot is already booked.')
+
+
+class AppointmentStatsTests(TestCase):
+    """Dashboard counters come from a single conditional aggregate."""
+
+    def setUp(self):
+        self.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        self.doctor_user = User.objects.create_user(
+            username='doc', email='doc@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+        self.today = timezone.now().date()
+        for offset, status in [(-2, 'COMPLETED'), (-1, 'CANCELLED'), (0, 'PENDING'), (0, 'CANCELLED'),
+                               (1, 'CONFIRMED'), (3, 'PENDING'), (5, 'COMPLETED')]:
+            Appointment.objects.create(
+                patient=self.patient, doctor=self.doctor_user, reason='Checkup',
+                appointment_date=self.today + timedelta(days=offset), appointment_time='10:00',
+                status=status,
+            )
+
+    def test_stats_in_one_query(self):
+        with self.assertNumQueries(1):
+            stats = Appointment.objects.filter(patient=self.patient).stats(self.today)
+        self.assertEqual(stats, {
+            'total': 7, 'today': 2, 'today_active': 1, 'upcoming': 2, 'past': 3,
+            'pending': 2, 'completed': 2, 'cancelled': 2,
+        })
+
+    def test_history_counts(self):
+        self.client.force_login(self.patient)
+        response = self.client.get(reverse('appointments:history'))
+        self.assertEqual(
+            [response.context[k] for k in ('past_count', 'upcoming_count', 'today_count', 'cancelled_count')],
+            [3, 2, 2, 2],
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    """History pages are walked with opaque cursors instead of OFFSET."""
+
+    def setUp(self):
+        self.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        self.doctor_user = User.objects.create_user(
+            username='doc', email='doc@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+        today = timezone.now().date()
+        for days in range(1, 11):
+            for slot in ('09:00', '10:00', '10:00'):  # duplicate slot: ties broken by id
+                Appointment.objects.create(
+                    patient=self.patient, doctor=self.doctor_user, reason='Checkup', status='COMPLETED',
+                    appointment_date=today - timedelta(days=days), appointment_time=slot,
+                )
+        self.expected = list(
+            Appointment.objects.order_by('-appointment_date', '-appointment_time', '-id').values_list('pk', flat=True)
+        )
+        self.client.force_login(self.patient)
+
+    def _get(self, query):
+        response = self.client.get(reverse('appointments:history') + '?' + query)
+        return response.context['page_obj'], [a.pk for a in response.context['appointments']]
+
+    def test_walk_forward_and_back(self):
+        page, ids = self._get('tab=past')
+        seen = list(ids)
+        self.assertFalse(page.has_previous())
+        self.assertIn('tab=past', page.next_query)
+        pages = [ids]
+        while page.has_next():
+            page, ids = self._get(page.next_query)
+            seen.extend(ids)
+            pages.append(ids)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual([len(p) for p in pages], [15, 15])
+
+        # Back to the first page from the last one
+        page, ids = self._get(page.previous_query)
+        self.assertEqual(ids, pages[0])
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_deep_page_query_has_no_offset(self):
+        page, _ = self._get('tab=past')
+        # session, user, page, archived rows (no live rows left to fill the page), tab counters
+        with self.assertNumQueries(5) as ctx:
+            self._get(page.next_query)
+        sql = ctx.captured_queries[2]['sql']
+        self.assertIn('LIMIT 16', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_invalid_cursor_shows_first_page(self):
+        _, ids = self._get('tab=past&cursor=not-a-cursor')
+        self.assertEqual(ids, self.expected[:15])
+
+
+class AppointmentsQueryBudgetTests(QueryBudgetTestCase):
+    """Every appointments page stays within its query budget and does not scale with the data"""
+    namespace = 'appointments'
+
+    def test_routes_within_budget(self):
+        self.check_budgets()
+
+
+class AppointmentExpiryTests(TestCase):
+    """Overdue active appointments are expired in bulk; unseen admissions free their beds."""
+
+    def setUp(self):
+        self.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        self.doctor_user = User.objects.create_user(
+            username='doc', email='doc@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+        hospital_user = User.objects.create_user(
+            username='hosp', email='hosp@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        self.hospital = Hospital.objects.create(
+            user=hospital_user, name='General', registration_number='REG-EXP', total_beds=5, occupied_beds=2,
+        )
+        self.today = timezone.now().date()
+
+    def book(self, offset, status, hour=10):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor_user, hospital=self.hospital, reason='Checkup',
+            appointment_date=self.today + timedelta(days=offset), appointment_time=f'{hour}:00', status=status,
+        )
+
+    def admit(self, appointment):
+        from hospitals.models import Admission
+        return Admission.objects.create(
+            patient=self.patient, hospital=self.hospital, appointment=appointment,
+            admission_time=timezone.now() - timedelta(days=2),
+        )
+
+    def test_expires_overdue_active_appointments_in_batches(self):
+        overdue = [self.book(-3, 'PENDING', 9), self.book(-2, 'CONFIRMED', 10), self.book(-1, 'PENDING', 11)]
+        kept = [self.book(-2, 'COMPLETED', 12), self.book(-2, 'CANCELLED', 13), self.book(0, 'PENDING'), self.book(1, 'CONFIRMED')]
+        with self.settings(APPOINTMENT_EXPIRY_DAYS=1):
+            self.assertEqual(Appointment.expire_overdue(batch_size=2), (3, 0))
+        self.assertEqual({a.status for a in Appointment.objects.filter(pk__in=[a.pk for a in overdue])}, {'EXPIRED'})
+        self.assertEqual(
+            list(Appointment.objects.filter(pk__in=[a.pk for a in kept]).order_by('pk').values_list('status', flat=True)),
+            ['COMPLETED', 'CANCELLED', 'PENDING', 'CONFIRMED'],
+        )
+        self.assertEqual(Appointment.expire_overdue(), (0, 0))
+
+    def test_expiry_days_grace(self):
+        self.book(-1, 'PENDING')
+        with self.settings(APPOINTMENT_EXPIRY_DAYS=2):
+            self.assertEqual(Appointment.expire_overdue(), (0, 0))
+
+    def test_unconfirmed_admission_is_discharged_and_bed_freed(self):
+        unseen = self.admit(self.book(-2, 'PENDING', 9))
+        seen = self.admit(self.book(-2, 'CONFIRMED', 10))
+        self.assertEqual(Appointment.expire_overdue(), (2, 1))
+        unseen.refresh_from_db()
+        seen.refresh_from_db()
+        self.assertIsNotNone(unseen.discharge_time)
+        self.assertIsNone(seen.discharge_time)
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.occupied_beds, 1)
+
+    def test_doctor_can_still_complete_expired_appointment(self):
+        apt = self.book(-2, 'CONFIRMED')
+        Appointment.expire_overdue()
+        self.client.force_login(self.doctor_user)
+        self.client.post(reverse('doctors:doctor_appointment_complete', args=[apt.pk]))
+        apt.refresh_from_db()
+        self.assertEqual(apt.status, 'COMPLETED')
+
+    def test_periodic_task(self):
+        from taskqueue.worker import run_pending
+        from .tasks import expire_appointments
+        apt = self.book(-2, 'PENDING')
+        expire_appointments.delay()
+        run_pending()
+        apt.refresh_from_db()
+        self.assertEqual(apt.status, 'EXPIRED')
+
+
+class AppointmentArchiveTests(TestCase):
+    """Old finished appointments move to the archive; history reads it only for old pages."""
+
+    def setUp(self):
+        self.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        self.doctor_user = User.objects.create_user(
+            username='doc', email='doc@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+        self.today = timezone.now().date()
+
+    def book(self, offset, status='COMPLETED', hour=10):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor_user, reason='Checkup', status=status,
+            appointment_date=self.today + timedelta(days=offset), appointment_time=f'{hour}:00',
+        )
+
+    def test_archives_old_finished_appointments_only(self):
+        from documents.models import Document
+        from .models import ArchivedAppointment
+        old = [self.book(-100 - i) for i in range(5)] + [self.book(-100, 'CANCELLED', 11), self.book(-100, 'EXPIRED', 12)]
+        kept = [self.book(-100, 'PENDING', 13), self.book(-10), self.book(-100, hour=14)]
+        Document.objects.create(patient=self.patient, appointment=kept[2], document_type='LAB_REPORT', title='Blood test', file='x.pdf')
+        with self.settings(ARCHIVE_AFTER_DAYS=30):
+            self.assertEqual(Appointment.archive_old(batch_size=3), len(old))
+        self.assertEqual(set(ArchivedAppointment.objects.values_list('pk', flat=True)), {a.pk for a in old})
+        self.assertEqual(set(Appointment.objects.values_list('pk', flat=True)), {a.pk for a in kept})
+        archived = ArchivedAppointment.objects.get(pk=old[0].pk)
+        self.assertEqual((archived.status, archived.doctor, archived.created_at), ('COMPLETED', self.doctor_user, old[0].created_at))
+
+    def test_past_tab_merges_archive_only_when_paging_back(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        recent = [self.book(-1 - i) for i in range(20)]
+        old = [self.book(-100 - i) for i in range(10)]
+        with self.settings(ARCHIVE_AFTER_DAYS=30):
+            self.client.force_login(self.patient)
+            url = reverse('appointments:history') + '?tab=past'
+            self.assertEqual(self.client.get(url).context['past_count'], 30)
+            with self.captureOnCommitCallbacks(execute=True):
+                Appointment.archive_old()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            # Archiving retired the cached counts: rebuilt once; the page itself is all live rows
+            self.assertEqual(len([q for q in queries if 'appointments_archive' in q['sql']]), 1)
+            self.assertEqual(response.context['past_count'], 30)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertFalse([q for q in queries if 'appointments_archive' in q['sql']])
+            pks = [a.pk for a in response.context['page_obj']]
+            while response.context['page_obj'].has_next():
+                response = self.client.get(url + '&' + response.context['page_obj'].next_query)
+                pks += [a.pk for a in response.context['page_obj']]
+            self.assertEqual(pks, [a.pk for a in recent + old])
+
+            previous = self.client.get(url + '&' + response.context['page_obj'].previous_query)
+            self.assertEqual([a.pk for a in previous.context['page_obj']], pks[:15])
+
+            response = self.client.get(reverse('appointments:patient_detail', args=[old[0].pk]))
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'Checkup')
+
+    def test_daily_task_archives_admissions_then_appointments(self):
+        from hospitals.models import Admission, ArchivedAdmission
+        from taskqueue.worker import run_pending
+        from .tasks import archive_history
+        from .models import ArchivedAppointment
+        hosp_user = User.objects.create_user(username='h', email='h@test.com', password='pass', role='HOSPITAL', is_approved=True)
+        hospital = Hospital.objects.create(name='H', registration_number='REG1', user=hosp_user)
+        apt = self.book(-100)
+        admitted = timezone.now() - timedelta(days=100)
+        Admission.objects.create(patient=self.patient, hospital=hospital, appointment=apt,
+                                 admission_time=admitted, discharge_time=admitted + timedelta(days=1))
+        with self.settings(ARCHIVE_AFTER_DAYS=30):
+            archive_history.delay()
+            run_pending()
+        self.assertEqual(ArchivedAdmission.objects.get().appointment_id, apt.pk)
+        self.assertTrue(ArchivedAppointment.objects.filter(pk=apt.pk).exists())
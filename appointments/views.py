@@ -6,20 +6,37 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import Q
+from django.http import Http404
+from django.core.paginator import Paginator
 
-from .models import Appointment
+from .models import Appointment, ArchivedAppointment, SlotAlreadyBooked
 from doctors.models import DoctorProfile
+from doctors.availability import (
+    DoctorAvailability, SLOT_FREE, SLOT_INVALID, SLOT_ON_LEAVE, SLOT_PAST,
+    SLOT_DOCTOR_BOOKED, SLOT_PATIENT_BOOKED,
+)
 from hospitals.models import Hospital, DoctorHospitalAssignment
 from accounts.mixins import PatientRequiredMixin
+from healthcare.archive import horizon_date
+from healthcare.pagination import KeysetPaginationMixin
 from documents.models import Document
 
+SLOT_ERROR_MESSAGES = {
+    SLOT_INVALID: 'Please choose one of the available time slots.',
+    SLOT_ON_LEAVE: 'The doctor is on leave on this date.',
+    SLOT_PAST: 'Cannot book a time that has already passed. Please choose a later time today.',
+    SLOT_DOCTOR_BOOKED: 'This time slot is already booked.',
+    SLOT_PATIENT_BOOKED: 'You already have an appointment at this time with another doctor.',
+}
 
-class AppointmentHistoryView(PatientRequiredMixin, ListView):
+
+class AppointmentHistoryView(PatientRequiredMixin, KeysetPaginationMixin, ListView):
     """Patient appointment history - upcoming and past"""
     model = Appointment
     template_name = 'appointments/appointment_history.html'
     context_object_name = 'appointments'
     paginate_by = 15
+    keyset_ordering = ('-appointment_date', '-appointment_time', '-id')
 
     def get_queryset(self):
         """Return appointments filtered by tab, using consistent categorisation."""
@@ -48,21 +65,29 @@ class AppointmentHistoryView(PatientRequiredMixin, ListView):
             status__in=['PENDING', 'CONFIRMED']
         )
 
+    def get_archive_queryset(self):
+        """Archived appointments are all past; read only by the past and cancelled tabs"""
+        tab = self.request.GET.get('tab', 'upcoming')
+        if tab not in ('past', 'cancelled'):
+            return None
+        qs = ArchivedAppointment.objects.filter(patient=self.request.user).select_related('doctor', 'hospital')
+        return qs.filter(status='CANCELLED') if tab == 'cancelled' else qs
+
+    def get_archive_boundary(self):
+        return horizon_date()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         today = timezone.now().date()
         base_qs = Appointment.objects.filter(patient=self.request.user)
 
         context['tab'] = self.request.GET.get('tab', 'upcoming')
-        context['past_count'] = base_qs.filter(
-            Q(appointment_date__lt=today) | Q(status='COMPLETED')
-        ).count()
-        context['upcoming_count'] = base_qs.filter(
-            appointment_date__gt=today,
-            status__in=['PENDING', 'CONFIRMED']
-        ).count()
-        context['today_count'] = base_qs.filter(appointment_date=today).count()
-        context['cancelled_count'] = base_qs.filter(status='CANCELLED').count()
+        stats = base_qs.stats(today)
+        archived = ArchivedAppointment.counts_for(self.request.user)
+        context['past_count'] = stats['past'] + archived['past']
+        context['upcoming_count'] = stats['upcoming']
+        context['today_count'] = stats['today']
+        context['cancelled_count'] = stats['cancelled'] + archived['cancelled']
         return context
 
 
@@ -132,36 +157,30 @@ def book_normal_appointment(request, doctor_id):
                 messages.error(request, e)
             return redirect('appointments:book_normal', doctor_id=doctor_id)
 
-        # Check double booking for this doctor (global across hospitals)
-        if Appointment.objects.filter(
-            doctor=doctor.user,
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            status__in=['PENDING', 'CONFIRMED']
-        ).exists():
-            messages.error(request, 'This time slot is already booked.')
+        # Slot must be on the doctor's schedule and not on a leave day
+        slot_status = DoctorAvailability(
+            doctor, start=appointment_date, days=1, include_bookings=False
+        ).day(appointment_date).check(appointment_time)
+        if slot_status != SLOT_FREE:
+            messages.error(request, SLOT_ERROR_MESSAGES.get(slot_status, 'This time slot is not available.'))
             return redirect('appointments:book_normal', doctor_id=doctor_id)
 
-        # Prevent patient from booking two appointments at the same time (any doctor)
-        if Appointment.objects.filter(
-            patient=request.user,
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            status__in=['PENDING', 'CONFIRMED']
-        ).exists():
-            messages.error(request, 'You already have an appointment at this time with another doctor.')
+        # Double booking (doctor globally across hospitals, or patient with any
+        # doctor) is rejected by the database constraints on insert
+        try:
+            appointment = Appointment.reserve(
+                patient=request.user,
+                doctor=doctor.user,
+                hospital=hospital,
+                appointment_date=appointment_date,
+                appointment_time=appointment_time,
+                reason=reason,
+                is_emergency=False,
+                status='PENDING'
+            )
+        except SlotAlreadyBooked as exc:
+            messages.error(request, SLOT_ERROR_MESSAGES[SLOT_DOCTOR_BOOKED if exc.by_doctor else SLOT_PATIENT_BOOKED])
             return redirect('appointments:book_normal', doctor_id=doctor_id)
-
-        appointment = Appointment.objects.create(
-            patient=request.user,
-            doctor=doctor.user,
-            hospital=hospital,
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            reason=reason,
-            is_emergency=False,
-            status='PENDING'
-        )
         # Optional: patient uploaded medical reports during booking
         files = request.FILES.getlist('reports')
         for f in files:
@@ -183,6 +202,12 @@ def book_normal_appointment(request, doctor_id):
                 file=f,
                 uploaded_by=request.user,
             )
+        # Large files already sent through the chunked upload API (documents.views.upload_*)
+        upload_ids = [pk for pk in request.POST.getlist('uploaded_documents') if pk.isdigit()]
+        if upload_ids:
+            Document.objects.filter(
+                pk__in=upload_ids, patient=request.user, appointment__isnull=True, upload_session__isnull=False,
+            ).update(appointment=appointment, doctor=doctor.user, hospital=hospital)
         messages.success(request, 'Appointment booked successfully! Status: Pending.')
         return redirect('appointments:history')
 
@@ -198,18 +223,16 @@ def emergency_hospital_list(request):
     # Optional search
     q = request.GET.get('q', '').strip()
     city = request.GET.get('city', '').strip()
-    hospitals_qs = Hospital.objects.select_related('user').order_by('name')
+    # Bed availability is annotated and filtered in SQL; only the current page is loaded
+    hospitals_qs = Hospital.objects.with_available_beds().order_by('name', 'pk')
     if q:
         hospitals_qs = hospitals_qs.filter(
             Q(name__icontains=q) | Q(address__icontains=q) | Q(city__icontains=q)
         )
     if city:
         hospitals_qs = hospitals_qs.filter(city__icontains=city)
-    # Filter to only hospitals with available beds (computed dynamically)
-    hospitals = [h for h in hospitals_qs if h.available_beds_count > 0]
 
-    from django.core.paginator import Paginator
-    paginator = Paginator(hospitals, 10)
+    paginator = Paginator(hospitals_qs, 10)
     page = request.GET.get('page', 1)
     hospitals = paginator.get_page(page)
 
@@ -245,6 +268,10 @@ def confirm_emergency_booking(request):
 
     with transaction.atomic():
         from hospitals.models import Admission
+        # Claim the bed first: the conditional UPDATE fails when the last bed was just taken
+        if not hospital.claim_bed():
+            messages.error(request, 'No beds available at this hospital.')
+            return redirect('appointments:emergency_booking')
         now = timezone.now()
         apt = Appointment.objects.create(
             patient=request.user,
@@ -285,6 +312,16 @@ class PatientAppointmentDetailView(PatientRequiredMixin, DetailView):
             'doctor', 'hospital'
         )
 
+    def get_object(self, queryset=None):
+        try:
+            return super().get_object(queryset)
+        except Http404:
+            # Old appointments live in the archive under the same id
+            return get_object_or_404(
+                ArchivedAppointment.objects.select_related('doctor', 'hospital'),
+                pk=self.kwargs['pk'], patient=self.request.user,
+            )
+
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
         # Allow detail page only for completed / past appointments
@@ -298,7 +335,7 @@ class PatientAppointmentDetailView(PatientRequiredMixin, DetailView):
         apt = self.object
         # Documents linked to this appointment (patient or doctor uploaded)
         context['appointment_documents'] = Document.objects.filter(
-            appointment=apt,
+            appointment_id=apt.pk,
             patient=self.request.user
         ).select_related('doctor', 'hospital')
         # Flags for template visibility
@@ -323,9 +360,8 @@ def cancel_appointment(request, pk):
             if appointment.is_emergency and appointment.hospital:
                 from hospitals.models import Admission
                 admission = Admission.objects.filter(appointment=appointment).first()
-                if admission and admission.discharge_time is None:
-                    admission.discharge_time = timezone.now()
-                    admission.save()
+                if admission:
+                    admission.discharge()
             appointment.status = 'CANCELLED'
             appointment.save()
         messages.success(request, 'Appointment cancelled successfully.')
@@ -0,0 +1,175 @@
+"""Slot availability engine for doctors.
+
+Free slots for a whole booking window (14 days by default) are computed from
+one bounded Appointment query plus one DoctorLeave query. Each day is kept as
+an integer bitmap over the doctor's slot grid: bit ``i`` is set when the
+``i``-th slot (``available_from + i * slot_duration_minutes``) is free.
+
+Shared by DoctorDetailView (slot lists for every date) and
+appointments.views.book_normal_appointment (schedule/leave validation; slot
+conflicts there are enforced by Appointment's unique constraints).
+"""
+from datetime import time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from appointments.models import Appointment
+from .models import DoctorLeave
+
+# Statuses that hold a slot
+ACTIVE_STATUSES = Appointment.ACTIVE_STATUSES
+# Number of days (starting today) patients can book
+BOOKING_WINDOW_DAYS = 14
+
+# Reasons returned by DayAvailability.check()
+SLOT_FREE = 'free'
+SLOT_INVALID = 'invalid'
+SLOT_ON_LEAVE = 'leave'
+SLOT_PAST = 'past'
+SLOT_DOCTOR_BOOKED = 'doctor_booked'
+SLOT_PATIENT_BOOKED = 'patient_booked'
+
+
+def slot_grid(doctor):
+    """Start times of the doctor's slots within working hours, in order"""
+    step = doctor.slot_duration_minutes or 0
+    if step <= 0:
+        return []
+    start = doctor.available_from.hour * 60 + doctor.available_from.minute
+    end = doctor.available_to.hour * 60 + doctor.available_to.minute
+    return [time(m // 60, m % 60) for m in range(start, end, step)]
+
+
+class DayAvailability:
+    """Bitmaps of one day's slots for a doctor (and optionally the booking patient)"""
+
+    __slots__ = ('date', 'slots', 'on_leave', 'past_mask', 'doctor_mask', 'patient_mask')
+
+    def __init__(self, date, slots, on_leave=False, past_mask=0, doctor_mask=0, patient_mask=0):
+        self.date = date
+        self.slots = slots
+        self.on_leave = on_leave
+        self.past_mask = past_mask
+        self.doctor_mask = doctor_mask
+        self.patient_mask = patient_mask
+
+    @property
+    def free_mask(self):
+        if self.on_leave:
+            return 0
+        full = (1 << len(self.slots)) - 1
+        return full & ~(self.past_mask | self.doctor_mask | self.patient_mask)
+
+    @property
+    def free_slots(self):
+        mask = self.free_mask
+        return [t for i, t in enumerate(self.slots) if mask >> i & 1]
+
+    def check(self, slot_time):
+        """Return SLOT_FREE or the reason the given time cannot be booked"""
+        if self.on_leave:
+            return SLOT_ON_LEAVE
+        try:
+            bit = 1 << self.slots.index(slot_time)
+        except ValueError:
+            return SLOT_INVALID
+        if self.past_mask & bit:
+            return SLOT_PAST
+        if self.doctor_mask & bit:
+            return SLOT_DOCTOR_BOOKED
+        if self.patient_mask & bit:
+            return SLOT_PATIENT_BOOKED
+        return SLOT_FREE
+
+
+class DoctorAvailability:
+    """Free slots of one doctor for ``days`` consecutive dates from ``start``.
+
+    - Booked slots are GLOBAL per doctor (any hospital).
+    - When ``patient`` is given, slots where that patient already has an
+      appointment (with any doctor) are hidden too.
+    - Past slots of today and leave dates are never free.
+    - ``include_bookings=False`` skips the Appointment query (schedule and
+      leave only); booking relies on the database constraints instead.
+    - ``leave_dates`` (any superset of the window's leave days, e.g. the
+      cached read model of the doctor) skips the DoctorLeave query.
+    """
+
+    def __init__(self, doctor, start=None, days=BOOKING_WINDOW_DAYS, patient=None, include_bookings=True,
+                 leave_dates=None):
+        now = timezone.now()
+        self.doctor = doctor
+        self.start = start or now.date()
+        self.end = self.start + timedelta(days=days - 1)
+        self.slots = slot_grid(doctor)
+        index = {t: i for i, t in enumerate(self.slots)}
+
+        if leave_dates is None:
+            leave_dates = DoctorLeave.objects.filter(
+                doctor=doctor, leave_date__range=(self.start, self.end)
+            ).values_list('leave_date', flat=True)
+        leave_dates = set(leave_dates)
+
+        self.days = {}
+        for i in range(days):
+            d = self.start + timedelta(days=i)
+            past_mask = 0
+            if d == now.date():
+                now_time = now.time()
+                for j, t in enumerate(self.slots):
+                    if t <= now_time:
+                        past_mask |= 1 << j
+            elif d < now.date():
+                past_mask = (1 << len(self.slots)) - 1
+            self.days[d] = DayAvailability(d, self.slots, d in leave_dates, past_mask)
+
+        if include_bookings:
+            self._mark_bookings(patient, index)
+
+    def booked_appointments(self, patient=None):
+        """Active appointments in the window held by the doctor or by ``patient``"""
+        # Window conditions repeated per OR branch so each side is one range search on
+        # appt_doctor_date_status_idx / appt_patient_date_status_idx
+        window = Q(appointment_date__range=(self.start, self.end), status__in=ACTIVE_STATUSES)
+        owners = Q(doctor=self.doctor.user) & window
+        patient_id = getattr(patient, 'pk', None)
+        if patient_id is not None:
+            owners |= Q(patient_id=patient_id) & window
+        return Appointment.objects.filter(owners)
+
+    def _mark_bookings(self, patient, index):
+        doctor = self.doctor
+        patient_id = getattr(patient, 'pk', None)
+        booked = self.booked_appointments(patient).values_list(
+            'doctor_id', 'patient_id', 'appointment_date', 'appointment_time'
+        )
+        for doctor_id, apt_patient_id, apt_date, apt_time in booked:
+            day = self.days.get(apt_date)
+            j = index.get(apt_time)
+            if day is None or j is None:
+                continue
+            if doctor_id == doctor.user_id:
+                day.doctor_mask |= 1 << j
+            if patient_id is not None and apt_patient_id == patient_id:
+                day.patient_mask |= 1 << j
+
+    def day(self, date):
+        """DayAvailability for a date inside the window, or None"""
+        return self.days.get(date)
+
+    def available_dates(self):
+        """Dates in the window that are not leave days"""
+        return [d for d, day in self.days.items() if not day.on_leave]
+
+    def free_slots(self, date):
+        day = self.days.get(date)
+        return day.free_slots if day else []
+
+    def as_dict(self):
+        """{'YYYY-MM-DD': ['HH:MM', ...]} for every bookable date (for JSON in templates)"""
+        return {
+            d.isoformat(): [t.strftime('%H:%M') for t in day.free_slots]
+            for d, day in self.days.items()
+            if not day.on_leave
+        }
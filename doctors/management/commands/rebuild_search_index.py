@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from doctors import search as doctor_search
+from hospitals import search as hospital_search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the doctor and hospital full-text search indexes (SQLite FTS5)'
+
+    def handle(self, *args, **options):
+        for label, index in (('doctor', doctor_search), ('hospital', hospital_search)):
+            if not index.is_enabled():
+                self.stdout.write(self.style.WARNING(f'Full-text {label} search is not available on this database; skipped.'))
+                continue
+            count = index.rebuild_index()
+            self.stdout.write(self.style.SUCCESS(f'Indexed {count} {label}(s).'))
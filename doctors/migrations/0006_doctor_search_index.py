@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-17 11:20
+
+from django.db import migrations, DatabaseError
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the FTS5 table (SQLite only; skipped when FTS5 is not compiled in)"""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS doctor_search USING fts5("
+            "name, specialization, qualification, bio, hospitals, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+    except DatabaseError:
+        return
+
+    DoctorProfile = apps.get_model('doctors', 'DoctorProfile')
+    DoctorHospitalAssignment = apps.get_model('hospitals', 'DoctorHospitalAssignment')
+    labels = dict(DoctorProfile._meta.get_field('specialization').choices)
+    assigned = {}
+    for doctor_id, name in DoctorHospitalAssignment.objects.filter(is_active=True).values_list('doctor_id', 'hospital__name'):
+        assigned.setdefault(doctor_id, set()).add(name)
+    for doctor in DoctorProfile.objects.select_related('user', 'hospital'):
+        hospitals = assigned.get(doctor.pk, set())
+        if doctor.hospital_id:
+            hospitals.add(doctor.hospital.name)
+        user = doctor.user
+        schema_editor.execute(
+            "INSERT INTO doctor_search (rowid, name, specialization, qualification, bio, hospitals) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [
+                doctor.pk,
+                ' '.join(filter(None, [user.first_name, user.last_name, user.username])),
+                f'{labels.get(doctor.specialization, doctor.specialization)} {doctor.specialization}',
+                doctor.qualification or '',
+                doctor.bio or '',
+                ' '.join(sorted(hospitals)),
+            ],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS doctor_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0005_doctorprofileupdaterequest_doctorleave'),
+        ('hospitals', '0007_hospital_occupied_beds'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,106 @@
+"""Full-text doctor search backed by an SQLite FTS5 table.
+
+``doctor_search`` holds one row per DoctorProfile (rowid = profile id) with the
+doctor's name, specialization, qualification, bio and the names of the
+hospitals they work at. Rows are kept in sync by doctors.signals; the table is
+created by migration 0006 and can be rebuilt with ``manage.py rebuild_search_index``.
+
+On databases without FTS5 (or before the table exists) ``is_enabled()`` is False
+and DoctorSearchView falls back to the ORM ``icontains`` filters.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from healthcare.fts import build_match, ranked, table_exists
+
+TABLE = 'doctor_search'
+# bm25 column weights: name, specialization, qualification, bio, hospitals
+RANK_WEIGHTS = (10.0, 4.0, 2.0, 0.5, 2.0)
+
+
+def is_enabled():
+    """True when the FTS table exists on the default (SQLite) database"""
+    return table_exists(TABLE)
+
+
+def document_for(doctor, hospital_names=None):
+    """Indexed column values for one DoctorProfile (``hospital_names``: names of the
+    actively assigned hospitals, when already known)"""
+    from hospitals.models import Hospital
+    user = doctor.user
+    if hospital_names is None:
+        hospital_names = Hospital.objects.filter(
+            doctor_assignments__doctor=doctor, doctor_assignments__is_active=True
+        ).values_list('name', flat=True)
+    hospital_names = set(hospital_names)
+    if doctor.hospital_id:
+        hospital_names.add(doctor.hospital.name)
+    return (
+        ' '.join(filter(None, [user.first_name, user.last_name, user.username])),
+        f'{doctor.get_specialization_display()} {doctor.specialization}',
+        doctor.qualification or '',
+        doctor.bio or '',
+        ' '.join(sorted(hospital_names)),
+    )
+
+
+def index_doctor(doctor):
+    """Insert or replace the search row for a DoctorProfile"""
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [doctor.pk])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, name, specialization, qualification, bio, hospitals) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            [doctor.pk, *document_for(doctor)],
+        )
+
+
+def index_doctor_ids(doctor_ids):
+    from .models import DoctorProfile
+    for doctor in DoctorProfile.objects.filter(pk__in=list(doctor_ids)).select_related('user', 'hospital'):
+        index_doctor(doctor)
+
+
+def remove_doctor(doctor_id):
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [doctor_id])
+
+
+def rebuild_index():
+    """Re-index every doctor in one transaction; returns the number of rows written"""
+    from hospitals.models import DoctorHospitalAssignment
+    from .models import DoctorProfile
+    if not is_enabled():
+        return 0
+    assigned = defaultdict(list)
+    for doctor_id, name in DoctorHospitalAssignment.objects.filter(is_active=True).values_list('doctor_id', 'hospital__name'):
+        assigned[doctor_id].append(name)
+    rows = [
+        (doctor.pk, *document_for(doctor, assigned.get(doctor.pk, ())))
+        for doctor in DoctorProfile.objects.select_related('user', 'hospital').iterator()
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, name, specialization, qualification, bio, hospitals) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            rows,
+        )
+    return len(rows)
+
+
+def search_doctors(queryset, q='', hospital=''):
+    """``queryset`` of DoctorProfiles limited to those matching the query, annotated with
+    ``search_rank`` (order by it for best match first); None if FTS is unavailable"""
+    if not is_enabled():
+        return None
+    clauses = [m for m in (build_match(q), build_match(hospital, column='hospitals')) if m]
+    if not clauses:
+        return None
+    match = ' AND '.join(f'({c})' for c in clauses)
+    return ranked(queryset, TABLE, match, RANK_WEIGHTS)
@@ -0,0 +1,104 @@
+"""Keep the doctor full-text search index (doctors.search) and the cached detail
+page read models (healthcare.cache) in sync.
+
+The FTS table lives in the same database, so rows are written inside the
+caller's transaction and roll back with it; cache versions are bumped on commit.
+"""
+from django.conf import settings
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from healthcare import cache
+from hospitals.models import Hospital, DoctorHospitalAssignment
+from . import search
+from .models import DoctorProfile, DoctorLeave
+
+
+def _reindex(doctor_ids):
+    if search.is_enabled():
+        search.index_doctor_ids(doctor_ids)
+
+
+@receiver(post_save, sender=DoctorProfile)
+def doctor_profile_saved(sender, instance, **kwargs):
+    _reindex([instance.pk])
+
+
+@receiver(post_delete, sender=DoctorProfile)
+def doctor_profile_deleted(sender, instance, **kwargs):
+    search.remove_doctor(instance.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def doctor_user_saved(sender, instance, update_fields=None, **kwargs):
+    if instance.role != 'DOCTOR':
+        return
+    if update_fields and not {'first_name', 'last_name', 'username'} & set(update_fields):
+        return
+    _reindex(DoctorProfile.objects.filter(user=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=DoctorHospitalAssignment)
+@receiver(post_delete, sender=DoctorHospitalAssignment)
+def assignment_changed(sender, instance, **kwargs):
+    _reindex([instance.doctor_id])
+
+
+@receiver(post_save, sender=Hospital)
+def hospital_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or (update_fields and 'name' not in update_fields):
+        return
+    _reindex(instance.get_doctors().values_list('pk', flat=True))
+
+
+# Detail page read models: a doctor's page lists their hospitals and leave; a
+# hospital's page lists its doctors
+
+# User fields shown on the doctor and hospital detail pages (or deciding who is listed)
+DETAIL_USER_FIELDS = {'first_name', 'last_name', 'username', 'phone_number', 'profile_picture', 'is_approved', 'is_active'}
+
+
+def _invalidate_doctor(doctor, *extra_hospital_ids):
+    hospital_ids = set(
+        DoctorHospitalAssignment.objects.filter(doctor_id=doctor.pk).values_list('hospital_id', flat=True)
+    )
+    cache.invalidate(cache.DOCTOR, doctor.pk)
+    cache.invalidate(cache.HOSPITAL, doctor.hospital_id, *hospital_ids, *extra_hospital_ids)
+
+
+@receiver(pre_save, sender=DoctorProfile)
+def doctor_profile_pre_save(sender, instance, **kwargs):
+    # A doctor moving hospital (legacy FK) leaves the old hospital's page
+    instance._previous_hospital_id = (
+        DoctorProfile.objects.filter(pk=instance.pk).values_list('hospital_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=DoctorProfile)
+@receiver(post_delete, sender=DoctorProfile)
+def doctor_profile_changed(sender, instance, **kwargs):
+    _invalidate_doctor(instance, getattr(instance, '_previous_hospital_id', None))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def doctor_user_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or instance.role != 'DOCTOR':
+        return
+    if update_fields and not DETAIL_USER_FIELDS & set(update_fields):
+        return
+    for doctor in DoctorProfile.objects.filter(user=instance).only('pk', 'hospital_id'):
+        _invalidate_doctor(doctor)
+
+
+@receiver(post_save, sender=DoctorLeave)
+@receiver(post_delete, sender=DoctorLeave)
+def doctor_leave_changed(sender, instance, **kwargs):
+    cache.invalidate(cache.DOCTOR, instance.doctor_id)
+
+
+@receiver(post_save, sender=DoctorHospitalAssignment)
+@receiver(post_delete, sender=DoctorHospitalAssignment)
+def assignment_changed_cache(sender, instance, **kwargs):
+    cache.invalidate(cache.DOCTOR, instance.doctor_id)
+    cache.invalidate(cache.HOSPITAL, instance.hospital_id)
@@ -5,6 +5,7 @@ from accounts.models import User
 from .models import DoctorProfile
 from hospitals.models import Hospital
 from appointments.models import Appointment
+from healthcare.query_budgets import QueryBudgetTestCase
 
 
 class DoctorSelfOnlySecurityTests(TestCase):
@@ -130,3 +131,251 @@ class SlotConflictGlobalTests(TestCase):
         view.object = profile
         slots = view._get_available_slots(profile, appointment_date)
         self.assertNotIn(time(10, 0), slots, '10 AM must be excluded globally once booked at any hospital')
+
+
+class DoctorAvailabilityEngineTests(TestCase):
+    """Availability for the whole booking window comes from one bounded query per table."""
+
+    def setUp(self):
+        from datetime import time
+        self.doctor_user = User.objects.create_user(
+            username='doc', email='doc@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+        self.profile = DoctorProfile.objects.create(
+            user=self.doctor_user, license_number='L1', qualification='MBBS', specialization='GENERAL',
+            available_from=time(9, 0), available_to=time(11, 0), slot_duration_minutes=30,
+        )
+        self.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        self.other_doctor = User.objects.create_user(
+            username='doc2', email='doc2@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+
+    def test_window_bitmaps_exclude_bookings_and_leave(self):
+        from datetime import time, timedelta
+        from django.utils import timezone
+        from .availability import DoctorAvailability
+        from .models import DoctorLeave
+
+        start = timezone.now().date() + timedelta(days=1)
+        leave_day = start + timedelta(days=2)
+        DoctorLeave.objects.create(doctor=self.profile, leave_date=leave_day)
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor_user, appointment_date=start,
+            appointment_time=time(9, 30), reason='Visit', status='PENDING',
+        )
+        # Patient's own booking with another doctor on a later day
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.other_doctor, appointment_date=start + timedelta(days=1),
+            appointment_time=time(10, 0), reason='Visit', status='CONFIRMED',
+        )
+        # Cancelled appointments do not hold a slot
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor_user, appointment_date=start + timedelta(days=3),
+            appointment_time=time(9, 0), reason='Visit', status='CANCELLED',
+        )
+
+        with self.assertNumQueries(2):
+            availability = DoctorAvailability(self.profile, start=start, days=14, patient=self.patient)
+
+        self.assertEqual(availability.free_slots(start), [time(9, 0), time(10, 0), time(10, 30)])
+        self.assertEqual(availability.day(start).free_mask, 0b1101)
+        self.assertEqual(
+            availability.free_slots(start + timedelta(days=1)), [time(9, 0), time(9, 30), time(10, 30)]
+        )
+        self.assertEqual(availability.free_slots(leave_day), [])
+        self.assertNotIn(leave_day, availability.available_dates())
+        self.assertEqual(len(availability.free_slots(start + timedelta(days=3))), 4)
+        self.assertEqual(len(availability.available_dates()), 13)
+
+    def test_check_reports_reason(self):
+        from datetime import time, timedelta
+        from django.utils import timezone
+        from .availability import (
+            DoctorAvailability, SLOT_FREE, SLOT_INVALID, SLOT_DOCTOR_BOOKED,
+        )
+
+        day = timezone.now().date() + timedelta(days=1)
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor_user, appointment_date=day,
+            appointment_time=time(9, 0), reason='Visit', status='PENDING',
+        )
+        availability = DoctorAvailability(self.profile, start=day, days=1)
+        self.assertEqual(availability.day(day).check(time(9, 0)), SLOT_DOCTOR_BOOKED)
+        self.assertEqual(availability.day(day).check(time(9, 30)), SLOT_FREE)
+        self.assertEqual(availability.day(day).check(time(9, 15)), SLOT_INVALID)
+        self.assertEqual(availability.day(day).check(time(11, 0)), SLOT_INVALID)
+
+    def test_detail_page_embeds_slots_for_every_date(self):
+        from datetime import timedelta
+        from django.urls import reverse
+        from django.utils import timezone
+
+        hosp_user = User.objects.create_user(
+            username='h', email='h@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        self.profile.hospital = Hospital.objects.create(name='H', registration_number='REG1', user=hosp_user)
+        self.profile.save()
+        self.client.force_login(self.patient)
+        day = timezone.now().date() + timedelta(days=5)
+        response = self.client.get(reverse('doctors:doctor_detail', kwargs={'pk': self.profile.pk}), {'date': day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['slots_by_date']), 14)
+        self.assertEqual(response.context['slots_by_date'][day.isoformat()], ['09:00', '09:30', '10:00', '10:30'])
+        self.assertEqual(len(response.context['available_slots']), 4)
+        self.assertContains(response, 'id="slots-by-date"')
+
+
+class DoctorFullTextSearchTests(TestCase):
+    """Doctor search uses the FTS5 index (kept in sync by signals) with an ORM fallback."""
+
+    def setUp(self):
+        from hospitals.models import DoctorHospitalAssignment
+        hosp_user = User.objects.create_user(
+            username='h', email='h@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        self.hospital = Hospital.objects.create(name='Sunrise Heart Institute', registration_number='REG1', user=hosp_user)
+        self.cardio_user = User.objects.create_user(
+            username='dr_patel', email='patel@test.com', password='pass', role='DOCTOR', is_approved=True,
+            first_name='Anita', last_name='Patel',
+        )
+        self.cardio = DoctorProfile.objects.create(
+            user=self.cardio_user, license_number='L1', qualification='MBBS, DM Cardiology',
+            specialization='CARDIOLOGY', bio='Interventional cardiologist.',
+        )
+        DoctorHospitalAssignment.objects.create(doctor=self.cardio, hospital=self.hospital)
+        other_user = User.objects.create_user(
+            username='dr_shah', email='shah@test.com', password='pass', role='DOCTOR', is_approved=True,
+            first_name='Ravi', last_name='Shah',
+        )
+        self.general = DoctorProfile.objects.create(
+            user=other_user, license_number='L2', qualification='MBBS', specialization='GENERAL',
+            hospital=self.hospital,
+        )
+        self.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+
+    def _search(self, **params):
+        from django.urls import reverse
+        self.client.force_login(self.patient)
+        response = self.client.get(reverse('doctors:doctor_search'), params)
+        return [d.pk for d in response.context['doctors']]
+
+    def test_index_enabled_on_sqlite(self):
+        from . import search
+        self.assertTrue(search.is_enabled())
+
+    def test_prefix_search_across_columns(self):
+        self.assertEqual(self._search(q='pat'), [self.cardio.pk])
+        self.assertEqual(self._search(q='cardio'), [self.cardio.pk])
+        self.assertEqual(self._search(q='ravi sh'), [self.general.pk])
+        self.assertEqual(set(self._search(hospital='sunrise')), {self.cardio.pk, self.general.pk})
+        self.assertEqual(self._search(q='"; DROP'), [])
+
+    def test_signals_keep_index_in_sync(self):
+        self.cardio_user.first_name = 'Leela'
+        self.cardio_user.save()
+        self.assertEqual(self._search(q='leela'), [self.cardio.pk])
+        self.assertEqual(self._search(q='anita'), [])
+
+        self.hospital.name = 'Lakeside Hospital'
+        self.hospital.save()
+        self.assertEqual(set(self._search(hospital='lakeside')), {self.cardio.pk, self.general.pk})
+
+        self.cardio.hospital_assignments.all().delete()
+        self.assertEqual(self._search(hospital='lakeside'), [self.general.pk])
+
+    def test_filters_and_pagination_cover_every_match(self):
+        from django.urls import reverse
+        # Better-ranked matches the view filters out must not crowd out the ones it keeps
+        for i in range(15):
+            user = User.objects.create_user(
+                username=f'dr_p{i}', email=f'p{i}@test.com', password='pass', role='DOCTOR',
+                is_approved=i >= 5, first_name='Patel', last_name='Patel',
+            )
+            DoctorProfile.objects.create(
+                user=user, license_number=f'LP{i}', qualification='MBBS', specialization='GENERAL',
+                hospital=self.hospital,
+            )
+        self.client.force_login(self.patient)
+        response = self.client.get(reverse('doctors:doctor_search'), {'q': 'patel', 'specialization': 'GENERAL'})
+        self.assertEqual(response.context['paginator'].count, 10)
+        self.assertEqual(len(response.context['doctors']), 10)
+        self.assertTrue(all(d.user.is_approved for d in response.context['doctors']))
+        response = self.client.get(reverse('doctors:doctor_search'), {'q': 'patel', 'page': 2})
+        self.assertEqual(response.context['paginator'].count, 11)
+        self.assertEqual(len(response.context['doctors']), 1)
+
+    def test_orm_fallback_without_fts(self):
+        from unittest import mock
+        with mock.patch('doctors.search.is_enabled', return_value=False):
+            self.assertEqual(self._search(q='patel'), [self.cardio.pk])
+            self.assertEqual(set(self._search(hospital='sunrise')), {self.cardio.pk, self.general.pk})
+
+
+class DoctorsQueryBudgetTests(QueryBudgetTestCase):
+    """Every doctors page stays within its query budget and does not scale with the data"""
+    namespace = 'doctors'
+
+    def test_routes_within_budget(self):
+        self.check_budgets()
+
+
+class DoctorDetailCacheTests(TestCase):
+    """Hospitals and leave of the doctor detail page are cached until a signal retires them."""
+
+    def setUp(self):
+        hospital_user = User.objects.create_user(
+            username='hosp', email='hosp@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        self.hospital = Hospital.objects.create(user=hospital_user, name='City Hospital', registration_number='R1')
+        self.doctor_user = User.objects.create_user(
+            username='doc', email='doc@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+        self.profile = DoctorProfile.objects.create(
+            user=self.doctor_user, license_number='L1', qualification='MBBS', hospital=self.hospital,
+        )
+        self.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        self.client.force_login(self.patient)
+        self.url = reverse('doctors:doctor_detail', kwargs={'pk': self.profile.pk})
+
+    def test_repeat_view_is_served_from_cache(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get(self.url)
+        self.assertLess(len(warm), len(cold))
+        self.assertEqual([h.name for h in response.context['doctor_hospitals']], ['City Hospital'])
+
+    def test_leave_and_assignment_changes_invalidate(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from hospitals.models import DoctorHospitalAssignment
+        from .models import DoctorLeave
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        self.assertIn(tomorrow, self.client.get(self.url).context['available_dates'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DoctorLeave.objects.create(doctor=self.profile, leave_date=tomorrow)
+        self.assertNotIn(tomorrow, self.client.get(self.url).context['available_dates'])
+
+        other_user = User.objects.create_user(
+            username='hosp2', email='hosp2@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Hospital.objects.create(user=other_user, name='Lake Hospital', registration_number='R2')
+            DoctorHospitalAssignment.objects.create(doctor=self.profile, hospital=other)
+        names = [h.name for h in self.client.get(self.url).context['doctor_hospitals']]
+        self.assertEqual(names, ['City Hospital', 'Lake Hospital'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.name = 'Lakeside Hospital'
+            other.save()
+        names = [h.name for h in self.client.get(self.url).context['doctor_hospitals']]
+        self.assertEqual(names, ['City Hospital', 'Lakeside Hospital'])
@@ -3,14 +3,18 @@ from decimal import Decimal
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, DetailView, TemplateView, FormView
 from django.views import View
-from django.db.models import Q
+from django.db.models import Q, Exists, OuterRef
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils import timezone
 from django.urls import reverse_lazy
 
 from accounts.mixins import DoctorRequiredMixin
+from healthcare import cache
+from healthcare.pagination import KeysetPaginationMixin
 from .models import DoctorProfile, DoctorLeave
+from .availability import DoctorAvailability, BOOKING_WINDOW_DAYS
+from . import search
 from appointments.models import Appointment
 from hospitals.models import Hospital, DoctorHospitalRequest, DoctorHospitalAssignment
 
@@ -28,20 +32,28 @@ class DoctorSearchView(LoginRequiredMixin, ListView):
             user__is_approved=True,
             user__is_active=True
         ).filter(
-            Q(hospital__isnull=False) | Q(hospital_assignments__is_active=True)
-        ).distinct()
+            Q(hospital__isnull=False) |
+            Exists(DoctorHospitalAssignment.objects.filter(doctor=OuterRef('pk'), is_active=True))
+        )
         q = self.request.GET.get('q', '').strip()
         specialization = self.request.GET.get('specialization', '').strip()
         hospital_name = self.request.GET.get('hospital', '').strip()
 
+        if specialization:
+            qs = qs.filter(specialization=specialization)
+
+        # Ranked full-text search (name, specialization, qualification, bio, hospitals)
+        ranked = search.search_doctors(qs, q, hospital_name) if (q or hospital_name) else None
+        if ranked is not None:
+            return ranked.order_by('search_rank', 'pk')
+
+        # Fallback for databases without FTS
         if q:
             qs = qs.filter(
                 Q(user__first_name__icontains=q) |
                 Q(user__last_name__icontains=q) |
                 Q(user__username__icontains=q)
             )
-        if specialization:
-            qs = qs.filter(specialization=specialization)
         if hospital_name:
             qs = qs.filter(
                 Q(hospital__name__icontains=hospital_name) |
@@ -75,34 +87,16 @@ class DoctorDetailView(LoginRequiredMixin, DetailView):
         context = super().get_context_data(**kwargs)
         doctor = self.object
         today = timezone.now().date()
-        leave_dates = set(DoctorLeave.objects.filter(doctor=doctor).values_list('leave_date', flat=True))
 
-        # Hospitals where doctor works (legacy + assignments)
-        doctor_hospitals = []
-        if doctor.hospital_id:
-            doctor_hospitals.append(doctor.hospital)
-        for a in DoctorHospitalAssignment.objects.filter(doctor=doctor, is_active=True).select_related('hospital'):
-            if a.hospital not in doctor_hospitals:
-                doctor_hospitals.append(a.hospital)
-        context['doctor_hospitals'] = doctor_hospitals
-
-        # Safe profile picture URL for template
-        context['doctor_profile_picture_url'] = None
-        for obj in (doctor, doctor.user):
-            if getattr(obj, 'profile_picture', None):
-                try:
-                    context['doctor_profile_picture_url'] = obj.profile_picture.url
-                    break
-                except (ValueError, AttributeError):
-                    pass
-
-        # Generate next 14 days as available dates (exclude leave)
-        available_dates = []
-        for i in range(14):
-            d = today + timedelta(days=i)
-            if d not in leave_dates:
-                available_dates.append(d)
-        context['available_dates'] = available_dates
+        # Hospitals, picture URL and leave dates are cached per doctor (see doctors.signals)
+        self.read_model = cache.get_or_build(cache.DOCTOR, doctor.pk, lambda: self.build_read_model(doctor))
+        context['doctor_hospitals'] = self.read_model['hospitals']
+        context['doctor_profile_picture'] = self.read_model['profile_picture']
+
+        # Free slots for the whole booking window (next 14 days, leave excluded)
+        availability = self._get_availability(doctor)
+        context['available_dates'] = availability.available_dates()
+        context['slots_by_date'] = availability.as_dict()
 
         # Get selected date from request
         context['available_slots'] = []
@@ -112,14 +106,50 @@ class DoctorDetailView(LoginRequiredMixin, DetailView):
                 selected_date = datetime.strptime(selected_date_str, '%Y-%m-%d').date()
                 if selected_date >= today:
                     context['selected_date'] = selected_date
-                    context['available_slots'] = self._get_available_slots(doctor, selected_date)
+                    if availability.day(selected_date) is not None:
+                        context['available_slots'] = availability.free_slots(selected_date)
+                    else:
+                        context['available_slots'] = self._get_available_slots(doctor, selected_date)
             except (ValueError, TypeError):
                 pass
 
         return context
 
+    @staticmethod
+    def build_read_model(doctor):
+        """Patient-independent data of the detail page: hospitals where the doctor works
+        (legacy FK + active assignments), profile picture and upcoming leave dates"""
+        doctor_hospitals = []
+        if doctor.hospital_id:
+            doctor_hospitals.append(doctor.hospital)
+        for a in DoctorHospitalAssignment.objects.filter(doctor=doctor, is_active=True).select_related('hospital'):
+            if a.hospital not in doctor_hospitals:
+                doctor_hospitals.append(a.hospital)
+
+        # Doctor photo, else the account photo (rendered with {% thumbnail %})
+        picture = next((obj.profile_picture for obj in (doctor, doctor.user) if obj.profile_picture), None)
+
+        leave_dates = set(
+            DoctorLeave.objects.filter(doctor=doctor, leave_date__gte=timezone.now().date())
+            .values_list('leave_date', flat=True)
+        )
+        return {'hospitals': doctor_hospitals, 'profile_picture': picture, 'leave_dates': leave_dates}
+
+    def _get_availability(self, doctor, start=None, days=BOOKING_WINDOW_DAYS):
+        """Availability for the current patient (if any) so their own bookings are hidden too"""
+        request = getattr(self, 'request', None)
+        user = getattr(request, 'user', None)
+        patient = None
+        if user and user.is_authenticated and getattr(user, 'role', None) == 'PATIENT':
+            patient = user
+        read_model = getattr(self, 'read_model', None)
+        return DoctorAvailability(
+            doctor, start=start, days=days, patient=patient,
+            leave_dates=read_model['leave_dates'] if read_model else None,
+        )
+
     def _get_available_slots(self, doctor, appointment_date):
-        """Generate time slots within doctor's schedule.
+        """Free time slots within doctor's schedule for a single date.
 
         - Booked slots are GLOBAL per doctor (any hospital): if the doctor
           has 10 AM booked at Hospital A, 10 AM is unavailable at Hospital B.
@@ -127,51 +157,7 @@ class DoctorDetailView(LoginRequiredMixin, DetailView):
           any slot where the current patient already has an appointment
           (with any doctor) for that date is also hidden.
         """
-        today = timezone.now().date()
-        now_time = timezone.now().time()
-
-        # Global conflict: exclude any slot already booked for this doctor on this date (any hospital)
-        booked = set(
-            Appointment.objects.filter(
-                doctor=doctor.user,
-                appointment_date=appointment_date,
-                status__in=['PENDING', 'CONFIRMED']
-            ).values_list('appointment_time', flat=True)
-        )
-
-        # Patient-level conflict: times where current user already has an appointment that day
-        patient_booked = set()
-        user = getattr(self.request, 'user', None)
-        if user and user.is_authenticated and getattr(user, 'role', None) == 'PATIENT':
-            patient_booked = set(
-                Appointment.objects.filter(
-                    patient=user,
-                    appointment_date=appointment_date,
-                    status__in=['PENDING', 'CONFIRMED']
-                ).values_list('appointment_time', flat=True)
-            )
-
-        slots = []
-        current = doctor.available_from
-        end = doctor.available_to
-        delta = timedelta(minutes=doctor.slot_duration_minutes)
-
-        while current < end:
-            # Skip past times if today
-            if appointment_date == today and current <= now_time:
-                dt = datetime.combine(appointment_date, current) + delta
-                current = dt.time()
-                continue
-
-            # Skip if this time is taken either by this doctor or by the patient with another doctor
-            if current not in booked and current not in patient_booked:
-                slots.append(current)
-
-            # Advance by slot duration
-            dt = datetime.combine(appointment_date, current) + delta
-            current = dt.time()
-
-        return slots
+        return self._get_availability(doctor, start=appointment_date, days=1).free_slots(appointment_date)
 
 
 def request_join_hospital(request, hospital_id):
@@ -320,11 +306,12 @@ class DoctorAvailabilityView(DoctorRequiredMixin, TemplateView):
         return redirect('doctors:doctor_availability')
 
 
-class DoctorAppointmentListView(DoctorRequiredMixin, ListView):
+class DoctorAppointmentListView(DoctorRequiredMixin, KeysetPaginationMixin, ListView):
     """Today, upcoming, or full history - only own appointments"""
     template_name = 'doctors/doctor_appointment_list.html'
     context_object_name = 'appointments'
     paginate_by = 15
+    keyset_ordering = ('-appointment_date', '-appointment_time', '-id')
 
     def get_queryset(self):
         today = timezone.now().date()
@@ -358,7 +345,7 @@ class DoctorAppointmentDetailView(DoctorRequiredMixin, DetailView):
         now_time = timezone.now().time()
         context['can_approve_reject'] = apt.status == 'PENDING'
         context['can_complete'] = (
-            apt.status in ('PENDING', 'CONFIRMED') and
+            apt.status in ('PENDING', 'CONFIRMED', 'EXPIRED') and
             (apt.appointment_date < today or (apt.appointment_date == today and apt.appointment_time <= now_time))
         )
         context['is_past_completed'] = apt.status == 'COMPLETED'
@@ -406,8 +393,8 @@ def doctor_appointment_complete(request, pk):
     if apt.status == 'COMPLETED':
         messages.info(request, 'Appointment is already completed.')
         return redirect('doctors:doctor_appointment_detail', pk=pk)
-    if apt.status not in ('PENDING', 'CONFIRMED'):
-        messages.error(request, 'Only pending or confirmed appointments can be marked completed.')
+    if apt.status not in ('PENDING', 'CONFIRMED', 'EXPIRED'):
+        messages.error(request, 'Only pending, confirmed or expired appointments can be marked completed.')
         return redirect('doctors:doctor_appointment_detail', pk=pk)
     today = timezone.now().date()
     now_time = timezone.now().time()
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from documents.metadata import inspect_stored
+from documents.models import Document
+
+
+class Command(BaseCommand):
+    help = (
+        'Store size, content type, SHA-256 and dimensions of documents uploaded before they were '
+        'recorded at upload time. Files are read in parallel threads (the work is mostly I/O); '
+        'documents whose file is missing are reported and left unchanged.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Files read concurrently')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--force', action='store_true', help='Recompute documents that already have metadata')
+
+    def handle(self, *args, **options):
+        documents = Document.objects.exclude(file='').order_by('pk')
+        if not options['force']:
+            documents = documents.filter(size_bytes__isnull=True)
+        storage = Document._meta.get_field('file').storage
+        updated = missing = 0
+        last_pk = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            while True:
+                batch = list(documents.filter(pk__gt=last_pk).only('pk', 'file')[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                # Documents can share a file (e.g. seed data): read each name once
+                names = sorted({doc.file.name for doc in batch})
+                found = dict(zip(names, pool.map(lambda name: self.read(storage, name), names)))
+                changed = []
+                for doc in batch:
+                    meta = found[doc.file.name]
+                    if meta is None:
+                        missing += 1
+                        continue
+                    doc.set_metadata(meta)
+                    changed.append(doc)
+                Document.objects.bulk_update(changed, Document.METADATA_FIELDS)
+                updated += len(changed)
+                self.stdout.write(f'{updated} document(s) updated...')
+        self.stdout.write(self.style.SUCCESS(f'Stored metadata of {updated} document(s); {missing} with a missing file.'))
+
+    def read(self, storage, name):
+        try:
+            return inspect_stored(storage, name)
+        except OSError:
+            self.stderr.write(f'Missing or unreadable: {name}')
+            return None
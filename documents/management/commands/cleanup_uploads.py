@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from documents.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete chunked uploads idle for longer than CHUNKED_UPLOAD_EXPIRY and failed ones, '
+        'with their part files. Run periodically (cron).'
+    )
+
+    def handle(self, *args, **options):
+        count = UploadSession.expire_stale()
+        self.stdout.write(self.style.SUCCESS(f'Removed {count} stale upload(s).'))
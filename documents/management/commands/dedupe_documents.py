@@ -0,0 +1,51 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from documents.models import Document, DocumentBlob
+from documents.storage import BLOB_ROOT, get_document_storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Move document files saved before content-addressed storage into medical_documents/blobs/, '
+        'so identical files are kept once and reference-counted. Each original is deleted after its '
+        'documents point at the blob, unless --keep-originals is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-originals', action='store_true', help='Do not delete the old files')
+
+    def handle(self, *args, **options):
+        storage = get_document_storage()
+        names = (
+            Document.objects.exclude(file='').exclude(file__startswith=f'{BLOB_ROOT}/')
+            .values_list('file', flat=True).distinct().order_by('file')
+        )
+        moved = shared = missing = freed = 0
+        blobs_seen = set(DocumentBlob.objects.values_list('name', flat=True))
+        for old_name in list(names):
+            try:
+                size = storage.size(old_name)
+                with storage.open(old_name, 'rb') as fh:
+                    new_name = storage.save(old_name, File(fh))
+            except OSError:
+                missing += 1
+                self.stderr.write(f'Missing or unreadable: {old_name}')
+                continue
+            sha256 = new_name.rsplit('/', 1)[-1].split('.', 1)[0]
+            with transaction.atomic():
+                count = Document.objects.filter(file=old_name).update(file=new_name)
+                DocumentBlob.acquire(new_name, sha256, size, count=count)
+                if not options['keep_originals']:
+                    transaction.on_commit(lambda name=old_name: storage.delete(name))
+            moved += 1
+            if new_name in blobs_seen:
+                shared += 1
+                freed += size
+            blobs_seen.add(new_name)
+        kept = ' (originals kept)' if options['keep_originals'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} file(s) to content-addressed storage{kept}; {shared} duplicated an existing '
+            f'blob ({freed / 1024 / 1024:.1f} MiB saved); {missing} missing.'
+        ))
@@ -0,0 +1,79 @@
+"""File metadata stored on Document: size, sniffed content type, SHA-256 and dimensions.
+
+inspect() reads the file once in chunks. The content type comes from the
+file's leading bytes (falling back to the extension), never from the
+client-supplied upload header. Images get pixel dimensions from their header
+(Pillow does not decode the pixels) and PDFs a page count when the page tree
+is readable without a PDF library.
+"""
+import hashlib
+import mimetypes
+import re
+
+from PIL import Image, UnidentifiedImageError
+
+CHUNK_SIZE = 64 * 1024
+
+SIGNATURES = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+# Leaf page objects ("/Type /Page", not the "/Type /Pages" tree nodes)
+PDF_PAGE = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+# Pages kept in compressed object streams cannot be counted this way; only
+# scan files small enough to hold in memory
+PDF_SCAN_LIMIT = 20 * 1024 * 1024
+
+
+def sniff_content_type(head, name=''):
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def inspect(file, name=''):
+    """Metadata of an open binary file (read from the start; position restored to 0).
+
+    Returns a dict with the Document fields size_bytes, content_type, sha256,
+    width, height and page_count (None where not applicable).
+    """
+    file.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    pdf = bytearray()
+    while chunk := file.read(CHUNK_SIZE):
+        if not head:
+            head = chunk[:16]
+        digest.update(chunk)
+        size += len(chunk)
+        if head.startswith(b'%PDF-') and size <= PDF_SCAN_LIMIT:
+            pdf += chunk
+    content_type = sniff_content_type(head, name)
+    meta = {
+        'size_bytes': size, 'content_type': content_type, 'sha256': digest.hexdigest(),
+        'width': None, 'height': None, 'page_count': None,
+    }
+    if content_type.startswith('image/'):
+        file.seek(0)
+        try:
+            with Image.open(file) as image:
+                meta['width'], meta['height'] = image.size
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            pass
+    elif content_type == 'application/pdf' and size <= PDF_SCAN_LIMIT:
+        meta['page_count'] = len(PDF_PAGE.findall(pdf)) or None
+    file.seek(0)
+    return meta
+
+
+def inspect_stored(storage, name):
+    """inspect() a file already in ``storage``; raises OSError when it is missing"""
+    with storage.open(name, 'rb') as file:
+        return inspect(file, name)
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-17 11:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_appointment_appt_doctor_date_status_idx_and_more'),
+        ('documents', '0001_initial'),
+        ('hospitals', '0011_admission_adm_hospital_discharge_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['patient', 'appointment'], name='doc_patient_appointment_idx'),
+        ),
+    ]
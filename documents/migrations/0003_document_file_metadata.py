@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-17 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_document_doc_patient_appointment_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, help_text='Pixels, for images', null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, help_text='For PDFs', null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='size_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, help_text='Pixels, for images', null=True),
+        ),
+    ]
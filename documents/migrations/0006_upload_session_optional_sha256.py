@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_upload_session'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='sha256',
+            field=models.CharField(blank=True, help_text='Checksum of the whole file (expected, or computed on completion)', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_upload_session_optional_sha256'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('ACTIVE', 'Active'), ('COMPLETING', 'Completing'), ('COMPLETE', 'Complete'), ('FAILED', 'Failed')], default='ACTIVE', max_length=10),
+        ),
+    ]
@@ -1,5 +1,14 @@
-from django.db import models
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
 from django.conf import settings
+from django.utils import timezone
+
+from .metadata import inspect
+from .storage import get_document_storage, is_blob
 
 
 class Document(models.Model):
@@ -49,7 +58,15 @@ class Document(models.Model):
     document_type = models.CharField(max_length=30, choices=DOCUMENT_TYPE_CHOICES)
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
-    file = models.FileField(upload_to='medical_documents/%Y/%m/%d/')
+    # Stored once per distinct content under medical_documents/blobs/ (see documents/storage.py)
+    file = models.FileField(upload_to='medical_documents/%Y/%m/%d/', storage=get_document_storage)
+    # File metadata, stored when the upload is saved so pages never stat the storage
+    size_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True, help_text='Pixels, for images')
+    height = models.PositiveIntegerField(null=True, blank=True, help_text='Pixels, for images')
+    page_count = models.PositiveIntegerField(null=True, blank=True, help_text='For PDFs')
     uploaded_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -65,18 +82,165 @@ class Document(models.Model):
         verbose_name = 'Document'
         verbose_name_plural = 'Documents'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['patient', 'appointment'], name='doc_patient_appointment_idx'),
+        ]
     
+    METADATA_FIELDS = ['size_bytes', 'content_type', 'sha256', 'width', 'height', 'page_count']
+
     def __str__(self):
         return f"{self.title} - {self.patient.username}"
-    
+
+    def save(self, *args, **kwargs):
+        # A new upload is still uncommitted here: inspect it before it is written to storage
+        if not (self.file and not self.file._committed):
+            return super().save(*args, **kwargs)
+        upload = self.file.file
+        # Assembled chunked uploads arrive already inspected
+        self.set_metadata(getattr(upload, 'metadata', None) or inspect(upload, self.file.name))
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *self.METADATA_FIELDS}
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = Document.objects.filter(pk=self.pk).values_list('file', flat=True).first()
+            super().save(*args, **kwargs)
+            if is_blob(self.file.name):
+                DocumentBlob.acquire(self.file.name, self.sha256, self.size_bytes, upload=upload)
+            if previous and previous != self.file.name:
+                DocumentBlob.release(previous)
+
+    def set_metadata(self, meta):
+        for field in self.METADATA_FIELDS:
+            setattr(self, field, meta[field])
+
     @property
     def file_size(self):
-        """Get file size in human readable format"""
-        if self.file:
-            size = self.file.size
-            for unit in ['B', 'KB', 'MB', 'GB']:
-                if size < 1024.0:
-                    return f"{size:.2f} {unit}"
-                size /= 1024.0
-            return f"{size:.2f} TB"
-        return "0 B"
+        """Stored file size in human readable format"""
+        if self.size_bytes is None:
+            return "Unknown size" if self.file else "0 B"
+        size = float(self.size_bytes)
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if size < 1024.0:
+                return f"{size:.2f} {unit}"
+            size /= 1024.0
+        return f"{size:.2f} TB"
+
+
+class DocumentBlob(models.Model):
+    """Reference count of a content-addressed file shared by Document rows"""
+
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'document_blobs'
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+    @classmethod
+    def acquire(cls, name, sha256, size_bytes, count=1, upload=None):
+        """Add ``count`` references to the blob ``name``.
+
+        If the blob was collected between the storage finding the file and
+        this call, ``upload`` (the uploaded content) is written back.
+        """
+        if cls.objects.filter(name=name).update(ref_count=F('ref_count') + count):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, sha256=sha256, size_bytes=size_bytes, ref_count=count)
+        except IntegrityError:
+            cls.objects.filter(name=name).update(ref_count=F('ref_count') + count)
+            return
+        storage = get_document_storage()
+        if upload is not None and not storage.exists(name):
+            upload.seek(0)
+            storage.save(name, upload)
+
+    @classmethod
+    def release(cls, name, count=1):
+        """Drop ``count`` references; the file is deleted after commit once none are left"""
+        if not is_blob(name):
+            # Files from before content addressing belong to their document alone, as before
+            return
+        cls.objects.filter(name=name, ref_count__gte=count).update(ref_count=F('ref_count') - count)
+        transaction.on_commit(lambda: cls.collect(name))
+
+    @classmethod
+    def collect(cls, name):
+        """Delete the blob ``name`` if nothing references it (re-checked, since uploads may have raced)"""
+        with transaction.atomic():
+            deleted, _ = cls.objects.filter(name=name, ref_count=0).delete()
+            if deleted:
+                get_document_storage().delete(name)
+
+
+def upload_dir():
+    """Directory of in-progress chunked uploads: next to the blobs, so finishing one is a rename"""
+    return Path(getattr(settings, 'CHUNKED_UPLOAD_DIR', None) or Path(settings.MEDIA_ROOT) / 'medical_documents' / 'uploads')
+
+
+class UploadSession(models.Model):
+    """A resumable chunked upload (documents.views.upload_*).
+
+    Chunks are appended to ``part_path`` in order; ``received_bytes`` is the
+    offset a client resumes from (each chunk is checked against its own SHA-256).
+    Completing the session computes the whole file's SHA-256, checks it against the
+    one announced at the start if the client gave one, and turns the file into a
+    Document. The request that completes it first claims it (ACTIVE -> COMPLETING),
+    so concurrent completes cannot create two Documents.
+    """
+
+    STATUS_CHOICES = [
+        ('ACTIVE', 'Active'),
+        ('COMPLETING', 'Completing'),
+        ('COMPLETE', 'Complete'),
+        ('FAILED', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    document_type = models.CharField(max_length=30, choices=Document.DOCUMENT_TYPE_CHOICES, default='OTHER')
+    total_size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True, help_text='Checksum of the whole file (expected, or computed on completion)')
+    received_bytes = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ACTIVE')
+    document = models.OneToOneField(Document, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'document_upload_sessions'
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='upload_status_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.received_bytes}/{self.total_size})"
+
+    @property
+    def part_path(self):
+        return upload_dir() / f'{self.id}.part'
+
+    @classmethod
+    def expire_stale(cls, now=None):
+        """Delete sessions idle for CHUNKED_UPLOAD_EXPIRY (or failed) and their part files"""
+        now = now or timezone.now()
+        stale = cls.objects.filter(
+            # COMPLETING only stays stale if the completing process died
+            models.Q(status__in=['ACTIVE', 'COMPLETING'], updated_at__lt=now - timedelta(seconds=settings.CHUNKED_UPLOAD_EXPIRY))
+            | models.Q(status='FAILED')
+        )
+        count = 0
+        for session in stale.iterator():
+            session.part_path.unlink(missing_ok=True)
+            session.delete()
+            count += 1
+        return count
@@ -0,0 +1,11 @@
+"""Release the blob reference of deleted documents (documents/storage.py)"""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Document, DocumentBlob
+
+
+@receiver(post_delete, sender=Document)
+def document_deleted(sender, instance, **kwargs):
+    if instance.file:
+        DocumentBlob.release(instance.file.name)
@@ -0,0 +1,98 @@
+"""Content-addressed storage for Document.file.
+
+An upload is hashed while it is streamed to a temporary file and then stored
+once under its SHA-256:
+
+    medical_documents/blobs/3f/a2/3fa2...c9.pdf
+
+Uploading the same bytes again (a patient re-attaching a lab report to every
+booking) returns the existing name without writing anything. Document rows
+keep plain FieldFile names, so reads, ``.url`` and ``.open()`` work as before;
+files saved before this storage existed keep their dated paths.
+
+Since one blob can back many documents, files are never deleted through the
+storage directly: DocumentBlob reference-counts the names and deletes a blob
+when its last document goes (see documents/signals.py).
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.move import file_move_safe
+
+BLOB_ROOT = 'medical_documents/blobs'
+EXTENSION = re.compile(r'^\.[a-z0-9]{1,8}$')
+
+
+def blob_name(sha256, original_name=''):
+    """Content-addressed name of a blob, sharded on the first two bytes of its hash"""
+    ext = posixpath.splitext(original_name)[1].lower()
+    if not EXTENSION.match(ext):
+        ext = ''
+    return f'{BLOB_ROOT}/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_ROOT + '/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content, not on what already exists
+        return name
+
+    def _save(self, name, content):
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk (assembled chunked upload, large multipart upload): hash and move.
+            # A file that carries its verified ``sha256`` (views.AssembledFile) is not read again.
+            return self._move(name, content.temporary_file_path(), getattr(content, 'sha256', None))
+        tmp_dir = self.path(f'{BLOB_ROOT}/tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            name = blob_name(digest.hexdigest(), name)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                return name
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            # Same name means same bytes, so a concurrent writer winning the race is harmless
+            file_move_safe(tmp_path, full_path, allow_overwrite=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+            return name
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def _move(self, name, source, sha256=None):
+        if sha256 is None:
+            digest = hashlib.sha256()
+            with open(source, 'rb') as fh:
+                while chunk := fh.read(1024 * 1024):
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+        name = blob_name(sha256, name)
+        full_path = self.path(name)
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            file_move_safe(source, full_path, allow_overwrite=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+
+document_storage = ContentAddressedStorage()
+
+
+def get_document_storage():
+    return document_storage
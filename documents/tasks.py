@@ -0,0 +1,11 @@
+from datetime import timedelta
+
+from taskqueue.queue import task
+
+from .models import UploadSession
+
+
+@task(every=timedelta(hours=1))
+def cleanup_uploads():
+    """Remove idle and failed chunked uploads (see cleanup_uploads command)"""
+    return UploadSession.expire_stale()
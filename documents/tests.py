@@ -1,3 +1,338 @@
-from django.test import TestCase
+import hashlib
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from accounts.models import User
+from .models import Document
+from .storage import ContentAddressedStorage
+
+PDF = (
+    b'%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n'
+    b'2 0 obj<</Type /Pages /Kids[3 0 R 4 0 R]/Count 2>>endobj\n'
+    b'3 0 obj<</Type /Page /Parent 2 0 R>>endobj\n4 0 obj<</Type/Page/Parent 2 0 R>>endobj\n%%EOF\n'
+)
+
+
+class DocumentMetadataTests(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.patient = User.objects.create_user(username='p', email='p@example.com', password=None, role='PATIENT')
+
+    def create(self, name, content, content_type='application/octet-stream'):
+        return Document.objects.create(
+            patient=self.patient, document_type='OTHER', title=name,
+            file=SimpleUploadedFile(name, content, content_type=content_type),
+        )
+
+    def test_upload_stores_pdf_metadata(self):
+        # The client-supplied content type is not trusted
+        doc = self.create('report.pdf', PDF, content_type='image/png')
+        doc.refresh_from_db()
+        self.assertEqual(
+            (doc.size_bytes, doc.content_type, doc.sha256, doc.page_count, doc.width),
+            (len(PDF), 'application/pdf', hashlib.sha256(PDF).hexdigest(), 2, None),
+        )
+        self.assertEqual(default_storage.open(doc.file.name).read(), PDF)
+
+    def test_upload_stores_image_dimensions(self):
+        buffer = BytesIO()
+        Image.new('RGB', (300, 120)).save(buffer, 'JPEG')
+        doc = self.create('scan.jpg', buffer.getvalue())
+        self.assertEqual((doc.content_type, doc.width, doc.height, doc.page_count), ('image/jpeg', 300, 120, None))
+
+    def test_file_size_reads_the_stored_column(self):
+        doc = Document.objects.get(pk=self.create('report.pdf', PDF).pk)
+        # Would raise FileNotFoundError if the storage were asked
+        default_storage.delete(doc.file.name)
+        self.assertEqual(doc.file_size, f'{len(PDF):.2f} B')
+
+    def test_backfill_command(self):
+        name = default_storage.save('medical_documents/old.pdf', ContentFile(PDF))
+        docs = Document.objects.bulk_create([
+            Document(patient=self.patient, document_type='OTHER', title=str(i), file=name) for i in range(3)
+        ] + [Document(patient=self.patient, document_type='OTHER', title='gone', file='medical_documents/gone.pdf')])
+        self.assertTrue(all(doc.size_bytes is None for doc in docs))
+        out = StringIO()
+        call_command('backfill_document_metadata', workers=2, batch_size=2, stdout=out, stderr=StringIO())
+        self.assertIn('Stored metadata of 3 document(s); 1 with a missing file', out.getvalue())
+        self.assertEqual(
+            set(Document.objects.exclude(title='gone').values_list('size_bytes', 'page_count')), {(len(PDF), 2)},
+        )
+        self.assertIsNone(Document.objects.get(title='gone').size_bytes)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+        self.patient = User.objects.create_user(username='p', email='p@example.com', password=None, role='PATIENT')
+
+    def upload(self, name='report.PDF', content=PDF):
+        return Document.objects.create(
+            patient=self.patient, document_type='LAB_REPORT', title=name, file=SimpleUploadedFile(name, content),
+        )
+
+    def blob_files(self):
+        from pathlib import Path
+        return sorted(str(p.relative_to(self.media)) for p in Path(self.media).rglob('*') if p.is_file())
+
+    def test_identical_uploads_share_one_reference_counted_blob(self):
+        from .models import DocumentBlob
+        sha = hashlib.sha256(PDF).hexdigest()
+        first, second = self.upload(), self.upload('copy.pdf')
+        self.assertEqual(first.file.name, f'medical_documents/blobs/{sha[:2]}/{sha[2:4]}/{sha}.pdf')
+        self.assertEqual(second.file.name, first.file.name)
+        self.assertEqual(self.blob_files(), [first.file.name])
+        self.assertEqual(DocumentBlob.objects.get(name=first.file.name).ref_count, 2)
+        self.assertEqual(Document.objects.get(pk=second.pk).file.read(), PDF)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.blob_files(), [second.file.name])
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.blob_files(), [])
+        self.assertFalse(DocumentBlob.objects.exists())
+
+    def test_dedupe_command_moves_old_files_into_blobs(self):
+        from .models import DocumentBlob
+        old = [default_storage.save(f'medical_documents/2024/01/0{i}/report.pdf', ContentFile(PDF)) for i in (1, 2)]
+        other = default_storage.save('medical_documents/2024/01/03/scan.png', ContentFile(b'\x89PNG\r\n\x1a\nxx'))
+        Document.objects.bulk_create([
+            Document(patient=self.patient, document_type='OTHER', title=name, file=name) for name in old + old + [other]
+        ])
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dedupe_documents', stdout=out)
+        self.assertIn('Moved 3 file(s) to content-addressed storage; 1 duplicated an existing blob', out.getvalue())
+        names = Document.objects.values_list('file', flat=True)
+        self.assertEqual(len(set(names)), 2)
+        self.assertEqual(self.blob_files(), sorted(set(names)))
+        self.assertEqual(sorted(DocumentBlob.objects.values_list('ref_count', flat=True)), [1, 4])
+
+
+class DocumentDownloadTests(TestCase):
+    def setUp(self):
+        from hospitals.models import Hospital
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+
+        def user(username, role, **extra):
+            return User.objects.create_user(
+                username=username, email=f'{username}@example.com', password=None, role=role, is_approved=True, **extra,
+            )
+        self.patient = user('patient', 'PATIENT')
+        self.doctor = user('doctor', 'DOCTOR')
+        self.hospital_user = user('hospital', 'HOSPITAL')
+        hospital = Hospital.objects.create(user=self.hospital_user, name='H', registration_number='R1')
+        self.document = Document.objects.create(
+            patient=self.patient, doctor=self.doctor, hospital=hospital, document_type='X_RAY', title='Chest X-ray',
+            file=SimpleUploadedFile('xray.pdf', PDF),
+        )
+        self.url = reverse('documents:download', args=[self.document.pk])
+
+    def get(self, user, **headers):
+        self.client.force_login(user)
+        return self.client.get(self.url, headers=headers)
+
+    def test_streams_to_related_users_only(self):
+        for allowed in (self.patient, self.doctor, self.hospital_user):
+            response = self.get(allowed)
+            self.assertEqual(response.status_code, 200, allowed.username)
+            self.assertEqual(b''.join(response.streaming_content), PDF)
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+            self.assertEqual(response['Content-Length'], str(len(PDF)))
+            self.assertEqual(response['Accept-Ranges'], 'bytes')
+            self.assertEqual(response['Content-Disposition'], 'inline; filename="Chest X-ray.pdf"')
+            self.assertIn('private', response['Cache-Control'])
+        other = User.objects.create_user(username='other', email='o@example.com', password=None, role='PATIENT')
+        self.assertEqual(self.get(other).status_code, 404)
+        User.objects.filter(pk=self.doctor.pk).update(is_approved=False)
+        self.assertEqual(self.get(self.doctor).status_code, 404)
+        self.client.logout()
+        self.assertRedirects(self.client.get(self.url), reverse('accounts:login'), fetch_redirect_response=False)
+
+    def test_permission_check_and_row_are_one_query(self):
+        self.client.force_login(self.patient)
+        self.client.get(self.url)
+        # session + user + document
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+    def test_byte_ranges_and_conditional_requests(self):
+        response = self.get(self.patient, Range='bytes=5-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), PDF[5:10])
+        self.assertEqual(response['Content-Range'], f'bytes 5-9/{len(PDF)}')
+        self.assertEqual(response['Content-Length'], '5')
+
+        response = self.get(self.patient, Range='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), PDF[-4:])
+
+        response = self.get(self.patient, Range=f'bytes={len(PDF)}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{len(PDF)}'))
+
+        etag = f'"{self.document.sha256}"'
+        self.assertEqual(self.get(self.patient, If_None_Match=etag).status_code, 304)
+        # A range for another version of the file is ignored
+        self.assertEqual(self.get(self.patient, Range='bytes=5-9', If_Range='"stale"').status_code, 200)
+        self.assertEqual(self.get(self.patient, Range='bytes=5-9', If_Range=etag).status_code, 206)
+
+    @override_settings(DOCUMENT_DOWNLOAD_ACCEL='nginx', DOCUMENT_ACCEL_PREFIX='/protected-media/')
+    def test_hands_off_to_the_web_server(self):
+        response = self.get(self.patient)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.document.file.name}')
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(CHUNKED_UPLOAD_CHUNK_SIZE=64)
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+        self.patient = User.objects.create_user(
+            username='patient', email='patient@example.com', password=None, role='PATIENT',
+        )
+        self.client.force_login(self.patient)
+        self.content = PDF * 3
+
+    def start(self, content=None, **extra):
+        content = self.content if content is None else content
+        data = {'filename': 'mri.pdf', 'size': len(content), 'sha256': hashlib.sha256(content).hexdigest(), **extra}
+        return self.client.post(reverse('documents:upload_create'), data)
+
+    def put(self, upload_id, start, chunk, total=None, sha256=None):
+        return self.client.put(
+            reverse('documents:upload_chunk', args=[upload_id]), chunk, content_type='application/octet-stream',
+            headers={
+                'Content-Range': f'bytes {start}-{start + len(chunk) - 1}/{total or len(self.content)}',
+                'X-Chunk-SHA256': sha256 or hashlib.sha256(chunk).hexdigest(),
+            },
+        )
+
+    def test_upload_in_chunks_resume_and_complete(self):
+        from .models import UploadSession
+        response = self.start()
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.json()['id']
+        self.assertEqual(self.put(upload_id, 0, self.content[:64]).json()['offset'], 64)
+        # Out of order: told where to resume
+        response = self.put(upload_id, 128, self.content[128:192])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 64))
+        self.assertEqual(self.client.get(reverse('documents:upload_chunk', args=[upload_id])).json()['offset'], 64)
+        self.assertEqual(self.put(upload_id, 64, self.content[64:128]).status_code, 200)
+        self.assertEqual(self.put(upload_id, 128, self.content[128:192]).status_code, 200)
+        # Chunks larger than CHUNKED_UPLOAD_CHUNK_SIZE are refused
+        self.assertEqual(self.put(upload_id, 192, self.content[192:]).status_code, 413)
+        for start in range(192, len(self.content), 64):
+            self.put(upload_id, start, self.content[start:start + 64])
+
+        response = self.client.post(reverse('documents:upload_complete', args=[upload_id]))
+        self.assertEqual(response.status_code, 201)
+        document = Document.objects.get(pk=response.json()['document'])
+        self.assertEqual((document.patient, document.size_bytes, document.page_count), (self.patient, len(self.content), 6))
+        self.assertEqual(document.file.read(), self.content)
+        self.assertTrue(document.file.name.startswith('medical_documents/blobs/'))
+        self.assertFalse(UploadSession.objects.get(pk=upload_id).part_path.exists())
+
+    def test_corrupt_chunk_is_refused_and_sent_again(self):
+        upload_id = self.start(sha256='').json()['id']
+        response = self.put(upload_id, 0, self.content[:64], sha256='0' * 64)
+        self.assertEqual((response.status_code, response.json()['offset']), (422, 0))
+        for start in range(0, len(self.content), 64):
+            self.assertEqual(self.put(upload_id, start, self.content[start:start + 64]).status_code, 200)
+
+        # No whole-file hash from the client: computed once on completion and reused by the storage
+        with mock.patch('documents.storage.ContentAddressedStorage._move', autospec=True,
+                        side_effect=ContentAddressedStorage._move) as move:
+            response = self.client.post(reverse('documents:upload_complete', args=[upload_id]))
+        self.assertEqual(response.status_code, 201)
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(response.json()['sha256'], sha256)
+        self.assertEqual(move.call_args.args[3], sha256)
+        document = Document.objects.get(pk=response.json()['document'])
+        self.assertEqual((document.sha256, document.file.read()), (sha256, self.content))
+
+    def test_checksum_mismatch_fails_the_upload(self):
+        upload_id = self.start(sha256='0' * 64).json()['id']
+        for start in range(0, len(self.content), 64):
+            self.put(upload_id, start, self.content[start:start + 64])
+        response = self.client.post(reverse('documents:upload_complete', args=[upload_id]))
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(Document.objects.exists())
+
+    def test_concurrent_completes_create_one_document(self):
+        upload_id = self.start().json()['id']
+        for start in range(0, len(self.content), 64):
+            self.put(upload_id, start, self.content[start:start + 64])
+        url = reverse('documents:upload_complete', args=[upload_id])
+        # A second complete arrives while the first is still hashing the file
+        from .metadata import inspect
+        racing = []
+
+        def inspect_while_racing(*args):
+            racing.append(self.client.post(url))
+            return inspect(*args)
+
+        with mock.patch('documents.views.inspect', side_effect=inspect_while_racing):
+            first = self.client.post(url)
+        self.assertEqual((racing[0].status_code, racing[0].json()['status']), (409, 'COMPLETING'))
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(Document.objects.count(), 1)
+        second = self.client.post(url)
+        self.assertEqual((second.status_code, second.json()['document']), (200, first.json()['document']))
+
+    def test_failed_complete_releases_its_claim(self):
+        from .models import UploadSession
+        upload_id = self.start().json()['id']
+        for start in range(0, len(self.content), 64):
+            self.put(upload_id, start, self.content[start:start + 64])
+        url = reverse('documents:upload_complete', args=[upload_id])
+        with mock.patch('documents.views.Document.objects.create', side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.client.post(url)
+        # The claim is released so the client can retry
+        self.assertEqual(UploadSession.objects.get(pk=upload_id).status, 'ACTIVE')
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(Document.objects.count(), 1)
+
+    def test_validation_and_ownership(self):
+        self.assertEqual(self.start(filename='run.exe').status_code, 400)
+        with override_settings(CHUNKED_UPLOAD_MAX_SIZE=10):
+            self.assertEqual(self.start().status_code, 413)
+        upload_id = self.start().json()['id']
+        other = User.objects.create_user(username='other', email='other@example.com', password=None, role='PATIENT')
+        self.client.force_login(other)
+        self.assertEqual(self.put(upload_id, 0, self.content[:64]).status_code, 404)
+        self.assertEqual(self.client.post(reverse('documents:upload_complete', args=[upload_id])).status_code, 404)
+
+    def test_bad_content_length_is_refused(self):
+        upload_id = self.start().json()['id']
+        url = reverse('documents:upload_chunk', args=[upload_id])
+        chunk = self.content[:64]
+        for content_length in ('abc', '63', ''):
+            response = self.client.generic('PUT', url, chunk, content_type='application/octet-stream', headers={
+                'Content-Range': f'bytes 0-63/{len(self.content)}', 'X-Chunk-SHA256': hashlib.sha256(chunk).hexdigest(),
+            }, CONTENT_LENGTH=content_length)
+            self.assertEqual(response.status_code, 400, content_length)
+        self.assertEqual(self.put(upload_id, 0, chunk).status_code, 200)
+
+    def test_cleanup_removes_stale_sessions(self):
+        from django.utils import timezone
+        from datetime import timedelta
+        from .models import UploadSession
+        upload_id = self.start().json()['id']
+        session = UploadSession.objects.get(pk=upload_id)
+        self.assertTrue(session.part_path.exists())
+        UploadSession.objects.filter(pk=upload_id).update(updated_at=timezone.now() - timedelta(days=2))
+        call_command('cleanup_uploads', stdout=StringIO())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(session.part_path.exists())
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+app_name = 'documents'
+
+urlpatterns = [
+    path('<int:pk>/download/', views.download_document, name='download'),
+    path('uploads/', views.upload_create, name='upload_create'),
+    path('uploads/<uuid:pk>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:pk>/complete/', views.upload_complete, name='upload_complete'),
+]
@@ -1,3 +1,364 @@
-from django.shortcuts import render
+import hashlib
+import posixpath
+import re
+from urllib.parse import quote
 
-# Create your views here.
+from django.conf import settings
+from django.contrib import messages
+from django.core.files import File, locks
+from django.db import transaction
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, quote_etag
+from django.views.decorators.http import require_http_methods, require_POST, require_safe
+
+from .metadata import inspect
+from .models import Document, UploadSession, upload_dir
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+NOT_SATISFIABLE = object()
+
+
+def accessible_documents(user):
+    """Documents ``user`` may download: their own (patient), ones they wrote or whose
+    appointment they hold (doctor), ones of their hospital (hospital), or all (admin)"""
+    if user.role == 'ADMIN':
+        return Document.objects.all()
+    if user.role == 'PATIENT':
+        return Document.objects.filter(patient=user)
+    if not user.is_approved:
+        return Document.objects.none()
+    if user.role == 'DOCTOR':
+        return Document.objects.filter(Q(doctor=user) | Q(uploaded_by=user) | Q(appointment__doctor=user))
+    if user.role in ('HOSPITAL', 'HOSPITAL_ADMIN'):
+        return Document.objects.filter(Q(hospital__user=user) | Q(appointment__hospital__user=user))
+    return Document.objects.none()
+
+
+def parse_range(header, size):
+    """(start, end) inclusive of a single ``bytes=`` range, None to send the whole
+    file (no header, several ranges, or syntax we do not handle) or NOT_SATISFIABLE"""
+    match = RANGE.match(header.replace(' ', '')) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return NOT_SATISFIABLE
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        return NOT_SATISFIABLE
+    if start > end:
+        return None
+    return start, end
+
+
+class FileRange:
+    """Read-only view of ``length`` bytes of ``file`` from ``start``, for FileResponse"""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def download_name(document):
+    ext = posixpath.splitext(document.file.name)[1].lower()
+    title = document.title or f'document-{document.pk}'
+    return title if title.lower().endswith(ext) else f'{title}{ext}'
+
+
+@require_safe
+def download_document(request, pk):
+    """Stream a document to a user allowed to see it.
+
+    The permission check and the row are one query. Responses carry an ETag
+    (the stored SHA-256), answer If-None-Match with 304 and single byte ranges
+    with 206, so interrupted downloads resume. With DOCUMENT_DOWNLOAD_ACCEL set
+    the web server sends the file (X-Accel-Redirect for nginx, X-Sendfile for
+    Apache/lighttpd) and the worker only checks permissions.
+    """
+    if not request.user.is_authenticated:
+        messages.error(request, 'Please log in to view documents.')
+        return redirect('accounts:login')
+    document = accessible_documents(request.user).filter(pk=pk).only(
+        'pk', 'title', 'file', 'content_type', 'size_bytes', 'sha256', 'updated_at',
+    ).first()
+    if document is None or not document.file:
+        # Same answer for "missing" and "not yours": ids are not probed
+        raise Http404('Document not found')
+
+    if document.sha256:
+        etag = quote_etag(document.sha256)
+    else:
+        etag = f'W/"{document.pk}-{int(document.updated_at.timestamp())}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    as_attachment = request.GET.get('download') == '1'
+    filename = download_name(document)
+    content_type = document.content_type or 'application/octet-stream'
+    storage = document.file.storage
+
+    accel = getattr(settings, 'DOCUMENT_DOWNLOAD_ACCEL', None)
+    if accel:
+        response = HttpResponse(content_type=content_type)
+        if accel == 'sendfile':
+            response['X-Sendfile'] = storage.path(document.file.name)
+        else:
+            response['X-Accel-Redirect'] = settings.DOCUMENT_ACCEL_PREFIX + quote(document.file.name)
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    else:
+        try:
+            size = document.size_bytes if document.size_bytes is not None else storage.size(document.file.name)
+            file = storage.open(document.file.name, 'rb')
+        except OSError:
+            raise Http404('Document file is missing')
+        byte_range = None
+        # A range is only valid for the version named by If-Range (strong ETags only)
+        if_range = request.headers.get('If-Range')
+        if if_range is None or (if_range == etag and not etag.startswith('W/')):
+            byte_range = parse_range(request.headers.get('Range'), size)
+        if byte_range is NOT_SATISFIABLE:
+            file.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is None:
+            response = FileResponse(file, as_attachment=as_attachment, filename=filename, content_type=content_type)
+            response['Content-Length'] = size
+        else:
+            start, end = byte_range
+            response = FileResponse(
+                FileRange(file, start, end - start + 1),
+                as_attachment=as_attachment, filename=filename, content_type=content_type, status=206,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    # Private data: never cached by shared proxies; browsers revalidate with the ETag
+    patch_cache_control(response, private=True, no_cache=True)
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
+# Resumable chunked uploads
+#
+#   POST   uploads/                 {filename, size, [sha256], document_type} -> {id, offset, chunk_size}
+#   PUT    uploads/<id>/            raw bytes, Content-Range: bytes <start>-<end>/<size>,
+#                                   X-Chunk-SHA256: <hex SHA-256 of the chunk> -> {offset}
+#   GET    uploads/<id>/            -> {offset, size, status} (where to resume)
+#   DELETE uploads/<id>/            abort
+#   POST   uploads/<id>/complete/   -> {document, download_url, sha256}
+#
+# Chunks must arrive in order: a chunk that does not start at the current offset
+# gets 409 with the offset to resume from. The request body is copied to the part
+# file in blocks and never held in memory, and hashed on the way: a chunk whose
+# SHA-256 does not match X-Chunk-SHA256 is dropped (422) and sent again. Clients
+# therefore never hash the whole file; the whole-file SHA-256 is computed once on
+# completion (checked against the one given at the start, if any) and handed to
+# the storage, which does not read the file again.
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+UPLOAD_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.dcm')
+SHA256 = re.compile(r'^[0-9a-f]{64}$')
+COPY_BLOCK = 64 * 1024
+
+
+class AssembledFile(File):
+    """A finished part file with the metadata computed while verifying it"""
+
+    def __init__(self, file, name, metadata):
+        super().__init__(file, name)
+        self.metadata = metadata
+        # Checked already: ContentAddressedStorage does not hash the file again
+        self.sha256 = metadata['sha256']
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def _upload_error(message, status=400, state=None):
+    return JsonResponse({'error': message, **(state or {})}, status=status)
+
+
+def _upload_state(session):
+    return {
+        'id': str(session.id), 'offset': session.received_bytes, 'size': session.total_size,
+        'status': session.status, 'chunk_size': settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+    }
+
+
+def _patient_session(request, pk):
+    """The requesting patient's upload session, or None"""
+    if not request.user.is_authenticated or request.user.role != 'PATIENT':
+        return None
+    return UploadSession.objects.filter(pk=pk, user=request.user).first()
+
+
+@require_POST
+def upload_create(request):
+    """Start a chunked upload of a large report (patients only)"""
+    if not request.user.is_authenticated or request.user.role != 'PATIENT':
+        return _upload_error('Permission denied.', status=403)
+    filename = posixpath.basename(request.POST.get('filename', '').replace('\\', '/'))[:255]
+    sha256 = request.POST.get('sha256', '').lower()
+    document_type = request.POST.get('document_type', 'OTHER')
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return _upload_error('size is required.')
+    if not filename.lower().endswith(UPLOAD_EXTENSIONS):
+        return _upload_error(f'Allowed file types: {", ".join(UPLOAD_EXTENSIONS)}.')
+    if not 0 < size <= settings.CHUNKED_UPLOAD_MAX_SIZE:
+        return _upload_error(f'Files must be 1 byte to {settings.CHUNKED_UPLOAD_MAX_SIZE // (1024 * 1024)} MB.', status=413)
+    if sha256 and not SHA256.match(sha256):
+        return _upload_error('sha256 must be the hex SHA-256 of the whole file.')
+    if document_type not in dict(Document.DOCUMENT_TYPE_CHOICES):
+        return _upload_error('Unknown document type.')
+    session = UploadSession.objects.create(
+        user=request.user, filename=filename, total_size=size, sha256=sha256, document_type=document_type,
+    )
+    upload_dir().mkdir(parents=True, exist_ok=True)
+    session.part_path.touch()
+    return JsonResponse(_upload_state(session), status=201)
+
+
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def upload_chunk(request, pk):
+    """Status (GET), next chunk (PUT) or abort (DELETE) of an upload session"""
+    session = _patient_session(request, pk)
+    if session is None:
+        return _upload_error('Upload not found.', status=404)
+    if request.method == 'GET':
+        return JsonResponse(_upload_state(session))
+    if request.method == 'DELETE':
+        session.part_path.unlink(missing_ok=True)
+        session.delete()
+        return JsonResponse({'deleted': True})
+    if session.status != 'ACTIVE':
+        return _upload_error('Upload is not active.', status=409, state=_upload_state(session))
+
+    match = CONTENT_RANGE.match(request.headers.get('Content-Range', ''))
+    if not match:
+        return _upload_error('Content-Range: bytes <start>-<end>/<size> is required.')
+    start, end, total = map(int, match.groups())
+    length = end - start + 1
+    if total != session.total_size or end >= total or length <= 0:
+        return _upload_error('Content-Range does not match the upload.', status=416)
+    if length > settings.CHUNKED_UPLOAD_CHUNK_SIZE:
+        return _upload_error('Chunk too large.', status=413, state=_upload_state(session))
+    try:
+        content_length = int(request.headers.get('Content-Length', ''))
+    except ValueError:
+        content_length = None
+    if content_length != length:
+        return _upload_error('Content-Length must equal the Content-Range length.')
+    if start != session.received_bytes:
+        return _upload_error('Chunk does not start at the current offset.', status=409, state=_upload_state(session))
+    chunk_sha256 = request.headers.get('X-Chunk-SHA256', '').lower()
+    if not SHA256.match(chunk_sha256):
+        return _upload_error('X-Chunk-SHA256 must be the hex SHA-256 of the chunk.')
+
+    with open(session.part_path, 'r+b') as part:
+        # Serialise concurrent requests for one session (a client retrying a chunk it thinks was lost)
+        locks.lock(part, locks.LOCK_EX)
+        try:
+            session.refresh_from_db(fields=['received_bytes'])
+            if start != session.received_bytes:
+                return _upload_error('Chunk does not start at the current offset.', status=409, state=_upload_state(session))
+            part.seek(start)
+            digest = hashlib.sha256()
+            remaining = length
+            while remaining:
+                block = request.read(min(COPY_BLOCK, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                part.write(block)
+                remaining -= len(block)
+            if remaining:
+                # Connection dropped mid-chunk: keep the offset, the client re-sends this chunk
+                part.truncate(start)
+                return _upload_error('Incomplete chunk.', state=_upload_state(session))
+            if digest.hexdigest() != chunk_sha256:
+                part.truncate(start)
+                return _upload_error('Chunk checksum mismatch; send it again.', status=422, state=_upload_state(session))
+            part.flush()
+            UploadSession.objects.filter(pk=session.pk).update(received_bytes=end + 1, updated_at=timezone.now())
+            session.received_bytes = end + 1
+        finally:
+            locks.unlock(part)
+    return JsonResponse(_upload_state(session))
+
+
+@require_POST
+def upload_complete(request, pk):
+    """Verify size and checksum and turn the upload into a Document (the whole-file SHA-256
+    is computed here, once, and reused by the storage)"""
+    session = _patient_session(request, pk)
+    if session is None:
+        return _upload_error('Upload not found.', status=404)
+    if session.status == 'COMPLETE' and session.document_id:
+        return JsonResponse(_completed(session))
+    if session.received_bytes != session.total_size:
+        return _upload_error('Upload is incomplete.', status=409, state=_upload_state(session))
+    # Claim the session so a concurrent complete (a client retrying) cannot create a second Document
+    claimed = UploadSession.objects.filter(pk=session.pk, status='ACTIVE').update(
+        status='COMPLETING', updated_at=timezone.now(),
+    )
+    if not claimed:
+        session.refresh_from_db()
+        if session.status == 'COMPLETE' and session.document_id:
+            return JsonResponse(_completed(session))
+        return _upload_error('Upload is not active.', status=409, state=_upload_state(session))
+    try:
+        with open(session.part_path, 'rb') as part:
+            metadata = inspect(part, session.filename)
+            if (session.sha256 and metadata['sha256'] != session.sha256) or metadata['size_bytes'] != session.total_size:
+                session.status = 'FAILED'
+                session.save(update_fields=['status', 'updated_at'])
+                part.close()
+                session.part_path.unlink(missing_ok=True)
+                return _upload_error('Checksum mismatch; start the upload again.', status=422)
+            with transaction.atomic():
+                document = Document.objects.create(
+                    patient=request.user, document_type=session.document_type, title=session.filename,
+                    file=AssembledFile(part, session.filename, metadata), uploaded_by=request.user,
+                )
+                session.status, session.document, session.sha256 = 'COMPLETE', document, metadata['sha256']
+                session.save(update_fields=['status', 'document', 'sha256', 'updated_at'])
+    except Exception:
+        # Release the claim so the client can retry
+        UploadSession.objects.filter(pk=session.pk, status='COMPLETING').update(status='ACTIVE')
+        raise
+    # Left behind when identical content was already stored
+    session.part_path.unlink(missing_ok=True)
+    return JsonResponse(_completed(session), status=201)
+
+
+def _completed(session):
+    return {
+        **_upload_state(session), 'document': session.document_id, 'sha256': session.sha256,
+        'download_url': reverse('documents:download', args=[session.document_id]),
+    }
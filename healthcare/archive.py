@@ -0,0 +1,59 @@
+"""Cold storage for historical appointments and admissions.
+
+Rows older than ARCHIVE_AFTER_DAYS are moved, in batches, from the live
+tables to archive tables with the same columns and the same ids
+(``appointments_archive``, ``admissions_archive``), so lists, counts and slot
+queries only scan recent rows. ``manage.py archive_history`` and a daily
+periodic task run the move (see Appointment.archive_old and
+Admission.archive_old).
+
+List views read the archive only when a page reaches back past the horizon:
+KeysetPaginationMixin merges ``get_archive_queryset()`` rows into a page when
+the live rows alone cannot fill it with rows newer than the boundary. Archived
+row counts for tab labels and totals are cached as read models
+(healthcare/cache.py) and invalidated when rows are moved.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from healthcare import cache
+
+
+def horizon_date(today=None):
+    """Rows dated before this day are archived"""
+    today = today or timezone.now().date()
+    return today - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def horizon_datetime(today=None):
+    return timezone.make_aware(datetime.combine(horizon_date(today), time.min))
+
+
+def archived_fields(archive_model):
+    """Columns copied from the live table (all but the archive's own bookkeeping)"""
+    return [f.attname for f in archive_model._meta.concrete_fields if f.name != 'archived_at']
+
+
+def move_to_archive(queryset, archive_model, batch_size=500, owner=None):
+    """Copy the rows of ``queryset`` into ``archive_model`` and delete them from the live
+    table, ``batch_size`` rows per transaction; returns the number moved.
+
+    ``owner`` is a (read model kind, column) pair: the cached archive counts of every
+    value of ``column`` that was moved are invalidated.
+    """
+    fields = archived_fields(archive_model)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.order_by('pk').values(*fields)[:batch_size])
+            if not rows:
+                return moved
+            archive_model.objects.bulk_create([archive_model(**row) for row in rows])
+            queryset.model.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            if owner:
+                kind, column = owner
+                cache.invalidate(kind, *{row[column] for row in rows})
+            moved += len(rows)
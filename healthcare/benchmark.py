@@ -0,0 +1,278 @@
+"""Benchmarks of the hot request paths.
+
+Each scenario is a function registered with ``@scenario(name, role)`` that
+returns the request to make (method, path, data) for the seeded subjects. The
+runner drives the Django test client in-process, logged in as the scenario's
+role, and reports per scenario:
+
+- latency percentiles over ``rounds`` timed requests (after ``warmup``),
+- SQL queries and SQL time per request (healthcare.instrumentation.QueryRecorder),
+- memory allocated while handling a request (tracemalloc, separate rounds so
+  tracing does not skew the timings): peak and retained KiB.
+
+Requests that write (booking) run inside a transaction that is rolled back, so
+every round sees the same data. Results are plain dicts, written as JSON by
+``manage.py benchmark`` and compared with ``compare()``.
+"""
+import platform
+import sqlite3
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from .instrumentation import QueryRecorder
+
+# name -> (role, func(subjects) -> (method, path, data))
+SCENARIOS = {}
+
+
+def scenario(name, role):
+    """Register a benchmark scenario requested as ``role`` (an attribute of Subjects)"""
+    def register(func):
+        SCENARIOS[name] = (role, func)
+        return func
+    return register
+
+
+class SubjectsMissing(Exception):
+    pass
+
+
+class Subjects:
+    """Users and objects the scenarios request pages for, taken from seed_load data"""
+
+    def __init__(self, prefix='load'):
+        from accounts.models import User
+        from doctors.models import DoctorProfile
+
+        users = {u.username: u for u in User.objects.filter(username__in=[
+            f'{prefix}_admin_0', f'{prefix}_patient_0', f'{prefix}_doctor_0',
+        ])}
+        try:
+            self.admin = users[f'{prefix}_admin_0']
+            self.patient = users[f'{prefix}_patient_0']
+            self.doctor_profile = DoctorProfile.objects.select_related('hospital__user').get(user=users[f'{prefix}_doctor_0'])
+        except (KeyError, DoctorProfile.DoesNotExist):
+            raise SubjectsMissing(f'No "{prefix}_" seed data; run manage.py seed_load --prefix {prefix} first.')
+        self.doctor = self.doctor_profile.user
+        self.hospital = self.doctor_profile.hospital
+        self.hospital_user = self.hospital.user
+        self.tomorrow = timezone.localdate() + timedelta(days=1)
+        self.free_slot = self._free_slot()
+
+    def _free_slot(self):
+        """(date, time) the patient can book with the doctor, or None"""
+        from doctors.availability import DoctorAvailability
+        availability = DoctorAvailability(self.doctor_profile, start=self.tomorrow, patient=self.patient)
+        for day in availability.available_dates():
+            slots = availability.free_slots(day)
+            if slots:
+                return day, slots[0]
+        return None
+
+
+@scenario('doctor_search', 'patient')
+def doctor_search(s):
+    return 'get', reverse('doctors:doctor_search'), {'q': s.doctor.last_name}
+
+
+@scenario('doctor_detail_date', 'patient')
+def doctor_detail_date(s):
+    return 'get', reverse('doctors:doctor_detail', args=[s.doctor_profile.pk]), {'date': s.tomorrow.isoformat()}
+
+
+@scenario('book_appointment', 'patient')
+def book_appointment(s):
+    day, at = s.free_slot
+    return 'post', reverse('appointments:book_normal', args=[s.doctor_profile.pk]), {
+        'hospital_id': s.hospital.pk, 'date': day.isoformat(), 'time': at.strftime('%H:%M'), 'reason': 'Benchmark',
+    }
+
+
+@scenario('emergency_hospitals', 'patient')
+def emergency_hospitals(s):
+    return 'get', reverse('appointments:emergency_booking'), {}
+
+
+@scenario('hospital_search', 'patient')
+def hospital_search(s):
+    return 'get', reverse('hospitals:hospital_search'), {'q': 'cardio', 'sort': 'rating'}
+
+
+@scenario('hospital_detail', 'patient')
+def hospital_detail(s):
+    return 'get', reverse('hospitals:hospital_detail', args=[s.hospital.pk]), {}
+
+
+@scenario('admin_dashboard', 'admin')
+def admin_dashboard(s):
+    return 'get', reverse('accounts:admin_dashboard'), {}
+
+
+@scenario('doctor_dashboard', 'doctor')
+def doctor_dashboard(s):
+    return 'get', reverse('accounts:doctor_dashboard'), {}
+
+
+@scenario('patient_dashboard', 'patient')
+def patient_dashboard(s):
+    return 'get', reverse('accounts:patient_dashboard'), {}
+
+
+@scenario('hospital_dashboard', 'hospital_user')
+def hospital_dashboard(s):
+    return 'get', reverse('accounts:hospital_dashboard'), {}
+
+
+@scenario('hospital_admin_dashboard', 'hospital_user')
+def hospital_admin_dashboard(s):
+    return 'get', reverse('hospitals:admin_dashboard'), {}
+
+
+@scenario('hospital_appointments', 'hospital_user')
+def hospital_appointments(s):
+    return 'get', reverse('hospitals:admin_appointments'), {}
+
+
+@scenario('hospital_admissions', 'hospital_user')
+def hospital_admissions(s):
+    return 'get', reverse('hospitals:admin_admissions'), {}
+
+
+def percentile(values, pct):
+    """Inclusive percentile (linear interpolation) of a non-empty list"""
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def _request(client, method, path, data):
+    if method == 'get':
+        return client.get(path, data)
+    # Writes are rolled back so every round starts from the same data
+    with transaction.atomic():
+        response = client.post(path, data)
+        transaction.set_rollback(True)
+    return response
+
+
+def run_scenario(client, method, path, data, rounds=30, warmup=3, alloc_rounds=5):
+    """Time one request ``rounds`` times; returns the result dict"""
+    for _ in range(warmup):
+        _request(client, method, path, data)
+
+    latencies, queries, sql_ms, statuses = [], [], [], set()
+    for _ in range(rounds):
+        with QueryRecorder() as recorder:
+            start = time.perf_counter()
+            response = _request(client, method, path, data)
+            latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(recorder.count)
+        sql_ms.append(recorder.duration * 1000)
+        statuses.add(response.status_code)
+
+    peaks, retained = [], []
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        for _ in range(alloc_rounds):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            _request(client, method, path, data)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append((peak - before) / 1024)
+            retained.append((current - before) / 1024)
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    def rounded(value):
+        return round(value, 3)
+
+    result = {
+        'method': method.upper(),
+        'path': path,
+        'status': sorted(statuses),
+        'rounds': rounds,
+        'latency_ms': {
+            'min': rounded(min(latencies)),
+            'p50': rounded(percentile(latencies, 50)),
+            'p95': rounded(percentile(latencies, 95)),
+            'max': rounded(max(latencies)),
+            'mean': rounded(statistics.fmean(latencies)),
+        },
+        'queries': max(queries),
+        'sql_ms_p50': rounded(percentile(sql_ms, 50)),
+    }
+    if alloc_rounds:
+        result['alloc_kib'] = {
+            'peak': rounded(statistics.median(peaks)),
+            'retained': rounded(statistics.median(retained)),
+        }
+    return result
+
+
+def environment():
+    """Metadata stored with the results so runs can be compared across commits"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': timezone.now().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'sqlite': sqlite3.sqlite_version if connection.vendor == 'sqlite' else None,
+        'platform': platform.platform(),
+    }
+
+
+def run(subjects, names=None, rounds=30, warmup=3, alloc_rounds=5, progress=None):
+    """Run the selected scenarios (all by default); returns {name: result}"""
+    results = {}
+    clients = {}
+    for name, (role, func) in SCENARIOS.items():
+        if names and name not in names:
+            continue
+        if name == 'book_appointment' and subjects.free_slot is None:
+            continue
+        if role not in clients:
+            clients[role] = Client()
+            clients[role].force_login(getattr(subjects, role))
+        method, path, data = func(subjects)
+        results[name] = run_scenario(clients[role], method, path, data, rounds, warmup, alloc_rounds)
+        if progress:
+            progress(name, results[name])
+    return results
+
+
+def compare(baseline, current):
+    """[(name, metric, before, after, change %), ...] for scenarios in both runs"""
+    rows = []
+    for name, result in current.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric, old, new in (
+            ('p50 ms', before['latency_ms']['p50'], result['latency_ms']['p50']),
+            ('p95 ms', before['latency_ms']['p95'], result['latency_ms']['p95']),
+            ('queries', before['queries'], result['queries']),
+        ):
+            change = (new - old) / old * 100 if old else 0.0
+            rows.append((name, metric, old, new, round(change, 1)))
+    return rows
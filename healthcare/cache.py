@@ -0,0 +1,76 @@
+"""Versioned cache for per-object read models (doctor and hospital detail pages).
+
+A read model is cached under ``readmodel:<schema>:<kind>:<pk>:<version>``. The version
+lives in its own key and is bumped by invalidate(), which the apps' signal
+receivers call when a row feeding the read model changes. Old versions are
+never read again and simply expire, so there is no delete/set race between a
+writer and a concurrent reader.
+
+Bumps run on transaction commit: a reader that rebuilds the read model while
+the writer's transaction is still open caches the old data under the old
+version, which the commit then retires.
+"""
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = 'default'
+# Read models also expire on their own, e.g. leave dates that are now in the past
+READ_MODEL_TIMEOUT = 60 * 60
+# Bump when the shape of a read model changes, so entries cached by older code are never read
+READ_MODEL_SCHEMA = 2
+
+DOCTOR = 'doctor'
+HOSPITAL = 'hospital'
+# Archived row counts (healthcare/archive.py) per patient / per hospital
+ARCHIVED_APPOINTMENTS = 'archived-appointments'
+ARCHIVED_ADMISSIONS = 'archived-admissions'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(kind, pk):
+    return f'readmodel:{kind}:{pk}:version'
+
+
+def version(kind, pk):
+    """Current version of a read model; a lost version key restarts at a fresh value"""
+    cache = _cache()
+    key = _version_key(kind, pk)
+    current = cache.get(key)
+    if current is None:
+        # Never restart at 1: entries of an evicted version could still be cached
+        cache.add(key, time.time_ns(), None)
+        current = cache.get(key)
+    return current
+
+
+def get_or_build(kind, pk, build, timeout=READ_MODEL_TIMEOUT):
+    """Cached read model of ``kind`` for ``pk``, calling ``build()`` on a miss"""
+    cache = _cache()
+    key = f'readmodel:{READ_MODEL_SCHEMA}:{kind}:{pk}:{version(kind, pk)}'
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
+
+
+def _bump(kind, pks):
+    cache = _cache()
+    for pk in pks:
+        key = _version_key(kind, pk)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def invalidate(kind, *pks):
+    """Retire the cached read models of ``kind`` for ``pks`` once the transaction commits"""
+    pks = {pk for pk in pks if pk is not None}
+    if pks:
+        transaction.on_commit(lambda: _bump(kind, pks))
@@ -0,0 +1,57 @@
+"""Shared helpers for the SQLite FTS5 search indexes (doctors.search, hospitals.search)"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+_tables = {}
+
+
+def table_exists(table):
+    """True when the FTS table exists on the default (SQLite) database; cached per process"""
+    if table not in _tables:
+        _tables[table] = connection.vendor == 'sqlite' and table in connection.introspection.table_names()
+    return _tables[table]
+
+
+def reset_cache():
+    _tables.clear()
+
+
+def tokens(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def build_match(text, column=None, prefix=True):
+    """Turn free user input into a safe FTS5 query: every word is a quoted
+    (prefix) term and all must match. Returns '' when there is nothing to search."""
+    words = tokens(text)
+    if not words:
+        return ''
+    star = '*' if prefix else ''
+    terms = ' AND '.join(f'"{w}"{star}' for w in words)
+    if column:
+        return f'{column} : ({terms})'
+    return terms
+
+
+def phrase_token(text):
+    """Collapse a multi-word phrase into one index token, e.g. 'General Medicine' -> 'generalmedicine'.
+    Prefix queries on such tokens then match from the start of the phrase only."""
+    return ''.join(tokens(text)).replace('_', '')
+
+
+def ranked(queryset, table, match, weights):
+    """``queryset`` limited to the rows whose pk is a rowid of FTS ``table`` matching ``match``,
+    annotated with ``search_rank`` (bm25 with column ``weights``; lower is better).
+
+    The match is part of the same SQL query, so the caller's other filters and pagination
+    apply to every match rather than to a capped list of ids."""
+    model_table = connection.ops.quote_name(queryset.model._meta.db_table)
+    pk = connection.ops.quote_name(queryset.model._meta.pk.column)
+    bm25 = f'bm25({table}, {", ".join(str(w) for w in weights)})'
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match]),
+    ).annotate(search_rank=RawSQL(
+        f'SELECT {bm25} FROM {table} WHERE {table} MATCH %s AND rowid = {model_table}.{pk}', [match],
+    ))
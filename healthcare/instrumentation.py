@@ -0,0 +1,279 @@
+"""Per-request SQL instrumentation.
+
+SQLInstrumentationMiddleware installs a ``connection.execute_wrapper`` for the
+duration of each request and records, per view:
+
+- number of queries and total SQL time,
+- query *fingerprints* (SQL with literals and IN-lists replaced by ``?``) and
+  how often each ran; one fingerprint repeated ``SQL_N_PLUS_ONE_THRESHOLD``
+  times or more is flagged as a likely N+1 (a lazy relation or property
+  evaluated per row).
+
+Every response gets a ``Server-Timing`` header (db / app durations, visible in
+the browser dev tools). Each request is appended as one JSON line to
+``SQL_INSTRUMENTATION_LOG``; the admin "Query profile" page
+(accounts.views.AdminQueryProfileView) aggregates that file.
+
+Settings:
+    SQL_INSTRUMENTATION       True/False; default follows DEBUG at startup
+    SQL_INSTRUMENTATION_LOG   JSONL path (None: do not write records)
+    SQL_N_PLUS_ONE_THRESHOLD  repeats of one fingerprint that count as N+1 (default 5)
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger('healthcare.sql')
+
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+# Repeated fingerprints kept per record (most repeated first)
+MAX_RECORDED_FINGERPRINTS = 10
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL with literals and parameter lists normalized, so per-row variants of a query match"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """``execute_wrapper`` that counts and times queries by fingerprint.
+
+    Usable on its own::
+
+        with QueryRecorder() as recorder:
+            ...
+        recorder.count, recorder.duration, recorder.repeated()
+    """
+
+    def __init__(self, using=None):
+        self.using = using
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.fingerprint_time = defaultdict(float)
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            key = fingerprint(sql)
+            self.count += 1
+            self.duration += elapsed
+            self.fingerprints[key] += 1
+            self.fingerprint_time[key] += elapsed
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        aliases = [self.using] if self.using else list(connections)
+        for alias in aliases:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        self._stack = None
+
+    def repeated(self, minimum=2):
+        """[(fingerprint, count, seconds), ...] run at least ``minimum`` times, most repeated first"""
+        return [
+            (key, n, self.fingerprint_time[key])
+            for key, n in self.fingerprints.most_common()
+            if n >= minimum
+        ]
+
+
+def n_plus_one_threshold():
+    return getattr(settings, 'SQL_N_PLUS_ONE_THRESHOLD', DEFAULT_N_PLUS_ONE_THRESHOLD)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return match.view_name or match._func_path
+
+
+_log_lock = threading.Lock()
+
+
+def write_record(record, path=None):
+    path = path or getattr(settings, 'SQL_INSTRUMENTATION_LOG', None)
+    if not path:
+        return
+    line = json.dumps(record, separators=(',', ':')) + '\n'
+    with _log_lock:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as fh:
+            fh.write(line)
+
+
+def _lines_backwards(fh, block_size=64 * 1024):
+    """Lines of binary file ``fh``, last first, reading ``block_size`` bytes at a time"""
+    fh.seek(0, 2)
+    position = fh.tell()
+    tail = b''
+    while position > 0:
+        step = min(block_size, position)
+        position -= step
+        fh.seek(position)
+        lines = (fh.read(step) + tail).split(b'\n')
+        # The first piece may be the end of a line that starts in an earlier block
+        tail = lines.pop(0)
+        yield from reversed(lines)
+    yield tail
+
+
+def load_records(path=None, limit=5000):
+    """Yield the last ``limit`` records of the JSONL log, newest first (unparseable lines are
+    skipped). The file is read backwards block by block, so its size does not matter."""
+    path = path or getattr(settings, 'SQL_INSTRUMENTATION_LOG', None)
+    if not path:
+        return
+    try:
+        fh = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with fh:
+        for line in _lines_backwards(fh):
+            if limit is not None and limit <= 0:
+                return
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                limit = None if limit is None else limit - 1
+                yield record
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def summarize(records):
+    """Aggregate records (any iterable, consumed once) into (views, fingerprints).
+
+    views: per view name, slowest (p95 total time) first, with request count,
+    average/max queries, average SQL ms, p95 total ms and N+1 flag count.
+    fingerprints: repeated fingerprints with total repeats, worst per-request
+    repeat count and the views they appear in, most repeated first.
+    """
+    by_view = {}
+    prints = {}
+    for record in records:
+        name = record.get('view') or '?'
+        view = by_view.setdefault(name, {
+            'requests': 0, 'queries': 0, 'max_queries': 0, 'sql_ms': 0.0, 'total_ms': [], 'n_plus_one': 0,
+        })
+        queries = record.get('queries', 0)
+        view['requests'] += 1
+        view['queries'] += queries
+        view['max_queries'] = max(view['max_queries'], queries)
+        view['sql_ms'] += record.get('sql_ms', 0)
+        # Only the durations are kept per record, for the percentile
+        view['total_ms'].append(record.get('total_ms', 0))
+        view['n_plus_one'] += bool(record.get('n_plus_one'))
+        for entry in record.get('repeated', []):
+            item = prints.setdefault(entry['sql'], {
+                'sql': entry['sql'], 'total': 0, 'worst': 0, 'ms': 0.0, 'views': set(),
+            })
+            item['total'] += entry['count']
+            item['worst'] = max(item['worst'], entry['count'])
+            item['ms'] += entry.get('ms', 0)
+            item['views'].add(name)
+
+    views = []
+    for name, view in by_view.items():
+        requests = view['requests']
+        views.append({
+            'view': name,
+            'requests': requests,
+            'avg_queries': round(view['queries'] / requests, 1),
+            'max_queries': view['max_queries'],
+            'avg_sql_ms': round(view['sql_ms'] / requests, 2),
+            'p95_total_ms': round(_percentile(view['total_ms'], 95), 2),
+            'n_plus_one': view['n_plus_one'],
+        })
+    views.sort(key=lambda v: v['p95_total_ms'], reverse=True)
+
+    fingerprints = sorted(prints.values(), key=lambda f: f['total'], reverse=True)
+    for item in fingerprints:
+        item['views'] = sorted(item['views'])
+        item['ms'] = round(item['ms'], 2)
+    return views, fingerprints
+
+
+class SQLInstrumentationMiddleware:
+    """Record SQL per request; add Server-Timing; log N+1 suspects (see module docstring)"""
+
+    def __init__(self, get_response):
+        enabled = getattr(settings, 'SQL_INSTRUMENTATION', None)
+        if enabled is None:
+            enabled = settings.DEBUG
+        if not enabled:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        threshold = n_plus_one_threshold()
+        repeated = recorder.repeated()
+        suspects = [key for key, n, _ in repeated if n >= threshold]
+        name = view_name(request)
+
+        response['Server-Timing'] = (
+            f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries", '
+            f'app;dur={total * 1000:.2f}'
+        )
+        if name is None:
+            return response
+        if suspects:
+            logger.warning(
+                'Possible N+1 in %s: %s', name,
+                '; '.join(f'{n}x {key[:120]}' for key, n, _ in repeated if n >= threshold),
+            )
+        write_record({
+            'ts': timezone.now().isoformat(),
+            'view': name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'sql_ms': round(recorder.duration * 1000, 3),
+            'total_ms': round(total * 1000, 3),
+            'n_plus_one': bool(suspects),
+            'repeated': [
+                {'sql': key, 'count': n, 'ms': round(seconds * 1000, 3)}
+                for key, n, seconds in repeated[:MAX_RECORDED_FINGERPRINTS]
+            ],
+        })
+        return response
@@ -0,0 +1,195 @@
+"""Keyset (cursor) pagination for list views.
+
+OFFSET pagination reads and discards every row before the requested page and
+needs a COUNT(*) to number the pages, so deep pages of a long history get
+slower and slower. Keyset pagination instead remembers the sort key of the
+last row shown and asks for the rows after it::
+
+    WHERE date <= d AND (date < d OR (date = d AND (time < t OR (time = t AND id < i))))
+    ORDER BY date DESC, time DESC, id DESC LIMIT page_size + 1
+
+which is an index range scan whatever the page. The key is handed to the
+client as an opaque, signed ``?cursor=`` token. Pages have no numbers; a total
+is only computed when ``keyset_count_limit`` is set, and then bounded by it.
+
+Ordering fields must be non-nullable and end with a unique field (``id``).
+
+Views over a table with an archive (healthcare/archive.py) return the archived
+rows from ``get_archive_queryset()``. Every archived row sorts after
+``get_archive_boundary()`` (a value of the leading, descending, ordering
+field), so the archive is only queried for pages that reach past it.
+"""
+from operator import attrgetter
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import QueryDict
+
+CURSOR_SALT = 'healthcare.pagination.cursor'
+
+
+def encode_cursor(values, backwards=False):
+    """Opaque token for the sort key of a row (``backwards``: page before it)"""
+    raw = [v.isoformat() if hasattr(v, 'isoformat') else v for v in values]
+    return signing.dumps(['p' if backwards else 'n', raw], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, model, fields):
+    """(backwards, values) from a cursor token, or None when missing or invalid"""
+    if not token:
+        return None
+    try:
+        direction, raw = signing.loads(token, salt=CURSOR_SALT)
+        if direction not in ('n', 'p') or len(raw) != len(fields):
+            return None
+        values = [model._meta.get_field(name).to_python(v) for (name, _), v in zip(fields, raw)]
+    except (signing.BadSignature, ValidationError, TypeError, ValueError):
+        return None
+    return direction == 'p', values
+
+
+def keyset_filter(fields, values, backwards=False):
+    """Q selecting rows strictly after ``values`` in the ordering given by ``fields``
+    ([(name, descending), ...]); before them when ``backwards``."""
+    after = Q()
+    for i, (name, descending) in enumerate(fields):
+        lookup = 'lt' if descending != backwards else 'gt'
+        term = Q(**{f'{name}__{lookup}': values[i]})
+        for prev_name, prev_value in zip((n for n, _ in fields[:i]), values[:i]):
+            term &= Q(**{prev_name: prev_value})
+        after |= term
+    # Redundant bound on the leading column so the database can use an index range
+    name, descending = fields[0]
+    bound = Q(**{f'{name}__{"lte" if descending != backwards else "gte"}': values[0]})
+    return bound & after
+
+
+class KeysetPage:
+    """One page of rows plus cursors for the neighbouring pages (template-friendly)"""
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor=None, previous_cursor=None,
+                 query_params=None, cursor_kwarg='cursor', total=None, total_is_approximate=False):
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.query_params = query_params
+        self.cursor_kwarg = cursor_kwarg
+        self.total = total
+        self.total_is_approximate = total_is_approximate
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    def _query(self, cursor):
+        params = self.query_params.copy() if self.query_params is not None else QueryDict(mutable=True)
+        params.pop('page', None)
+        params[self.cursor_kwarg] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        """Query string (without '?') for the next page, keeping the other GET parameters"""
+        return self._query(self.next_cursor)
+
+    @property
+    def previous_query(self):
+        return self._query(self.previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """ListView mixin: replaces OFFSET pagination with keyset pagination.
+
+    Set ``keyset_ordering`` (e.g. ``('-appointment_date', '-appointment_time', '-id')``);
+    it overrides the queryset's ordering. ``page_obj`` in the context is a KeysetPage
+    and ``paginator`` is None. Render links with ``includes/keyset_pagination.html``.
+    """
+    keyset_ordering = ()
+    cursor_kwarg = 'cursor'
+    # Count at most this many rows for an "N total" / "N+ total" label (None: no count query)
+    keyset_count_limit = None
+
+    def get_archive_queryset(self):
+        """Archived rows to merge into the list, or None"""
+        return None
+
+    def get_archive_boundary(self):
+        """Value of the leading ordering field that every archived row sorts after"""
+        return None
+
+    def get_archive_count(self, archive, limit):
+        """Archived rows for the total, counting at least ``limit`` if there are that many"""
+        return archive.order_by()[:limit].count()
+
+    def _archive_reachable(self, rows, cursor, page_size, fields):
+        boundary = self.get_archive_boundary()
+        if boundary is None:
+            return True
+        leading = fields[0][0]
+        if cursor and cursor[0]:
+            # Paging back towards newer rows: only from a cursor already past the boundary
+            return cursor[1][0] < boundary
+        # A full page of live rows newer than the boundary leaves no room for archived ones
+        return len(rows) <= page_size or getattr(rows[page_size], leading) < boundary
+
+    def paginate_queryset(self, queryset, page_size):
+        fields = [(f.lstrip('-'), f.startswith('-')) for f in self.keyset_ordering]
+        cursor = decode_cursor(self.request.GET.get(self.cursor_kwarg), queryset.model, fields)
+        backwards = bool(cursor and cursor[0])
+
+        ordering = [f'-{name}' if descending != backwards else name for name, descending in fields]
+        qs = queryset.order_by(*ordering)
+        if cursor:
+            qs = qs.filter(keyset_filter(fields, cursor[1], backwards))
+        rows = list(qs[:page_size + 1])
+        archive = self.get_archive_queryset()
+        if archive is not None and self._archive_reachable(rows, cursor, page_size, fields):
+            archived = archive.order_by(*ordering)
+            if cursor:
+                archived = archived.filter(keyset_filter(fields, cursor[1], backwards))
+            rows += list(archived[:page_size + 1])
+            for name, descending in reversed(fields):
+                rows.sort(key=attrgetter(name), reverse=descending != backwards)
+            rows = rows[:page_size + 1]
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        def key(obj):
+            return [getattr(obj, name) for name, _ in fields]
+
+        total, approximate = None, False
+        if self.keyset_count_limit:
+            counted = queryset.order_by()[:self.keyset_count_limit + 1].count()
+            if archive is not None and counted <= self.keyset_count_limit:
+                counted += self.get_archive_count(archive, self.keyset_count_limit + 1 - counted)
+            total, approximate = min(counted, self.keyset_count_limit), counted > self.keyset_count_limit
+
+        page = KeysetPage(
+            rows, has_next, has_previous,
+            next_cursor=encode_cursor(key(rows[-1])) if has_next and rows else None,
+            previous_cursor=encode_cursor(key(rows[0]), backwards=True) if has_previous and rows else None,
+            query_params=self.request.GET,
+            cursor_kwarg=self.cursor_kwarg,
+            total=total,
+            total_is_approximate=approximate,
+        )
+        return None, page, page.object_list, page.has_other_pages()
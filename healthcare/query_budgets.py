@@ -0,0 +1,266 @@
+"""Per-route query budgets and the test base that enforces them.
+
+``BUDGETS`` maps every GET-able URL name of the accounts, doctors, hospitals
+and appointments apps to the role that requests it, the URL kwargs (names of
+objects in the seeded fixture) and the maximum number of queries the request
+may run at ``FIXTURE_SIZE``. POST-only actions are listed in ``EXEMPT`` with
+the reason; a test fails when a new route is in neither, so every page gets a
+budget when it is added.
+
+QueryBudgetTestCase seeds a realistic fixture (hospitals with departments,
+doctors, patients, appointments in every status, admissions, reviews and
+requests), then checks each route of its ``namespace``:
+
+- the request stays within its budget, and
+- the query count does not grow after seeding another batch of the same size
+  (a count that scales with N is an N+1).
+
+If a change legitimately needs more queries, raise the budget in the same
+commit so the increase is reviewed.
+"""
+from datetime import time, timedelta
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+FIXTURE_SIZE = 6
+
+# url name -> {'as': role in the fixture (None: anonymous),
+#              'max': queries beyond the session and user lookups, 'kwargs': {kwarg: fixture attr}}
+BUDGETS = {
+    # accounts
+    'accounts:register': {'as': None, 'max': 0},
+    'accounts:login': {'as': None, 'max': 0},
+    'accounts:dashboard_redirect': {'as': 'patient', 'max': 0},
+    'accounts:admin_dashboard': {'as': 'admin', 'max': 5},
+    'accounts:admin_user_list': {'as': 'admin', 'max': 2},
+    'accounts:admin_patient_list': {'as': 'admin', 'max': 2},
+    'accounts:admin_doctor_list': {'as': 'admin', 'max': 2},
+    'accounts:admin_hospital_list': {'as': 'admin', 'max': 2},
+    'accounts:admin_user_profile': {'as': 'admin', 'max': 1, 'kwargs': {'pk': 'patient'}},
+    'accounts:admin_query_profile': {'as': 'admin', 'max': 0},
+    'accounts:admin_doctor_profile_requests': {'as': 'admin', 'max': 2},
+    'accounts:admin_doctor_profile_request_detail': {'as': 'admin', 'max': 1, 'kwargs': {'pk': 'profile_request'}},
+    'accounts:doctor_dashboard': {'as': 'doctor', 'max': 5},
+    'accounts:doctor_profile_edit': {'as': 'doctor', 'max': 2},
+    'accounts:patient_dashboard': {'as': 'patient', 'max': 4},
+    'accounts:hospital_dashboard': {'as': 'hospital_user', 'max': 4},
+    # doctors
+    'doctors:doctor_search': {'as': 'patient', 'max': 2},
+    'doctors:doctor_detail': {'as': 'patient', 'max': 4, 'kwargs': {'pk': 'doctor_profile'}},
+    'doctors:doctor_hospital_list': {'as': 'doctor', 'max': 5},
+    'doctors:doctor_send_request': {'as': 'doctor', 'max': 1, 'kwargs': {'hospital_id': 'other_hospital'}},
+    'doctors:doctor_availability': {'as': 'doctor', 'max': 2},
+    'doctors:doctor_appointment_list': {'as': 'doctor', 'max': 1},
+    'doctors:doctor_appointment_detail': {'as': 'doctor', 'max': 1, 'kwargs': {'pk': 'appointment'}},
+    # hospitals
+    'hospitals:hospital_search': {'as': 'patient', 'max': 3},
+    'hospitals:hospital_detail': {'as': 'patient', 'max': 6, 'kwargs': {'pk': 'hospital'}},
+    'hospitals:admin_dashboard': {'as': 'hospital_user', 'max': 5},
+    'hospitals:admin_profile': {'as': 'hospital_user', 'max': 2},
+    'hospitals:admin_doctor_requests': {'as': 'hospital_user', 'max': 3},
+    'hospitals:admin_doctor_request_detail': {'as': 'hospital_user', 'max': 2, 'kwargs': {'pk': 'doctor_request'}},
+    'hospitals:admin_doctor_list': {'as': 'hospital_user', 'max': 3},
+    'hospitals:admin_doctor_detail': {'as': 'hospital_user', 'max': 2, 'kwargs': {'pk': 'doctor_profile'}},
+    'hospitals:admin_appointments': {'as': 'hospital_user', 'max': 3},
+    'hospitals:admin_appointment_detail': {'as': 'hospital_user', 'max': 3, 'kwargs': {'pk': 'appointment'}},
+    # +2 for the archive (healthcare/archive.py): rows once the live ones run out, and the cold cached count
+    'hospitals:admin_admissions': {'as': 'hospital_user', 'max': 5},
+    # appointments
+    # +1 for the cold cached archived counts
+    'appointments:history': {'as': 'patient', 'max': 3},
+    'appointments:patient_detail': {'as': 'patient', 'max': 3, 'kwargs': {'pk': 'completed_appointment'}},
+    'appointments:book_normal': {'as': 'patient', 'max': 2, 'kwargs': {'doctor_id': 'doctor_profile'}},
+    'appointments:emergency_booking': {'as': 'patient', 'max': 2},
+}
+
+# url name -> why it has no budget
+EXEMPT = {
+    'accounts:logout': 'logs the user out',
+    'accounts:admin_approve_doctor_profile_request': 'POST action',
+    'accounts:admin_reject_doctor_profile_request': 'POST action',
+    'accounts:doctor_profile_photo': 'POST action',
+    'accounts:approve_doctor': 'POST action',
+    'accounts:approve_hospital': 'POST action',
+    'accounts:reject_doctor': 'POST action',
+    'accounts:reject_hospital': 'POST action',
+    'accounts:block_user': 'POST action',
+    'accounts:unblock_user': 'POST action',
+    'doctors:request_join_hospital': 'POST action',
+    'doctors:doctor_appointment_approve': 'POST action',
+    'doctors:doctor_appointment_reject': 'POST action',
+    'doctors:doctor_appointment_complete': 'POST action',
+    'doctors:doctor_appointment_notes': 'POST action',
+    'hospitals:submit_review': 'POST action',
+    'hospitals:admin_approve_doctor_request': 'POST action',
+    'hospitals:admin_reject_doctor_request': 'POST action',
+    'hospitals:admin_remove_doctor': 'POST action',
+    'hospitals:admin_update_appointment_status': 'POST action',
+    'hospitals:admin_admit_patient': 'POST action',
+    'hospitals:admin_discharge_patient': 'POST action',
+    'appointments:confirm_emergency': 'POST action',
+    'appointments:cancel': 'POST action',
+}
+
+BUDGETED_APPS = ('accounts', 'doctors', 'hospitals', 'appointments')
+
+
+def route_names(app_label):
+    """Namespaced names of all routes in ``<app_label>.urls``"""
+    from importlib import import_module
+    urls = import_module(f'{app_label}.urls')
+    return [f'{urls.app_name}:{p.name}' for p in urls.urlpatterns if getattr(p, 'name', None)]
+
+
+def _user(username, role, **extra):
+    from accounts.models import User
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password=None,
+        role=role, is_approved=True, first_name=username.title(), **extra,
+    )
+
+
+def seed_fixture(size=FIXTURE_SIZE, base=None):
+    """Create one batch of ``size`` hospitals, doctors and patients with related rows.
+
+    The first batch (``base=None``) also creates the subjects the routes are
+    requested as (admin, patient, doctor, hospital_user) and returns them with
+    the objects named in BUDGETS kwargs. Later batches (``base=<first batch>``)
+    attach the same amount of data to those subjects again.
+    """
+    from appointments.models import Appointment
+    from doctors.models import DoctorProfile, DoctorProfileUpdateRequest
+    from hospitals.models import Hospital, HospitalReview, DoctorHospitalRequest, DoctorHospitalAssignment, Admission
+    from patients.models import PatientProfile
+
+    batch = 0 if base is None else base.batches
+    tag = f'b{batch}'
+    today = timezone.now().date()
+    now = timezone.now()
+
+    if base is None:
+        f = SimpleNamespace(batches=0)
+        f.admin = _user('admin', 'ADMIN', is_staff=True)
+        f.hospital_user = _user('main_hospital', 'HOSPITAL')
+        f.hospital = Hospital.objects.create(
+            user=f.hospital_user, name='Main Hospital', registration_number='MAIN', city='Ahmedabad',
+            total_beds=50, facilities='Emergency, Cardiology, General Medicine',
+        )
+        f.doctor = _user('main_doctor', 'DOCTOR')
+        f.doctor_profile = DoctorProfile.objects.create(
+            user=f.doctor, license_number='MAIN', qualification='MBBS, MD',
+            specialization='CARDIOLOGY', hospital=f.hospital,
+        )
+        f.patient = _user('main_patient', 'PATIENT')
+        PatientProfile.objects.create(user=f.patient)
+        other_user = _user('other_hospital', 'HOSPITAL')
+        f.other_hospital = Hospital.objects.create(
+            user=other_user, name='Other Hospital', registration_number='OTHER', total_beds=10,
+        )
+        f.appointment = Appointment.objects.create(
+            patient=f.patient, doctor=f.doctor, hospital=f.hospital, reason='Checkup',
+            appointment_date=today + timedelta(days=1), appointment_time=time(9, 0), status='CONFIRMED',
+        )
+    else:
+        f = base
+    f.batches += 1
+
+    for i in range(size):
+        n = batch * size + i
+        hospital_user = _user(f'hospital_{tag}_{i}', 'HOSPITAL')
+        hospital = Hospital.objects.create(
+            user=hospital_user, name=f'Hospital {tag} {i}', registration_number=f'REG-{tag}-{i}',
+            city='Surat' if i % 2 else 'Ahmedabad', total_beds=20, facilities='Emergency, Pediatrics',
+        )
+        doctor = _user(f'doctor_{tag}_{i}', 'DOCTOR')
+        profile = DoctorProfile.objects.create(
+            user=doctor, license_number=f'LIC-{tag}-{i}', qualification='MBBS',
+            specialization='CARDIOLOGY' if i % 2 else 'GENERAL', hospital=hospital,
+        )
+        DoctorHospitalAssignment.objects.create(doctor=profile, hospital=f.hospital)
+        patient = _user(f'patient_{tag}_{i}', 'PATIENT')
+        PatientProfile.objects.create(user=patient)
+
+        # Upcoming, today's and past appointments for the main doctor, patient and hospital
+        for status, days in (('PENDING', 2 + n), ('CONFIRMED', 0), ('COMPLETED', -1 - n), ('CANCELLED', -1 - n)):
+            Appointment.objects.create(
+                patient=patient, doctor=f.doctor, hospital=f.hospital, reason='Checkup', status=status,
+                appointment_date=today + timedelta(days=days), appointment_time=time(8 + n % 12, 30 * (status == 'CANCELLED')),
+            )
+        # Past and upcoming appointments of the main patient with other doctors
+        for status, days in (('COMPLETED', -1 - n), ('PENDING', 2 + n)):
+            Appointment.objects.create(
+                patient=f.patient, doctor=doctor, hospital=hospital, reason='Follow-up', status=status,
+                appointment_date=today + timedelta(days=days), appointment_time=time(7, 0),
+            )
+        Admission.objects.create(
+            patient=patient, doctor=f.doctor, hospital=f.hospital, admission_time=now - timedelta(days=1 + n),
+        )
+        HospitalReview.objects.create(hospital=f.hospital, patient=patient, rating=1 + n % 5)
+        DoctorHospitalRequest.objects.create(doctor=profile, hospital=f.hospital, expected_monthly_salary=50000)
+        DoctorProfileUpdateRequest.objects.create(doctor=profile, field_name='qualification', new_value_text='MBBS, MS')
+
+    if batch == 0:
+        f.doctor_request = DoctorHospitalRequest.objects.filter(hospital=f.hospital).first()
+        f.profile_request = DoctorProfileUpdateRequest.objects.first()
+        f.completed_appointment = Appointment.objects.filter(patient=f.patient, status='COMPLETED').first()
+    return f
+
+
+class QueryBudgetTestCase(TestCase):
+    """Base for per-app budget tests; subclasses set ``namespace`` and call check_budgets()"""
+    namespace = None
+    fixture_size = FIXTURE_SIZE
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = seed_fixture(cls.fixture_size)
+
+    def route_url(self, url_name):
+        kwargs = {k: getattr(self.fixture, attr).pk for k, attr in BUDGETS[url_name].get('kwargs', {}).items()}
+        return reverse(url_name, kwargs=kwargs)
+
+    def count_queries(self, url_name):
+        """Queries run by the view itself (login/session lookups excluded) with a cold
+        read-model cache, and the response"""
+        role = BUDGETS[url_name]['as']
+        cache.clear()
+        self.client.logout()
+        if role:
+            self.client.force_login(getattr(self.fixture, role))
+        url = self.route_url(url_name)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        # Session and user lookups of the logged-in client are the same on every page
+        overhead = 2 if role else 0
+        return len(ctx.captured_queries) - overhead, response
+
+    def budgeted_routes(self):
+        return [name for name in BUDGETS if name.split(':')[0] == self.namespace]
+
+    def check_budgets(self):
+        routes = self.budgeted_routes()
+        before = {}
+        for name in routes:
+            with self.subTest(route=name):
+                count, response = self.count_queries(name)
+                self.assertLess(response.status_code, 400, f'{name} returned {response.status_code}')
+                self.assertLessEqual(
+                    count, BUDGETS[name]['max'],
+                    f'{name} ran {count} queries (budget {BUDGETS[name]["max"]})',
+                )
+                before[name] = count
+
+        seed_fixture(self.fixture_size, base=self.fixture)
+        for name in routes:
+            with self.subTest(route=name, check='scaling'):
+                count, _ = self.count_queries(name)
+                self.assertEqual(
+                    count, before[name],
+                    f'{name} went from {before[name]} to {count} queries when the data doubled (N+1?)',
+                )
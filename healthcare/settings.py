@@ -44,9 +44,11 @@ INSTALLED_APPS = [
     'hospitals',
     'appointments',
     'documents',
+    'taskqueue',
 ]
 
 MIDDLEWARE = [
+    'healthcare.instrumentation.SQLInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,6 +90,26 @@ DATABASES = {
 }
 
 
+# Cache
+# One SQLite file shared by every worker process (see healthcare/sqlite_cache.py)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'healthcare.sqlite_cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'cache' / 'default.sqlite3',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+            'L1_MAX_ENTRIES': 1000,
+        },
+    }
+}
+
+# Tests use a temporary cache file per run, cleared after every test
+TEST_RUNNER = 'healthcare.test_runner.TestRunner'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -137,3 +159,40 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # Media files
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Document downloads (documents.views.download_document) are streamed by Django unless the
+# web server is set up to send them: 'nginx' (X-Accel-Redirect to DOCUMENT_ACCEL_PREFIX, an
+# internal location aliased to MEDIA_ROOT) or 'sendfile' (X-Sendfile with the file path)
+DOCUMENT_DOWNLOAD_ACCEL = None
+DOCUMENT_ACCEL_PREFIX = '/protected-media/'
+
+# Resumable chunked uploads of large documents (documents.views.upload_*). Part files live in
+# CHUNKED_UPLOAD_DIR (default: MEDIA_ROOT/medical_documents/uploads) until completed.
+CHUNKED_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+CHUNKED_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRY = 24 * 60 * 60
+
+# PENDING/CONFIRMED appointments this many days past their date become EXPIRED
+# (Appointment.expire_overdue, run hourly by the task worker)
+APPOINTMENT_EXPIRY_DAYS = 1
+
+# Finished appointments and discharged admissions older than this move to archive tables
+# (healthcare/archive.py; daily task or `manage.py archive_history`). List views assume every
+# archived row is older than the current horizon, so only ever lower this.
+ARCHIVE_AFTER_DAYS = 2 * 365
+
+# Background tasks (taskqueue), run by `manage.py run_worker`. A failed task is retried after
+# TASK_QUEUE_RETRY_DELAY seconds, doubling up to TASK_QUEUE_MAX_BACKOFF; a RUNNING task not
+# finished within TASK_QUEUE_LEASE seconds is assumed lost and queued again. Finished tasks are
+# purged after TASK_QUEUE_KEEP_FINISHED seconds. TASK_QUEUE_EAGER runs tasks in-process on commit.
+TASK_QUEUE_EAGER = False
+TASK_QUEUE_RETRY_DELAY = 30
+TASK_QUEUE_MAX_BACKOFF = 60 * 60
+TASK_QUEUE_LEASE = 10 * 60
+TASK_QUEUE_KEEP_FINISHED = 7 * 24 * 60 * 60
+
+# SQL instrumentation (healthcare.instrumentation): per-request query counts,
+# Server-Timing header, N+1 warnings and a JSONL log for the admin Query profile page.
+# SQL_INSTRUMENTATION defaults to DEBUG; set True/False to force it.
+SQL_INSTRUMENTATION_LOG = BASE_DIR / 'logs' / 'sql_instrumentation.jsonl'
+SQL_N_PLUS_ONE_THRESHOLD = 5
@@ -0,0 +1,343 @@
+"""Cache backend storing entries in a SQLite file shared by every worker process.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'healthcare.sqlite_cache.SQLiteCache',
+            'LOCATION': BASE_DIR / 'cache' / 'default.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 50000, 'MAX_SIZE': 256 * 1024 * 1024},
+        },
+    }
+
+- The file is opened in WAL mode, so readers never block the (single) writer
+  and commits do not fsync.
+- ``expires`` and ``accessed`` are indexed: expired rows are dropped with a
+  range delete, and when ``MAX_ENTRIES`` or ``MAX_SIZE`` (bytes) is exceeded
+  the least recently used rows go first. Hits refresh ``accessed`` at most
+  every ``ACCESS_RESOLUTION`` seconds so reads rarely write. Entry count and
+  total size are kept in a one-row table by triggers, so the limit check on
+  set() does not scan the table.
+- ``incr``/``decr`` and ``add`` are single statements (integers are stored as
+  SQLite integers, everything else pickled), so concurrent workers never lose
+  an update.
+- A bounded in-process L1 (``L1_MAX_ENTRIES``, LRU) keeps recently read values.
+  It is dropped whenever ``PRAGMA data_version`` shows that another connection
+  committed to the file, so an L1 hit never returns a value another worker has
+  since replaced.
+
+Django keeps one cache instance per thread, so each thread has its own
+connection and L1.
+"""
+import os
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires) WHERE expires IS NOT NULL;
+CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (accessed);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats (id, entries, bytes) VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entries_ins AFTER INSERT ON cache_entries BEGIN
+    UPDATE cache_stats SET entries = entries + 1, bytes = bytes + NEW.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_del AFTER DELETE ON cache_entries BEGIN
+    UPDATE cache_stats SET entries = entries - 1, bytes = bytes - OLD.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_upd AFTER UPDATE OF size ON cache_entries BEGIN
+    UPDATE cache_stats SET bytes = bytes - OLD.size + NEW.size WHERE id = 1;
+END;
+"""
+
+UPSERT = (
+    'INSERT INTO cache_entries (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?) '
+    'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires, '
+    'accessed = excluded.accessed, size = excluded.size'
+)
+INT_MIN, INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def _encode(value):
+    # Exact ints are stored natively so incr() can be one UPDATE; bool stays pickled
+    if type(value) is int and INT_MIN <= value <= INT_MAX:
+        return value, 8
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return data, len(data)
+
+
+def _decode(stored):
+    return stored if isinstance(stored, int) else pickle.loads(stored)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = Path(location)
+        self.max_size = options.get('MAX_SIZE')
+        self.l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self.access_resolution = float(options.get('ACCESS_RESOLUTION', 60))
+        self._conn = None
+        self._pid = None
+        self._data_version = None
+        self._l1 = OrderedDict()
+
+    # Connection and L1
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            # (Re)open after fork: a connection must not be shared across processes
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+            self._l1.clear()
+            self._data_version = None
+        return self._conn
+
+    def _sync_l1(self, conn):
+        """Drop the L1 when another connection has committed since the last check"""
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if version != self._data_version:
+            self._l1.clear()
+            self._data_version = version
+
+    def _l1_get(self, key, now):
+        entry = self._l1.get(key)
+        if entry is None:
+            return None
+        stored, expires = entry
+        if expires is not None and expires <= now:
+            del self._l1[key]
+            return None
+        self._l1.move_to_end(key)
+        return entry
+
+    def _l1_put(self, key, stored, expires):
+        if self.l1_max_entries <= 0:
+            return
+        self._l1[key] = (stored, expires)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_max_entries:
+            self._l1.popitem(last=False)
+
+    # Reads
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        now = time.time()
+        self._sync_l1(conn)
+        entry = self._l1_get(key, now)
+        if entry is not None:
+            return _decode(entry[0])
+        row = conn.execute('SELECT value, expires, accessed FROM cache_entries WHERE key = ?', [key]).fetchone()
+        if row is None:
+            return default
+        stored, expires, accessed = row
+        if expires is not None and expires <= now:
+            return default
+        if now - accessed > self.access_resolution:
+            # Own commits leave data_version alone: the value from _sync_l1 stays valid
+            conn.execute('UPDATE cache_entries SET accessed = ? WHERE key = ?', [now, key])
+        self._l1_put(key, stored, expires)
+        return _decode(stored)
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        conn = self._connection()
+        now = time.time()
+        self._sync_l1(conn)
+        found, missing = {}, []
+        for key, original in keys.items():
+            entry = self._l1_get(key, now)
+            if entry is None:
+                missing.append(key)
+            else:
+                found[original] = _decode(entry[0])
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            rows = conn.execute(
+                f'SELECT key, value, expires FROM cache_entries WHERE key IN ({",".join("?" * len(chunk))})', chunk,
+            )
+            for key, stored, expires in rows:
+                if expires is None or expires > now:
+                    self._l1_put(key, stored, expires)
+                    found[keys[key]] = _decode(stored)
+        return found
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)', [key, time.time()],
+        ).fetchone()
+        return row is not None
+
+    # Writes
+
+    def _write(self, sql, params):
+        """Execute one statement after syncing the L1.
+
+        data_version does not change for this connection's own commits, so it is not read
+        again afterwards: a commit by another connection between the sync and the write
+        still moves it, and the next read drops the L1.
+        """
+        conn = self._connection()
+        self._sync_l1(conn)
+        return conn.execute(sql, params)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        stored, size = _encode(value)
+        expires = self.get_backend_timeout(timeout)
+        self._write(UPSERT, [key, stored, expires, time.time(), size])
+        self._l1_put(key, stored, expires)
+        self._cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        stored, size = _encode(value)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        # Insert, or replace an expired entry; a live entry is left alone
+        cursor = self._write(
+            UPSERT + ' WHERE cache_entries.expires IS NOT NULL AND cache_entries.expires <= ?',
+            [key, stored, expires, now, size, now],
+        )
+        if cursor.rowcount != 1:
+            return False
+        self._l1_put(key, stored, expires)
+        self._cull()
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._write(
+            'UPDATE cache_entries SET expires = ?, accessed = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            [self.get_backend_timeout(timeout), now, key, now],
+        )
+        self._l1.pop(key, None)
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        row = self._write(
+            "UPDATE cache_entries SET value = value + ? WHERE key = ? AND typeof(value) = 'integer' "
+            'AND (expires IS NULL OR expires > ?) RETURNING value, expires',
+            [delta, key, now],
+        ).fetchone()
+        if row is None:
+            self._l1.pop(key, None)
+            if self._live(key, now):
+                raise TypeError(f"Key '{key}' does not hold an integer.")
+            raise ValueError(f"Key '{key}' not found")
+        self._l1_put(key, row[0], row[1])
+        return row[0]
+
+    def _live(self, key, now):
+        return self._connection().execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)', [key, now],
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._l1.pop(key, None)
+        return self._write('DELETE FROM cache_entries WHERE key = ?', [key]).rowcount == 1
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            key = self.make_and_validate_key(key, version=version)
+            stored, size = _encode(value)
+            rows.append((key, stored, expires, now, size))
+        conn = self._connection()
+        self._sync_l1(conn)
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(UPSERT, rows)
+        for key, stored, expires, _, _ in rows:
+            self._l1_put(key, stored, expires)
+        self._cull()
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        for key in keys:
+            self._l1.pop(key, None)
+        conn = self._connection()
+        self._sync_l1(conn)
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('DELETE FROM cache_entries WHERE key = ?', [(key,) for key in keys])
+
+    def clear(self):
+        self._l1.clear()
+        self._write('DELETE FROM cache_entries', [])
+
+    def close(self, **kwargs):
+        # Called at the end of every request; the connection is kept for the next one
+        pass
+
+    # Eviction
+
+    def stats(self):
+        """(entries, bytes) currently stored, expired entries included"""
+        return tuple(self._connection().execute('SELECT entries, bytes FROM cache_stats WHERE id = 1').fetchone())
+
+    def _cull(self):
+        entries, size = self.stats()
+        over_entries = self._max_entries and entries > self._max_entries
+        over_size = self.max_size and size > self.max_size
+        if not (over_entries or over_size):
+            return
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires <= ?', [time.time()])
+            entries, size = conn.execute('SELECT entries, bytes FROM cache_stats WHERE id = 1').fetchone()
+            if self._max_entries and entries > self._max_entries:
+                # Like the built-in backends, drop 1/CULL_FREQUENCY of the entries at once
+                count = max(entries - self._max_entries, entries // self._cull_frequency if self._cull_frequency else entries)
+                conn.execute(
+                    'DELETE FROM cache_entries WHERE key IN '
+                    '(SELECT key FROM cache_entries ORDER BY accessed LIMIT ?)', [count],
+                )
+            if self.max_size:
+                target = self.max_size * (1 - 1 / self._cull_frequency) if self._cull_frequency else 0
+                while True:
+                    size = conn.execute('SELECT bytes FROM cache_stats WHERE id = 1').fetchone()[0]
+                    if size <= self.max_size:
+                        break
+                    # Oldest rows until the total is back under the target
+                    conn.execute(
+                        'DELETE FROM cache_entries WHERE key IN (SELECT key FROM ('
+                        'SELECT key, size, SUM(size) OVER (ORDER BY accessed) AS running FROM cache_entries '
+                        'ORDER BY accessed) WHERE running - size < ?)',
+                        [size - target],
+                    )
+        # The L1 is empty, so commits by others up to now need not be noticed again
+        self._l1.clear()
+        self._data_version = conn.execute('PRAGMA data_version').fetchone()[0]
@@ -0,0 +1,78 @@
+"""Test runner that keeps tests away from the developer's cache.
+
+The configured cache is a persistent SQLite file under BASE_DIR/cache. Tests
+run against a temporary file per run instead, so ``cache.clear()`` in a test
+never wipes the real one. Every cache is also cleared after each test:
+TestCase rolls back, so the ``on_commit`` version bumps of healthcare.cache
+never fire, and a read model cached by one test would otherwise be served to
+the next test that reuses the same primary keys.
+
+    TEST_RUNNER = 'healthcare.test_runner.TestRunner'
+"""
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner, ParallelTestSuite
+from django.test.utils import iter_test_cases, override_settings
+
+# Backends whose LOCATION is a path on disk
+FILE_BACKENDS = {
+    'healthcare.sqlite_cache.SQLiteCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+}
+
+
+def isolated_caches(config, directory):
+    """``config`` (a CACHES setting) with every on-disk LOCATION moved into ``directory``"""
+    isolated = {}
+    for alias, options in config.items():
+        options = dict(options)
+        if options.get('BACKEND') in FILE_BACKENDS:
+            location = Path(directory) / alias
+            if options['BACKEND'] != 'django.core.cache.backends.filebased.FileBasedCache':
+                location = location.with_suffix('.sqlite3')
+            options['LOCATION'] = location
+        isolated[alias] = options
+    return isolated
+
+
+def clear_caches():
+    for cache in caches.all(initialized_only=True):
+        cache.clear()
+
+
+def use_caches(config):
+    # Spawned parallel workers import the settings afresh
+    override_settings(CACHES=config).enable()
+
+
+class CacheIsolatedParallelTestSuite(ParallelTestSuite):
+    process_setup = use_caches
+
+
+class TestRunner(DiscoverRunner):
+    parallel_test_suite = CacheIsolatedParallelTestSuite
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.TemporaryDirectory(prefix='healthcare-test-cache-')
+        self._cache_settings = override_settings(CACHES=isolated_caches(settings.CACHES, self._cache_dir.name))
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        self._cache_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
+
+    def build_suite(self, *args, **kwargs):
+        suite = super().build_suite(*args, **kwargs)
+        if isinstance(suite, ParallelTestSuite):
+            suite.process_setup_args = (settings.CACHES,)
+            tests = iter_test_cases(suite.subsuites)
+        else:
+            tests = iter_test_cases(suite)
+        for test in tests:
+            test.addCleanup(clear_caches)
+        return suite
@@ -0,0 +1,173 @@
+"""Fixed-size renditions of profile pictures and hospital logos.
+
+Every image uploaded to one of ``FIELDS`` gets square thumbnails of each
+``SIZES`` width, in WebP and JPEG, stored next to the original:
+
+    doctor_profiles/jane.png -> doctor_profiles/thumbs/jane.png-64.webp, jane.png-64.jpg, ...
+
+They are generated in the background: the post_save receiver registered in
+connect() queues ``generate_renditions`` (taskqueue), and the
+``generate_thumbnails`` command backfills files uploaded before. When an
+image is replaced, cleared or its row deleted, ``delete_renditions`` removes
+the renditions of the old one. The ``{% thumbnail %}`` tag (accounts/templatetags/thumbnails.py)
+renders them as a <picture> with ``srcset`` and falls back to the original
+while an image has no renditions yet.
+
+Whether an image has renditions is remembered in the cache, so rendering a
+list of avatars does not stat every file.
+"""
+import posixpath
+from io import BytesIO
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db.models.signals import post_delete, post_save, pre_save
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from taskqueue.queue import task
+
+# model label -> image field
+FIELDS = {
+    'accounts.User': 'profile_picture',
+    'doctors.DoctorProfile': 'profile_picture',
+    'patients.PatientProfile': 'profile_picture',
+    'hospitals.Hospital': 'logo',
+}
+SIZES = (64, 160, 320)
+FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+QUALITY = 82
+AVAILABLE_TIMEOUT = 24 * 60 * 60
+
+
+def rendition_name(name, size, ext):
+    """Storage name of the ``size`` px ``ext`` rendition of the original ``name``.
+    The original's extension is kept, so a.png and a.jpg do not share renditions."""
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, 'thumbs', f'{filename}-{size}.{ext}')
+
+
+def rendition_names(name):
+    return [rendition_name(name, size, ext) for size in SIZES for ext in FORMATS]
+
+
+def _available_key(name):
+    return f'thumbnails:{name}'
+
+
+def has_renditions(storage, name):
+    """Whether the renditions of ``name`` exist (cached)"""
+    key = _available_key(name)
+    available = cache.get(key)
+    if available is None:
+        available = storage.exists(rendition_name(name, SIZES[-1], 'jpg'))
+        cache.set(key, available, AVAILABLE_TIMEOUT)
+    return available
+
+
+def _render(image, size, fmt):
+    thumb = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    if fmt == 'JPEG' and thumb.mode != 'RGB':
+        # Flatten transparency (logos) onto white
+        background = Image.new('RGB', thumb.size, (255, 255, 255))
+        background.paste(thumb, mask=thumb.getchannel('A') if 'A' in thumb.getbands() else None)
+        thumb = background
+    buffer = BytesIO()
+    thumb.save(buffer, fmt, quality=QUALITY, optimize=fmt == 'JPEG')
+    return buffer.getvalue()
+
+
+def generate(fieldfile):
+    """Write the renditions of an uploaded image; returns their names.
+
+    Raises ValueError when the file is missing or not an image.
+    """
+    storage, name = fieldfile.storage, fieldfile.name
+    try:
+        with storage.open(name, 'rb') as source:
+            image = Image.open(source)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        raise ValueError(f'Cannot read image {name}: {exc}') from exc
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    names = []
+    for size in SIZES:
+        for ext, fmt in FORMATS.items():
+            target = rendition_name(name, size, ext)
+            # Overwrite in place: save() would pick another name for an existing file
+            storage.delete(target)
+            names.append(storage.save(target, ContentFile(_render(image, size, fmt))))
+    cache.set(_available_key(name), True, AVAILABLE_TIMEOUT)
+    return names
+
+
+def delete(fieldfile):
+    for target in rendition_names(fieldfile.name):
+        fieldfile.storage.delete(target)
+    cache.delete(_available_key(fieldfile.name))
+
+
+@task(max_attempts=3)
+def generate_renditions(label, name):
+    """Background generate() of the image ``name`` stored in the FIELDS field of ``label``"""
+    field = apps.get_model(label)._meta.get_field(FIELDS[label])
+    try:
+        generate(field.attr_class(None, field, name))
+    except ValueError:
+        # Not fatal: the original is still served, and the backfill retries
+        pass
+
+
+@task(max_attempts=3)
+def delete_renditions(label, name):
+    """Background delete() of the renditions of a replaced or removed image"""
+    field = apps.get_model(label)._meta.get_field(FIELDS[label])
+    delete(field.attr_class(None, field, name))
+
+
+def _mark_uploads(sender, instance, update_fields=None, **kwargs):
+    field = FIELDS[sender._meta.label]
+    instance._thumbnail_replaced = None
+    if update_fields is not None and field not in update_fields:
+        return
+    fieldfile = getattr(instance, field)
+    # An uncommitted FieldFile is a new upload that this save() writes to storage
+    instance._thumbnail_upload = bool(fieldfile) and not fieldfile._committed
+    if instance.pk and (instance._thumbnail_upload or not fieldfile):
+        # A new upload or a cleared field retires the previous image's renditions
+        instance._thumbnail_replaced = (
+            sender._default_manager.filter(pk=instance.pk).values_list(field, flat=True).first() or None
+        )
+
+
+def _generate_uploads(sender, instance, **kwargs):
+    label = sender._meta.label
+    name = getattr(instance, FIELDS[label]).name
+    replaced, instance._thumbnail_replaced = getattr(instance, '_thumbnail_replaced', None), None
+    if replaced and replaced != name:
+        # Queued first, in case the new upload was stored under the old name
+        delete_renditions.delay(label, replaced)
+    if not getattr(instance, '_thumbnail_upload', False):
+        return
+    instance._thumbnail_upload = False
+    generate_renditions.delay(label, name)
+
+
+def _delete_renditions(sender, instance, **kwargs):
+    label = sender._meta.label
+    fieldfile = getattr(instance, FIELDS[label])
+    if fieldfile:
+        delete_renditions.delay(label, fieldfile.name)
+
+
+def connect():
+    """Queue rendition generation whenever a new image is saved to one of FIELDS, and
+    removal of the old renditions when it replaces or clears another or the row is deleted"""
+    for label in FIELDS:
+        model = apps.get_model(label)
+        pre_save.connect(_mark_uploads, sender=model, dispatch_uid=f'thumbnails-mark-{label}')
+        post_save.connect(_generate_uploads, sender=model, dispatch_uid=f'thumbnails-generate-{label}')
+        post_delete.connect(_delete_renditions, sender=model, dispatch_uid=f'thumbnails-delete-{label}')
@@ -14,11 +14,14 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from django.shortcuts import redirect
+from django.views.static import serve
 
 def home(request):
     """Redirect to login or dashboard"""
@@ -34,9 +37,13 @@ urlpatterns = [
     path('doctors/', include('doctors.urls')),
     path('appointments/', include('appointments.urls')),
     path('patients/', include('patients.urls')),
+    path('documents/', include('documents.urls')),
 ]
 
-# Serve media files in development
+# Serve media files in development; medical documents only through documents:download
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += [
+        re_path(r'^%s(?!medical_documents/)(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+                serve, {'document_root': settings.MEDIA_ROOT}),
+    ]
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
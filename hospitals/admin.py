@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Hospital, HospitalReview, DoctorHospitalRequest, DoctorHospitalAssignment
+from .models import Hospital, HospitalReview, DoctorHospitalRequest, DoctorHospitalAssignment, Department
 
 @admin.register(Hospital)
 class HospitalAdmin(admin.ModelAdmin):
@@ -18,3 +18,9 @@ class DoctorHospitalRequestAdmin(admin.ModelAdmin):
 @admin.register(DoctorHospitalAssignment)
 class DoctorHospitalAssignmentAdmin(admin.ModelAdmin):
     list_display = ['doctor', 'hospital', 'monthly_salary', 'is_active', 'joined_at']
+
+
+@admin.register(Department)
+class DepartmentAdmin(admin.ModelAdmin):
+    list_display = ['name', 'key']
+    search_fields = ['name']
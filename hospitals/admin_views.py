@@ -5,12 +5,15 @@ from django.urls import reverse_lazy
 from django.views.generic import TemplateView, ListView, DetailView, UpdateView
 from django.contrib import messages
 from django.utils import timezone
-from django.db import transaction
-from django.db.models import Q
+from django.db import transaction, IntegrityError
 from django.core.paginator import Paginator
 
 from accounts.mixins import HospitalRequiredMixin
-from .models import Hospital, DoctorHospitalRequest, DoctorHospitalAssignment, Admission
+from healthcare import cache
+from healthcare.archive import horizon_datetime
+from healthcare.pagination import KeysetPaginationMixin
+from .models import Hospital, DoctorHospitalRequest, DoctorHospitalAssignment, Admission, ArchivedAdmission, occupying_bed
+from .forms import HospitalProfileForm
 from doctors.models import DoctorProfile
 from appointments.models import Appointment
 
@@ -36,39 +39,31 @@ class HospitalAdminDashboardView(HospitalRequiredMixin, TemplateView):
 
         today = timezone.now().date()
         context['hospital'] = hospital
+        stats = Appointment.objects.filter(hospital=hospital).stats(today)
         context['total_doctors'] = hospital.get_doctors().count()
-        context['total_appointments'] = Appointment.objects.filter(hospital=hospital).count()
-        context['today_appointments'] = Appointment.objects.filter(
-            hospital=hospital,
-            appointment_date=today,
-            status__in=['PENDING', 'CONFIRMED']
-        ).count()
-        context['total_admitted'] = hospital.admissions.filter(
-            Q(discharge_time__isnull=True) | Q(discharge_time__gt=timezone.now())
-        ).count()
+        context['total_appointments'] = stats['total']
+        context['today_appointments'] = stats['today_active']
+        context['total_admitted'] = Admission.objects.filter(occupying_bed(timezone.now(), hospital=hospital)).count()
         context['available_beds'] = hospital.available_beds_count
         context['occupied_beds'] = hospital.occupied_beds_count
         context['upcoming_appointments'] = Appointment.objects.filter(
             hospital=hospital,
             appointment_date__gte=today,
             status__in=['PENDING', 'CONFIRMED']
-        ).order_by('appointment_date', 'appointment_time')[:5]
+        ).select_related('patient', 'doctor').order_by('appointment_date', 'appointment_time')[:5]
         return context
 
 
 class HospitalProfileEditView(HospitalRequiredMixin, UpdateView):
     """Edit hospital profile - includes departments (facilities), contact, website, and admin contact"""
     model = Hospital
+    form_class = HospitalProfileForm
     template_name = 'hospitals/admin/profile_edit.html'
-    fields = ['name', 'description', 'facilities', 'address', 'city', 'state', 'zip_code', 'phone', 'email', 'website', 'total_beds', 'logo']
 
     def get_form(self, form_class=None):
         form = super().get_form(form_class)
         for field in form.fields:
             form.fields[field].widget.attrs.setdefault('class', 'form-control')
-        if 'facilities' in form.fields:
-            form.fields['facilities'].label = 'Departments (comma-separated)'
-            form.fields['facilities'].help_text = 'e.g. Emergency, Cardiology, General Medicine'
         return form
 
     def get_object(self, queryset=None):
@@ -227,11 +222,13 @@ def remove_doctor(request, pk):
     return redirect('hospitals:admin_doctor_detail', pk=pk)
 
 
-class HospitalAppointmentListView(HospitalRequiredMixin, ListView):
+class HospitalAppointmentListView(HospitalRequiredMixin, KeysetPaginationMixin, ListView):
     """Manage appointments - filter by status"""
     template_name = 'hospitals/admin/appointment_list.html'
     context_object_name = 'appointments'
     paginate_by = 15
+    keyset_ordering = ('-appointment_date', '-appointment_time', '-id')
+    keyset_count_limit = 1000
 
     def get_queryset(self):
         hospital = get_hospital(self.request)
@@ -285,6 +282,7 @@ APPOINTMENT_STATUS_TRANSITIONS = {
     'COMPLETED': [],   # read-only
     'CANCELLED': [],   # read-only
     'RESCHEDULED': ['CONFIRMED', 'CANCELLED'],
+    'EXPIRED': ['COMPLETED'],  # took place but was never marked completed
 }
 
 
@@ -301,18 +299,26 @@ def update_appointment_status(request, pk):
         allowed = APPOINTMENT_STATUS_TRANSITIONS.get(apt.status, [])
         if new_status in dict(Appointment.STATUS_CHOICES) and new_status in allowed:
             apt.status = new_status
-            apt.save(update_fields=['status', 'updated_at'])
+            try:
+                with transaction.atomic():
+                    apt.save(update_fields=['status', 'updated_at'])
+            except IntegrityError:
+                # e.g. RESCHEDULED -> CONFIRMED while the slot was booked by someone else
+                messages.error(request, 'This time slot is already booked; the appointment cannot be reactivated.')
+                return redirect('hospitals:admin_appointments')
             messages.success(request, f'Appointment status updated to {dict(Appointment.STATUS_CHOICES).get(new_status, new_status)}.')
         else:
             messages.error(request, 'Invalid status transition or status is read-only.')
     return redirect('hospitals:admin_appointments')
 
 
-class AdmissionListView(HospitalRequiredMixin, ListView):
+class AdmissionListView(HospitalRequiredMixin, KeysetPaginationMixin, ListView):
     """Admission history"""
     template_name = 'hospitals/admin/admission_list.html'
     context_object_name = 'admissions'
     paginate_by = 15
+    keyset_ordering = ('-admission_time', '-id')
+    keyset_count_limit = 1000
 
     def get_queryset(self):
         hospital = get_hospital(self.request)
@@ -320,6 +326,21 @@ class AdmissionListView(HospitalRequiredMixin, ListView):
             return Admission.objects.none()
         return Admission.objects.filter(hospital=hospital).select_related('patient', 'doctor').order_by('-admission_time')
 
+    def get_archive_queryset(self):
+        hospital = get_hospital(self.request)
+        if not hospital:
+            return None
+        return ArchivedAdmission.objects.filter(hospital=hospital).select_related('patient', 'doctor')
+
+    def get_archive_boundary(self):
+        return horizon_datetime()
+
+    def get_archive_count(self, archive, limit):
+        hospital = get_hospital(self.request)
+        return cache.get_or_build(
+            cache.ARCHIVED_ADMISSIONS, hospital.pk, lambda: archive.order_by()[:self.keyset_count_limit + 1].count(),
+        )
+
 
 def admit_patient(request):
     """Create admission - for emergency when patient is admitted"""
@@ -351,14 +372,19 @@ def admit_patient(request):
         except ValueError:
             expected_dt = None
 
-        Admission.objects.create(
-            patient=patient,
-            hospital=hospital,
-            doctor=doctor,
-            appointment=appointment,
-            admission_time=timezone.now(),
-            expected_discharge_time=expected_dt
-        )
+        with transaction.atomic():
+            # Conditional UPDATE claims the bed, so concurrent admits cannot overbook
+            if not hospital.claim_bed():
+                messages.error(request, 'No beds available.')
+                return redirect('hospitals:admin_dashboard')
+            Admission.objects.create(
+                patient=patient,
+                hospital=hospital,
+                doctor=doctor,
+                appointment=appointment,
+                admission_time=timezone.now(),
+                expected_discharge_time=expected_dt
+            )
         messages.success(request, 'Patient admitted successfully.')
     return redirect('hospitals:admin_admissions')
 
@@ -378,13 +404,12 @@ def discharge_patient(request, pk):
 
     admission = get_object_or_404(Admission, pk=pk, hospital=hospital)
     if request.method == 'POST':
-        # Always use "now" in current timezone so bed becomes free
-        discharge_dt = timezone.now()
-        if discharge_dt < admission.admission_time:
-            discharge_dt = admission.admission_time
-
-        admission.discharge_time = discharge_dt
-        admission.save(update_fields=['discharge_time', 'updated_at'])
-        messages.success(request, 'Patient discharged successfully.')
+        # Always "now"; a concurrent discharge of the same admission frees the bed only once
+        with transaction.atomic():
+            discharged = admission.discharge()
+        if discharged:
+            messages.success(request, 'Patient discharged successfully.')
+        else:
+            messages.info(request, 'Patient was already discharged.')
 
     return redirect('hospitals:admin_admissions')
@@ -0,0 +1,29 @@
+from django import forms
+
+from .models import Hospital, parse_departments
+
+
+class HospitalProfileForm(forms.ModelForm):
+    """Hospital profile edit; departments are entered as comma-separated text"""
+    facilities = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 3}),
+        label='Departments (comma-separated)',
+        help_text='e.g. Emergency, Cardiology, General Medicine',
+    )
+
+    class Meta:
+        model = Hospital
+        fields = ['name', 'description', 'facilities', 'address', 'city', 'state', 'zip_code', 'phone', 'email', 'website', 'total_beds', 'logo']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance and self.instance.pk:
+            self.fields['facilities'].initial = self.instance.facilities
+
+    def clean_facilities(self):
+        return ', '.join(parse_departments(self.cleaned_data.get('facilities', '')))
+
+    def save(self, commit=True):
+        self.instance.facilities = self.cleaned_data.get('facilities', '')
+        return super().save(commit=commit)
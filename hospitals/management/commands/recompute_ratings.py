@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from hospitals.models import Hospital
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the stored review aggregates (rating_count, rating_sum and the 1-5 star '
+        'histogram) of every hospital from HospitalReview. Run after importing reviews or '
+        'changing reviews without signals (bulk_create, queryset update, raw SQL).'
+    )
+
+    def handle(self, *args, **options):
+        fixed = Hospital.recompute_ratings()
+        self.stdout.write(self.style.SUCCESS(f'Recomputed review ratings: {fixed} hospital(s) updated.'))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+
+from hospitals.models import Hospital, Admission
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute Hospital.occupied_beds from Admission intervals. Admissions with a '
+        'discharge time in the future free their bed without any request, so run this '
+        'periodically (cron) or with --interval.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running and reconcile every N seconds (0 = run once)')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            now = timezone.now()
+            fixed = Hospital.reconcile_occupied_beds(now=now)
+            self.stdout.write(self.style.SUCCESS(f'Reconciled bed occupancy: {fixed} hospital(s) updated.'))
+            next_discharge = Admission.objects.filter(discharge_time__gt=now).aggregate(t=Min('discharge_time'))['t']
+            if next_discharge:
+                self.stdout.write(f'Next scheduled discharge: {next_discharge:%Y-%m-%d %H:%M} UTC')
+            if interval <= 0:
+                return
+            time.sleep(interval)
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-17 10:03
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.utils import timezone
+
+
+def backfill_occupied_beds(apps, schema_editor):
+    Hospital = apps.get_model('hospitals', 'Hospital')
+    Admission = apps.get_model('hospitals', 'Admission')
+    now = timezone.now()
+    counts = Admission.objects.filter(admission_time__lte=now).filter(
+        Q(discharge_time__isnull=True) | Q(discharge_time__gt=now)
+    ).values('hospital').annotate(n=Count('id')).values_list('hospital', 'n')
+    for hospital_id, occupied in counts:
+        Hospital.objects.filter(pk=hospital_id).update(occupied_beds=occupied)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0006_doctorhospitalrequest_expected_monthly_salary_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hospital',
+            name='occupied_beds',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Maintained on admit/discharge; see reconcile_beds'),
+        ),
+        migrations.RunPython(backfill_occupied_beds, migrations.RunPython.noop),
+    ]
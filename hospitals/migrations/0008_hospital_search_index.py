@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-17 12:05
+
+import re
+
+from django.db import migrations, DatabaseError
+
+
+def _token(text):
+    return ''.join(re.findall(r'\w+', text.lower())).replace('_', '')
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the FTS5 table (SQLite only; skipped when FTS5 is not compiled in)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS hospital_search USING fts5("
+            "name, city, address, departments, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+    except DatabaseError:
+        return
+
+    Hospital = apps.get_model('hospitals', 'Hospital')
+    for hospital in Hospital.objects.all():
+        departments = {_token(d) for d in re.split(r'[,;\n]', hospital.facilities or '')}
+        schema_editor.execute(
+            "INSERT INTO hospital_search (rowid, name, city, address, departments) VALUES (%s, %s, %s, %s, %s)",
+            [
+                hospital.pk,
+                hospital.name or '',
+                hospital.city or '',
+                ' '.join(filter(None, [hospital.address, hospital.state, hospital.zip_code])),
+                ' '.join(sorted(d for d in departments if d)),
+            ],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS hospital_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0007_hospital_occupied_beds'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
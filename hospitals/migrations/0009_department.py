@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-17 13:40
+
+import re
+
+from django.db import migrations, models
+
+
+def facilities_to_departments(apps, schema_editor):
+    """Parse each hospital's comma-separated facilities text into Department rows"""
+    Hospital = apps.get_model('hospitals', 'Hospital')
+    Department = apps.get_model('hospitals', 'Department')
+    departments = {}
+    for hospital in Hospital.objects.exclude(facilities=''):
+        for part in re.split(r'[,;\n]', hospital.facilities):
+            name = ' '.join(part.split())[:100]
+            key = name.lower()
+            if not key:
+                continue
+            if key not in departments:
+                departments[key] = Department.objects.get_or_create(key=key, defaults={'name': name})[0]
+            hospital.departments.add(departments[key])
+
+
+def departments_to_facilities(apps, schema_editor):
+    Hospital = apps.get_model('hospitals', 'Hospital')
+    for hospital in Hospital.objects.prefetch_related('departments'):
+        hospital.facilities = ', '.join(d.name for d in hospital.departments.all())
+        hospital.save(update_fields=['facilities'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0008_hospital_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Department',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(help_text='Normalized lower-case name used for lookups', max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Department',
+                'verbose_name_plural': 'Departments',
+                'db_table': 'departments',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='departments',
+            field=models.ManyToManyField(blank=True, db_table='hospital_departments', related_name='hospitals', to='hospitals.department'),
+        ),
+        migrations.RunPython(facilities_to_departments, departments_to_facilities),
+        migrations.RemoveField(
+            model_name='hospital',
+            name='facilities',
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 6.0 on 2026-10-17 11:20
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Hospital = apps.get_model('hospitals', 'Hospital')
+    HospitalReview = apps.get_model('hospitals', 'HospitalReview')
+    rows = HospitalReview.objects.values('hospital').annotate(
+        n=Count('id'), total=Sum('rating'),
+        **{f'r{i}': Count('id', filter=Q(rating=i)) for i in range(1, 6)},
+    )
+    for row in rows:
+        Hospital.objects.filter(pk=row['hospital']).update(
+            rating_count=row['n'], rating_sum=row['total'] or 0,
+            **{f'rating_{i}': row[f'r{i}'] for i in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0009_department'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hospital',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
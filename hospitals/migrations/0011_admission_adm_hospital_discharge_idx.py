@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-17 11:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_appointment_appt_doctor_date_status_idx_and_more'),
+        ('hospitals', '0010_hospital_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='admission',
+            index=models.Index(fields=['hospital', 'discharge_time'], name='adm_hospital_discharge_idx'),
+        ),
+    ]
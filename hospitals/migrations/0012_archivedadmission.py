@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-17 18:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0011_admission_adm_hospital_discharge_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAdmission',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('appointment_id', models.BigIntegerField(blank=True, null=True)),
+                ('admission_time', models.DateTimeField()),
+                ('expected_discharge_time', models.DateTimeField(blank=True, null=True)),
+                ('discharge_time', models.DateTimeField()),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_admissions_attended', to=settings.AUTH_USER_MODEL)),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_admissions', to='hospitals.hospital')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_admissions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'admissions_archive',
+                'ordering': ['-admission_time'],
+                'indexes': [models.Index(fields=['hospital', 'admission_time'], name='adm_arch_hospital_time_idx')],
+            },
+        ),
+    ]
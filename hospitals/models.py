@@ -1,8 +1,76 @@
+import re
+
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
 
+def occupying_bed(now, hospital=None):
+    """Q for admissions not yet discharged at ``now``. The hospital condition is
+    repeated in each OR branch so SQLite searches adm_hospital_discharge_idx twice
+    (discharge_time IS NULL, discharge_time > now) instead of scanning the hospital."""
+    extra = {} if hospital is None else {'hospital': hospital}
+    return models.Q(discharge_time__isnull=True, **extra) | models.Q(discharge_time__gt=now, **extra)
+
+
+class HospitalQuerySet(models.QuerySet):
+    def with_bed_counts(self):
+        """Annotate ``available_now`` from the stored occupied_beds counter, the same number
+        Hospital.claim_bed checks, so bed filters, ordering and pagination run in SQL without
+        a per-row Admission query (reconcile_occupied_beds keeps the counter honest)."""
+        from django.db.models import Value
+        from django.db.models.functions import Greatest
+        return self.annotate(available_now=Greatest(models.F('total_beds') - models.F('occupied_beds'), Value(0)))
+
+    def with_available_beds(self):
+        """Only hospitals with at least one free bed right now"""
+        return self.with_bed_counts().filter(available_now__gt=0)
+
+    def with_rating(self):
+        """Annotate ``rating_avg`` from the stored review aggregates (0 without reviews)"""
+        from django.db.models import Case, FloatField, Value, When
+        return self.annotate(rating_avg=Case(
+            When(rating_count=0, then=Value(0.0)),
+            default=models.F('rating_sum') * 1.0 / models.F('rating_count'),
+            output_field=FloatField(),
+        ))
+
+    def order_by_rating(self):
+        """Best rated first; more reviews win ties"""
+        return self.with_rating().order_by('-rating_avg', '-rating_count', 'name')
+
+
+def parse_departments(text):
+    """Department names from comma-separated text (trimmed, de-duplicated case-insensitively)"""
+    names, seen = [], set()
+    for part in re.split(r'[,;\n]', text or ''):
+        part = ' '.join(part.split())[:100]
+        key = Department.normalize(part)
+        if key and key not in seen:
+            seen.add(key)
+            names.append(part)
+    return names
+
+
+class Department(models.Model):
+    """Hospital department (e.g. Cardiology), shared by all hospitals that offer it"""
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, unique=True, help_text="Normalized lower-case name used for lookups")
+
+    class Meta:
+        db_table = 'departments'
+        verbose_name = 'Department'
+        verbose_name_plural = 'Departments'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def normalize(name):
+        return ' '.join((name or '').lower().split())
+
+
 class Hospital(models.Model):
     """Hospital model"""
     
@@ -21,13 +89,24 @@ class Hospital(models.Model):
     email = models.EmailField(blank=True)
     website = models.URLField(blank=True)
     description = models.TextField(blank=True)
-    facilities = models.TextField(blank=True, help_text="Departments - comma separated")
+    departments = models.ManyToManyField(Department, related_name='hospitals', blank=True, db_table='hospital_departments')
     total_beds = models.PositiveIntegerField(default=0)
     available_beds = models.PositiveIntegerField(default=0)  # Kept for migration; use available_beds_count for dynamic
+    occupied_beds = models.PositiveIntegerField(default=0, editable=False, help_text="Maintained on admit/discharge; see reconcile_beds")
+    # Review aggregates, maintained by add_rating/remove_rating; see recompute_ratings
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
     logo = models.ImageField(upload_to='hospital_logos/', blank=True, null=True)
     verification_document = models.FileField(upload_to='hospital_verifications/', blank=True, null=True, help_text="Upload registration certificate or license for verification")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = HospitalQuerySet.as_manager()
     
     class Meta:
         db_table = 'hospitals'
@@ -38,6 +117,49 @@ class Hospital(models.Model):
     def __str__(self):
         return self.name
     
+    # Maintained by single-statement UPDATEs (claim_bed, release_beds, add_rating, remove_rating);
+    # a full save() of an instance loaded earlier would write back stale values over concurrent changes
+    COUNTER_FIELDS = (
+        'occupied_beds', 'rating_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+    )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # Counters are written only when listed in update_fields
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        pending = self.__dict__.pop('_pending_departments', None)
+        if pending is not None:
+            self.set_departments(pending)
+
+    def department_names(self):
+        """Department names (uses prefetch_related('departments') when available)"""
+        if self.pk is None:
+            return list(self.__dict__.get('_pending_departments') or [])
+        return [d.name for d in self.departments.all()]
+
+    def set_departments(self, names):
+        """Replace this hospital's departments, creating missing Department rows"""
+        by_key = {Department.normalize(n): n for n in names if Department.normalize(n)}
+        Department.objects.bulk_create(
+            [Department(name=name, key=key) for key, name in by_key.items()],
+            ignore_conflicts=True,
+        )
+        self.departments.set(Department.objects.filter(key__in=by_key))
+
+    @property
+    def facilities(self):
+        """Read-through compatibility: departments as the old comma-separated text"""
+        return ', '.join(self.department_names())
+
+    @facilities.setter
+    def facilities(self, value):
+        # Applied on save(); accepts the old comma-separated format
+        self.__dict__['_pending_departments'] = parse_departments(value)
+
     @property
     def total_doctors(self):
         """Get total number of doctors (from assignments + legacy single hospital)"""
@@ -57,20 +179,56 @@ class Hospital(models.Model):
 
     @property
     def occupied_beds_count(self):
-        """Count of beds occupied by active admissions: already started and not yet discharged.
-        Discharge automatically frees the bed (discharge_time set)."""
-        from django.db.models import Q
-        now = timezone.now()
-        return self.admissions.filter(
-            admission_time__lte=now
-        ).filter(
-            Q(discharge_time__isnull=True) | Q(discharge_time__gt=now)
-        ).count()
+        """Beds occupied by active admissions (stored counter, no query).
+        Updated in the same transaction as admit/discharge; the reconcile_beds
+        command recomputes it from Admission intervals."""
+        return self.occupied_beds
 
     @property
     def available_beds_count(self):
         """Dynamically calculated: total_beds - occupied (do not edit; set total_beds only)"""
-        return max(0, self.total_beds - self.occupied_beds_count)
+        return max(0, self.total_beds - self.occupied_beds)
+
+    def claim_bed(self):
+        """Atomically occupy one bed; returns False when the hospital is full.
+        Call inside the transaction that creates the Admission."""
+        claimed = Hospital.objects.filter(
+            pk=self.pk, occupied_beds__lt=models.F('total_beds')
+        ).update(occupied_beds=models.F('occupied_beds') + 1)
+        if claimed:
+            self.occupied_beds += 1
+        return bool(claimed)
+
+    def release_bed(self):
+        """Atomically free one bed (never below zero). Call inside the
+        transaction that discharges the Admission."""
+        Hospital.release_beds(self.pk)
+        self.occupied_beds = max(0, self.occupied_beds - 1)
+
+    @staticmethod
+    def release_beds(hospital_id, count=1):
+        """Atomically free ``count`` beds of a hospital by id (bulk discharges)"""
+        from django.db.models.functions import Greatest
+        Hospital.objects.filter(pk=hospital_id).update(
+            occupied_beds=Greatest(models.F('occupied_beds') - count, 0)
+        )
+
+    @classmethod
+    def reconcile_occupied_beds(cls, now=None):
+        """Recompute occupied_beds for every hospital from Admission intervals
+        (started and not yet discharged at ``now``). Returns number of hospitals fixed.
+
+        One UPDATE with a correlated count, so an admit or discharge committing meanwhile
+        is not overwritten by a value read before it."""
+        from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+        from django.db.models.functions import Coalesce
+        now = now or timezone.now()
+        occupied = Coalesce(Subquery(
+            Admission.objects.filter(occupying_bed(now, hospital=OuterRef('pk')), admission_time__lte=now)
+            .order_by().values('hospital').annotate(n=Count('pk')).values('n'),
+            output_field=IntegerField(),
+        ), Value(0))
+        return cls.objects.exclude(occupied_beds=occupied).update(occupied_beds=occupied)
 
     def get_available_beds_display(self):
         """For admin list_display (avoids property in admin)"""
@@ -80,10 +238,65 @@ class Hospital(models.Model):
 
     @property
     def average_rating(self):
-        """Calculate average rating from reviews"""
-        from django.db.models import Avg
-        result = self.reviews.aggregate(avg=Avg('rating'))
-        return round(result['avg'] or 0, 1)
+        """Average review rating from the stored aggregates (no query)"""
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 1)
+
+    @property
+    def rating_histogram(self):
+        """[(stars, count, percent), ...] from 5 stars down to 1"""
+        total = self.rating_count
+        return [
+            (stars, getattr(self, f'rating_{stars}'), round(100 * getattr(self, f'rating_{stars}') / total) if total else 0)
+            for stars in range(5, 0, -1)
+        ]
+
+    def _update_rating(self, rating, step):
+        # Single conditional UPDATE so concurrent reviews cannot lose increments
+        from django.db.models.functions import Greatest
+        if not 1 <= rating <= 5:
+            return
+        field = f'rating_{rating}'
+        Hospital.objects.filter(pk=self.pk).update(**{
+            'rating_count': Greatest(models.F('rating_count') + step, 0),
+            'rating_sum': Greatest(models.F('rating_sum') + step * rating, 0),
+            field: Greatest(models.F(field) + step, 0),
+        })
+        self.rating_count = max(0, self.rating_count + step)
+        self.rating_sum = max(0, self.rating_sum + step * rating)
+        setattr(self, field, max(0, getattr(self, field) + step))
+
+    def add_rating(self, rating):
+        """Count a new or edited review (see hospitals.signals)"""
+        self._update_rating(rating, 1)
+
+    def remove_rating(self, rating):
+        """Uncount a deleted or edited review (see hospitals.signals)"""
+        self._update_rating(rating, -1)
+
+    @classmethod
+    def recompute_ratings(cls):
+        """Recompute the stored review aggregates of every hospital from HospitalReview.
+        Returns number of hospitals fixed.
+
+        One UPDATE with correlated aggregates, so a review counted meanwhile is not
+        overwritten by a value read before it."""
+        from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+        from django.db.models.functions import Coalesce
+
+        def aggregate(expression, **filters):
+            reviews = HospitalReview.objects.filter(hospital=OuterRef('pk'), **filters).order_by()
+            return Coalesce(Subquery(
+                reviews.values('hospital').annotate(v=expression).values('v'), output_field=IntegerField(),
+            ), Value(0))
+
+        values = {
+            'rating_count': aggregate(Count('pk')),
+            'rating_sum': aggregate(Sum('rating')),
+            **{f'rating_{i}': aggregate(Count('pk'), rating=i) for i in range(1, 6)},
+        }
+        return cls.objects.exclude(**values).update(**values)
 
 
 class HospitalReview(models.Model):
@@ -211,10 +424,33 @@ class Admission(models.Model):
         verbose_name = 'Admission'
         verbose_name_plural = 'Admissions'
         ordering = ['-admission_time']
+        indexes = [
+            # Bed occupancy: admissions of a hospital not yet discharged at a given time
+            # (discharge_time IS NULL OR discharge_time > now, one index range per branch)
+            models.Index(fields=['hospital', 'discharge_time'], name='adm_hospital_discharge_idx'),
+        ]
 
     def __str__(self):
         return f"{self.patient} at {self.hospital} from {self.admission_time}"
 
+    def discharge(self, when=None):
+        """Discharge at ``when`` (default now, never before admission_time) and free the
+        bed if the stay had started; returns False if it was already discharged.
+        A guarded UPDATE like Hospital.claim_bed, so of two concurrent discharges (or a
+        discharge racing Appointment.expire_overdue) only one frees the bed. Call inside
+        a transaction."""
+        now = timezone.now()
+        when = max(when or now, self.admission_time)
+        discharged = Admission.objects.filter(occupying_bed(now), pk=self.pk).update(
+            discharge_time=when, updated_at=now,
+        )
+        if not discharged:
+            return False
+        self.discharge_time = when
+        if self.admission_time <= now:
+            Hospital.release_beds(self.hospital_id)
+        return True
+
     @property
     def is_active(self):
         """Admission is active if not yet discharged or discharge is in future"""
@@ -229,3 +465,45 @@ class Admission(models.Model):
             return None
         delta = self.discharge_time - self.admission_time
         return round(delta.total_seconds() / 3600, 1)
+
+    @classmethod
+    def archive_old(cls, today=None, batch_size=500):
+        """Move admissions discharged before the archive horizon to ArchivedAdmission;
+        returns the number moved"""
+        from healthcare import cache
+        from healthcare.archive import horizon_datetime, move_to_archive
+        old = cls.objects.filter(discharge_time__lt=horizon_datetime(today))
+        return move_to_archive(old, ArchivedAdmission, batch_size, owner=(cache.ARCHIVED_ADMISSIONS, 'hospital_id'))
+
+
+class ArchivedAdmission(models.Model):
+    """An Admission discharged more than ARCHIVE_AFTER_DAYS ago, moved out of the live table
+    with its id (healthcare/archive.py). Read-only; always discharged."""
+
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_admissions')
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='archived_admissions')
+    doctor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_admissions_attended')
+    # Live or archived appointment id
+    appointment_id = models.BigIntegerField(null=True, blank=True)
+    admission_time = models.DateTimeField()
+    expected_discharge_time = models.DateTimeField(null=True, blank=True)
+    discharge_time = models.DateTimeField()
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    is_active = False
+
+    class Meta:
+        db_table = 'admissions_archive'
+        ordering = ['-admission_time']
+        indexes = [
+            models.Index(fields=['hospital', 'admission_time'], name='adm_arch_hospital_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient} at {self.hospital} from {self.admission_time} (archived)"
+
+    duration_of_stay = Admission.duration_of_stay
@@ -0,0 +1,92 @@
+"""Full-text hospital search backed by an SQLite FTS5 table.
+
+``hospital_search`` holds one row per Hospital (rowid = hospital id) with its
+name, city, address and departments. Each department is indexed as a single
+token (see healthcare.fts.phrase_token), so a "Cardiology" department search
+matches "Cardiology" but not "Pediatric Cardiology Lab", while prefix queries
+still work while typing. Rows are refreshed by hospitals.signals whenever a
+Hospital or its departments are saved (e.g. HospitalProfileEditView.form_valid).
+"""
+from django.db import connection, transaction
+
+from healthcare.fts import build_match, phrase_token, ranked, table_exists
+
+TABLE = 'hospital_search'
+# bm25 column weights: name, city, address, departments
+RANK_WEIGHTS = (10.0, 5.0, 1.0, 3.0)
+
+
+def is_enabled():
+    return table_exists(TABLE)
+
+
+def document_for(hospital):
+    """Indexed column values for one Hospital"""
+    return (
+        hospital.name or '',
+        hospital.city or '',
+        ' '.join(filter(None, [hospital.address, hospital.state, hospital.zip_code])),
+        ' '.join(phrase_token(d) for d in hospital.department_names()),
+    )
+
+
+def index_hospital(hospital):
+    """Insert or replace the search row for a Hospital"""
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [hospital.pk])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, name, city, address, departments) VALUES (%s, %s, %s, %s, %s)',
+            [hospital.pk, *document_for(hospital)],
+        )
+
+
+def remove_hospital(hospital_id):
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [hospital_id])
+
+
+def rebuild_index():
+    """Re-index every hospital in one transaction; returns the number of rows written"""
+    from .models import Hospital
+    if not is_enabled():
+        return 0
+    rows = [
+        (hospital.pk, *document_for(hospital))
+        for hospital in Hospital.objects.prefetch_related('departments').iterator(chunk_size=2000)
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, name, city, address, departments) VALUES (%s, %s, %s, %s, %s)',
+            rows,
+        )
+    return len(rows)
+
+
+def department_match(department):
+    token = phrase_token(department)
+    return f'departments : "{token}"*' if token else ''
+
+
+def search_hospitals(queryset, q='', city=''):
+    """``queryset`` of Hospitals limited to those matching the query and city, annotated with
+    ``search_rank`` (order by it for best match first); None if FTS is unavailable.
+    The department filter is an indexed join on Department (see HospitalSearchView)."""
+    if not is_enabled():
+        return None
+    clauses = []
+    if build_match(q):
+        # Free text: name/city/address words, or the start of a department name
+        words = f'{{name city address}} : ({build_match(q)})'
+        dept = department_match(q)
+        clauses.append(f'({words}) OR ({dept})' if dept else words)
+    if build_match(city):
+        clauses.append(build_match(city, column='city'))
+    if not clauses:
+        return None
+    match = ' AND '.join(f'({c})' for c in clauses)
+    return ranked(queryset, TABLE, match, RANK_WEIGHTS)
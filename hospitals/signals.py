@@ -0,0 +1,91 @@
+"""Keep the hospital full-text search index (hospitals.search), review aggregates and
+the cached detail page read models (healthcare.cache) in sync"""
+from django.conf import settings
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from healthcare import cache
+from . import search
+from .models import Hospital, HospitalReview
+
+
+@receiver(post_save, sender=Hospital)
+def hospital_saved(sender, instance, **kwargs):
+    search.index_hospital(instance)
+
+
+@receiver(post_delete, sender=Hospital)
+def hospital_deleted(sender, instance, **kwargs):
+    search.remove_hospital(instance.pk)
+
+
+@receiver(m2m_changed, sender=Hospital.departments.through)
+def hospital_departments_changed(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear') or reverse:
+        return
+    search.index_hospital(instance)
+
+
+@receiver(pre_save, sender=HospitalReview)
+def hospital_review_pre_save(sender, instance, **kwargs):
+    # An edited review (admin) is uncounted with the rating and hospital it had
+    instance._previous_rating = (
+        HospitalReview.objects.filter(pk=instance.pk).values_list('hospital_id', 'rating').first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=HospitalReview)
+def hospital_review_saved(sender, instance, created=False, **kwargs):
+    # Every save path (submit_review, admin) keeps the stored aggregates in step
+    previous = None if created else getattr(instance, '_previous_rating', None)
+    if previous == (instance.hospital_id, instance.rating):
+        return
+    if previous:
+        Hospital(pk=previous[0]).remove_rating(previous[1])
+    Hospital(pk=instance.hospital_id).add_rating(instance.rating)
+
+
+@receiver(post_delete, sender=HospitalReview)
+def hospital_review_deleted(sender, instance, **kwargs):
+    # Deletions (admin, cascades) uncount here
+    Hospital(pk=instance.hospital_id).remove_rating(instance.rating)
+
+
+# Detail page read models: a hospital's page lists its doctors and latest reviews;
+# a doctor's page lists the names of their hospitals
+
+@receiver(post_save, sender=Hospital)
+def hospital_saved_cache(sender, instance, created=False, update_fields=None, **kwargs):
+    cache.invalidate(cache.HOSPITAL, instance.pk)
+    if created or (update_fields and 'name' not in update_fields):
+        return
+    cache.invalidate(cache.DOCTOR, *instance.get_doctors().values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Hospital)
+def hospital_pre_delete(sender, instance, **kwargs):
+    # Doctors' legacy FK is cleared with an UPDATE (no signals); remember them now
+    instance._doctor_ids = list(instance.get_doctors().values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Hospital)
+def hospital_deleted_cache(sender, instance, **kwargs):
+    cache.invalidate(cache.HOSPITAL, instance.pk)
+    cache.invalidate(cache.DOCTOR, *getattr(instance, '_doctor_ids', ()))
+
+
+@receiver(post_save, sender=HospitalReview)
+@receiver(post_delete, sender=HospitalReview)
+def hospital_review_changed(sender, instance, **kwargs):
+    cache.invalidate(cache.HOSPITAL, instance.hospital_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reviewer_renamed(sender, instance, created=False, update_fields=None, **kwargs):
+    # Reviews show the patient's name
+    if created or instance.role != 'PATIENT':
+        return
+    if update_fields and not {'first_name', 'last_name', 'username'} & set(update_fields):
+        return
+    cache.invalidate(cache.HOSPITAL, *HospitalReview.objects.filter(patient=instance).values_list('hospital_id', flat=True))
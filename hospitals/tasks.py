@@ -0,0 +1,11 @@
+from datetime import timedelta
+
+from taskqueue.queue import task
+
+from .models import Hospital
+
+
+@task(every=timedelta(minutes=5))
+def reconcile_beds():
+    """Free beds of admissions whose discharge time has passed (see reconcile_beds command)"""
+    return Hospital.reconcile_occupied_beds()
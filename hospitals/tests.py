@@ -1,3 +1,499 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from doctors.models import DoctorProfile
+from appointments.models import Appointment
+from .models import Hospital, Admission, ArchivedAdmission, Department, HospitalReview
+from healthcare.query_budgets import QueryBudgetTestCase
+
+
+class BedOccupancyCounterTests(TestCase):
+    """occupied_beds is kept in step with admissions and can be reconciled."""
+
+    def setUp(self):
+        self.client = Client()
+        self.hosp_user = User.objects.create_user(
+            username='h', email='h@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        self.hospital = Hospital.objects.create(
+            name='H', registration_number='REG1', user=self.hosp_user, total_beds=1,
+        )
+        self.doctor_user = User.objects.create_user(
+            username='doc', email='doc@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+        DoctorProfile.objects.create(
+            user=self.doctor_user, license_number='L1', qualification='MBBS',
+            specialization='GENERAL', hospital=self.hospital,
+        )
+        self.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+
+    def test_admit_and_discharge_update_counter(self):
+        self.client.force_login(self.hosp_user)
+        self.client.post(reverse('hospitals:admin_admit_patient'), {'patient_id': self.patient.pk})
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.occupied_beds, 1)
+        self.assertEqual(self.hospital.available_beds_count, 0)
+
+        # Hospital is full: a second admission is refused
+        self.client.post(reverse('hospitals:admin_admit_patient'), {'patient_id': self.patient.pk})
+        self.assertEqual(Admission.objects.count(), 1)
+
+        admission = Admission.objects.get()
+        self.client.post(reverse('hospitals:admin_discharge_patient', kwargs={'pk': admission.pk}))
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.occupied_beds, 0)
+
+        # Discharging again does not free a second bed
+        self.client.post(reverse('hospitals:admin_discharge_patient', kwargs={'pk': admission.pk}))
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.occupied_beds, 0)
+
+    def test_stale_full_save_keeps_bed_counter(self):
+        # Profile form / admin edit of an instance loaded before an admission
+        stale = Hospital.objects.get(pk=self.hospital.pk)
+        self.assertTrue(Hospital.objects.get(pk=self.hospital.pk).claim_bed())
+        stale.name = 'Renamed'
+        stale.save()
+        self.hospital.refresh_from_db()
+        self.assertEqual((self.hospital.name, self.hospital.occupied_beds), ('Renamed', 1))
+        self.assertFalse(stale.claim_bed())
+
+    def test_concurrent_discharges_free_one_bed(self):
+        Hospital.objects.filter(pk=self.hospital.pk).update(total_beds=2, occupied_beds=2)
+        admission = Admission.objects.create(
+            patient=self.patient, hospital=self.hospital, admission_time=timezone.now() - timedelta(hours=1),
+        )
+        # Both requests loaded the admission while it was still open
+        first, second = Admission.objects.get(pk=admission.pk), Admission.objects.get(pk=admission.pk)
+        self.assertTrue(first.discharge())
+        self.assertFalse(second.discharge())
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.occupied_beds, 1)
+
+    def test_emergency_booking_and_cancel_update_counter(self):
+        self.client.force_login(self.patient)
+        self.client.post(reverse('appointments:confirm_emergency'), {'hospital_id': self.hospital.pk})
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.occupied_beds, 1)
+
+        apt = Appointment.objects.get(patient=self.patient, is_emergency=True)
+        self.client.post(reverse('appointments:cancel', kwargs={'pk': apt.pk}))
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.occupied_beds, 0)
+
+    def test_available_beds_count_needs_no_query(self):
+        hospital = Hospital.objects.get(pk=self.hospital.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(hospital.available_beds_count, 1)
+
+    def test_reconcile_frees_beds_after_scheduled_discharge(self):
+        now = timezone.now()
+        Admission.objects.create(
+            patient=self.patient, hospital=self.hospital,
+            admission_time=now - timedelta(days=2), discharge_time=now + timedelta(hours=1),
+        )
+        call_command('reconcile_beds', stdout=StringIO())
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.occupied_beds, 1)
+
+        # Once the scheduled discharge has passed the bed is free again; one UPDATE, no
+        # read-then-write window for concurrent admissions
+        with self.assertNumQueries(1):
+            self.assertEqual(Hospital.reconcile_occupied_beds(now=now + timedelta(hours=2)), 1)
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.occupied_beds, 0)
+        self.assertEqual(Hospital.reconcile_occupied_beds(now=now + timedelta(hours=2)), 0)
+
+
+class HospitalBedQuerySetTests(TestCase):
+    """Bed availability is annotated in SQL so the emergency list paginates in the database."""
+
+    def setUp(self):
+        self.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        now = timezone.now()
+        self.hospitals = []
+        for i in range(15):
+            user = User.objects.create_user(
+                username=f'h{i}', email=f'h{i}@test.com', password='pass', role='HOSPITAL', is_approved=True,
+            )
+            self.hospitals.append(Hospital.objects.create(
+                name=f'Hospital {i:02d}', registration_number=f'REG{i}', user=user, total_beds=1,
+            ))
+        # Full hospital: one active admission
+        Admission.objects.create(patient=self.patient, hospital=self.hospitals[0], admission_time=now - timedelta(hours=1))
+        # Scheduled discharge already passed: bed is free again
+        Admission.objects.create(
+            patient=self.patient, hospital=self.hospitals[1],
+            admission_time=now - timedelta(days=1), discharge_time=now - timedelta(minutes=5),
+        )
+        Hospital.reconcile_occupied_beds()
+
+    def test_with_bed_counts(self):
+        counts = {h.pk: h.available_now for h in Hospital.objects.with_bed_counts()}
+        self.assertEqual(counts[self.hospitals[0].pk], 0)
+        self.assertEqual(counts[self.hospitals[1].pk], 1)
+        names = list(Hospital.objects.with_available_beds().values_list('name', flat=True))
+        self.assertNotIn('Hospital 00', names)
+        self.assertEqual(len(names), 14)
+
+    def test_list_agrees_with_claim_bed(self):
+        # The list reads the counter claim_bed checks, not Admission rows
+        Hospital.objects.filter(pk=self.hospitals[2].pk).update(occupied_beds=1)
+        names = set(Hospital.objects.with_available_beds().values_list('name', flat=True))
+        self.assertNotIn('Hospital 02', names)
+        self.assertFalse(Hospital.objects.get(pk=self.hospitals[2].pk).claim_bed())
+        self.assertIn('Hospital 03', names)
+        self.assertTrue(Hospital.objects.get(pk=self.hospitals[3].pk).claim_bed())
+
+    def test_emergency_list_paginates_in_sql(self):
+        self.client.force_login(self.patient)
+        # session + user + COUNT + one page of rows
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('appointments:emergency_booking'))
+        page = response.context['hospitals']
+        self.assertEqual(page.paginator.count, 14)
+        self.assertEqual(len(page.object_list), 10)
+        self.assertEqual(page.object_list[0].name, 'Hospital 01')
+
+
+class HospitalFullTextSearchTests(TestCase):
+    """Hospital search index: tokenized departments, prefix matching, incremental refresh."""
+
+    def setUp(self):
+        self.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        self.hosp_user = User.objects.create_user(
+            username='h1', email='h1@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        self.city_hospital = Hospital.objects.create(
+            name='City Care Hospital', registration_number='REG1', user=self.hosp_user,
+            city='Ahmedabad', facilities='Emergency, Cardiology, General Medicine',
+        )
+        other = User.objects.create_user(
+            username='h2', email='h2@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        self.kids_hospital = Hospital.objects.create(
+            name='Little Stars Children Hospital', registration_number='REG2', user=other,
+            city='Surat', facilities='Pediatrics, Pediatric Cardiology Lab',
+        )
+
+    def _search(self, **params):
+        self.client.force_login(self.patient)
+        response = self.client.get(reverse('hospitals:hospital_search'), params)
+        return [h.pk for h in response.context['hospitals']]
+
+    def test_department_matches_whole_department(self):
+        self.assertEqual(self._search(department='Cardiology'), [self.city_hospital.pk])
+        self.assertEqual(self._search(department='pediatric card'), [self.kids_hospital.pk])
+        self.assertEqual(self._search(department='general med'), [self.city_hospital.pk])
+
+    def test_prefix_search_on_name_and_city(self):
+        self.assertEqual(self._search(q='littl'), [self.kids_hospital.pk])
+        self.assertEqual(self._search(city='ahmed'), [self.city_hospital.pk])
+        self.assertEqual(self._search(q='emergency', city='ahmedabad'), [self.city_hospital.pk])
+
+    def test_department_filter_and_pagination_cover_every_match(self):
+        # Better-ranked matches outside the department must not crowd out the ones in it
+        for i in range(12):
+            user = User.objects.create_user(
+                username=f'hc{i}', email=f'hc{i}@test.com', password='pass', role='HOSPITAL', is_approved=True,
+            )
+            Hospital.objects.create(
+                name=f'Care Care {i:02d}', registration_number=f'RC{i}', user=user, city='Ahmedabad',
+                facilities='Oncology' if i < 6 else 'Cardiology',
+            )
+        self.client.force_login(self.patient)
+        response = self.client.get(reverse('hospitals:hospital_search'), {'q': 'care', 'department': 'cardiology'})
+        self.assertEqual(response.context['paginator'].count, 7)
+        self.assertEqual(response.context['hospitals'][6].pk, self.city_hospital.pk)
+        response = self.client.get(reverse('hospitals:hospital_search'), {'q': 'care', 'page': 2})
+        self.assertEqual(response.context['paginator'].count, 13)
+        self.assertEqual(len(response.context['hospitals']), 3)
+
+    def test_profile_edit_refreshes_index(self):
+        self.client.force_login(self.hosp_user)
+        self.client.post(reverse('hospitals:admin_profile'), {
+            'name': 'City Care Hospital', 'facilities': 'Emergency, Oncology', 'city': 'Ahmedabad',
+            'total_beds': 10, 'admin_phone': '',
+        })
+        self.assertEqual(self._search(department='oncology'), [self.city_hospital.pk])
+        self.assertEqual(self._search(department='cardiology'), [])
+
+
+class DepartmentModelTests(TestCase):
+    """Departments are shared rows; Hospital.facilities reads and writes through them."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='h', email='h@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        self.other_user = User.objects.create_user(
+            username='h2', email='h2@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+
+    def test_facilities_round_trip_and_shared_rows(self):
+        a = Hospital.objects.create(
+            name='A', registration_number='REG1', user=self.user,
+            facilities='Emergency,  cardiology , Emergency,,',
+        )
+        b = Hospital.objects.create(
+            name='B', registration_number='REG2', user=self.other_user, facilities='CARDIOLOGY',
+        )
+        a = Hospital.objects.get(pk=a.pk)
+        self.assertCountEqual(a.department_names(), ['cardiology', 'Emergency'])
+        self.assertCountEqual(a.facilities.split(', '), ['cardiology', 'Emergency'])
+        # Same department (case-insensitive) is one row shared by both hospitals
+        self.assertEqual(Department.objects.count(), 2)
+        self.assertEqual(set(b.departments.values_list('key', flat=True)), {'cardiology'})
+
+    def test_department_filter_uses_join(self):
+        hospital = Hospital.objects.create(
+            name='A', registration_number='REG1', user=self.user, facilities='Oncology',
+        )
+        department = Department.objects.get(key='oncology')
+        self.assertEqual(list(department.hospitals.all()), [hospital])
+        self.assertFalse(Hospital.objects.filter(departments__key='cardiology').exists())
+
+
+class HospitalRatingAggregateTests(TestCase):
+    """Review count/sum/histogram are stored on Hospital and read without queries."""
+
+    def setUp(self):
+        self.hospitals = []
+        for i in range(3):
+            user = User.objects.create_user(
+                username=f'h{i}', email=f'h{i}@test.com', password='pass', role='HOSPITAL', is_approved=True,
+            )
+            self.hospitals.append(Hospital.objects.create(name=f'Hospital {i}', registration_number=f'REG{i}', user=user))
+        self.patients = [
+            User.objects.create_user(
+                username=f'pat{i}', email=f'pat{i}@test.com', password='pass', role='PATIENT', is_approved=True,
+            )
+            for i in range(2)
+        ]
+        self.doctor_user = User.objects.create_user(
+            username='doc', email='doc@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+
+    def _review(self, patient, hospital, rating):
+        Appointment.objects.create(
+            patient=patient, doctor=self.doctor_user, hospital=hospital,
+            appointment_date=timezone.now().date(), appointment_time='10:00', status='COMPLETED',
+        )
+        self.client.force_login(patient)
+        self.client.post(reverse('hospitals:submit_review', kwargs={'pk': hospital.pk}), {'rating': rating})
+
+    def test_submit_review_updates_aggregates(self):
+        hospital = self.hospitals[0]
+        self._review(self.patients[0], hospital, 5)
+        self._review(self.patients[1], hospital, 2)
+        hospital.refresh_from_db()
+        self.assertEqual((hospital.rating_count, hospital.rating_sum), (2, 7))
+        with self.assertNumQueries(0):
+            self.assertEqual(hospital.average_rating, 3.5)
+            self.assertEqual(hospital.rating_histogram[0], (5, 1, 50))
+            self.assertEqual(hospital.rating_histogram[3], (2, 1, 50))
+
+        HospitalReview.objects.filter(patient=self.patients[1]).delete()
+        hospital.refresh_from_db()
+        self.assertEqual((hospital.rating_count, hospital.rating_sum, hospital.rating_2), (1, 5, 0))
+
+    def test_sort_by_rating_in_sql(self):
+        self._review(self.patients[0], self.hospitals[1], 4)
+        self._review(self.patients[0], self.hospitals[2], 5)
+        self._review(self.patients[1], self.hospitals[2], 3)
+        self._review(self.patients[1], self.hospitals[1], 4)
+        names = list(Hospital.objects.order_by_rating().values_list('name', flat=True))
+        self.assertEqual(names, ['Hospital 1', 'Hospital 2', 'Hospital 0'])
+
+        self.client.force_login(self.patients[0])
+        response = self.client.get(reverse('hospitals:hospital_search'), {'sort': 'rating'})
+        self.assertEqual([h.name for h in response.context['hospitals']], names)
+
+    def test_review_created_outside_submit_review_is_counted(self):
+        # As the admin does: a plain save of a new review
+        hospital = self.hospitals[0]
+        HospitalReview.objects.create(hospital=hospital, patient=self.patients[0], rating=4)
+        hospital.refresh_from_db()
+        self.assertEqual((hospital.rating_count, hospital.rating_sum, hospital.rating_4), (1, 4, 1))
+
+    def test_edited_review_moves_its_rating(self):
+        hospital, other = self.hospitals[0], self.hospitals[1]
+        self._review(self.patients[0], hospital, 5)
+        review = HospitalReview.objects.get(patient=self.patients[0])
+        review.rating = 2
+        review.save()
+        hospital.refresh_from_db()
+        self.assertEqual((hospital.rating_count, hospital.rating_sum, hospital.rating_5, hospital.rating_2), (1, 2, 0, 1))
+
+        review.comment = 'Edited'
+        review.save()
+        review.hospital = other
+        review.save()
+        hospital.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((hospital.rating_count, hospital.rating_sum), (0, 0))
+        self.assertEqual((other.rating_count, other.rating_sum, other.rating_2), (1, 2, 1))
+        self.assertEqual(Hospital.recompute_ratings(), 0)
+
+    def test_recompute_ratings_command(self):
+        hospital = self.hospitals[0]
+        # bulk_create sends no signals, so the aggregates drift
+        HospitalReview.objects.bulk_create([
+            HospitalReview(hospital=hospital, patient=self.patients[0], rating=4),
+            HospitalReview(hospital=hospital, patient=self.patients[1], rating=1),
+        ])
+        hospital.refresh_from_db()
+        self.assertEqual(hospital.rating_count, 0)
+
+        call_command('recompute_ratings', stdout=StringIO())
+        hospital.refresh_from_db()
+        self.assertEqual((hospital.rating_count, hospital.rating_sum, hospital.rating_4, hospital.rating_1), (2, 5, 1, 1))
+
+        # A profile edit of an instance loaded before a new review keeps the aggregates
+        stale = Hospital.objects.get(pk=hospital.pk)
+        third = User.objects.create_user(username='p3', email='p3@test.com', password='pass', role='PATIENT')
+        HospitalReview.objects.create(hospital=hospital, patient=third, rating=5)
+        stale.name = 'Renamed'
+        stale.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(Hospital.recompute_ratings(), 0)
+        HospitalReview.objects.filter(patient=third).delete()
+        hospital.refresh_from_db()
+        self.assertEqual((hospital.rating_count, hospital.rating_sum, hospital.rating_4, hospital.rating_1), (2, 5, 1, 1))
+        self.assertEqual(Hospital.recompute_ratings(), 0)
+
+
+class AdmissionListPaginationTests(TestCase):
+    """Admission history uses keyset pagination with a bounded total."""
+
+    def setUp(self):
+        self.hosp_user = User.objects.create_user(
+            username='h', email='h@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        self.hospital = Hospital.objects.create(name='H', registration_number='REG1', user=self.hosp_user)
+        patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        doctor = User.objects.create_user(
+            username='doc', email='doc@test.com', password='pass', role='DOCTOR', is_approved=True,
+        )
+        admitted = timezone.now() - timedelta(days=30)
+        for i in range(20):
+            Admission.objects.create(
+                patient=patient, doctor=doctor, hospital=self.hospital,
+                admission_time=admitted + timedelta(hours=i), discharge_time=admitted + timedelta(hours=i + 1),
+            )
+
+    def test_pages_and_total(self):
+        self.client.force_login(self.hosp_user)
+        response = self.client.get(reverse('hospitals:admin_admissions'))
+        page = response.context['page_obj']
+        self.assertEqual((page.total, page.total_is_approximate), (20, False))
+        first = [a.pk for a in page]
+        response = self.client.get(reverse('hospitals:admin_admissions') + '?' + page.next_query)
+        second = [a.pk for a in response.context['page_obj']]
+        self.assertEqual(len(first), 15)
+        self.assertEqual(len(second), 5)
+        expected = list(Admission.objects.order_by('-admission_time', '-id').values_list('pk', flat=True))
+        self.assertEqual(first + second, expected)
+        self.assertContains(response, '20 total')
+
+    def test_archived_admissions_follow_live_ones(self):
+        with self.settings(ARCHIVE_AFTER_DAYS=20):
+            self.assertEqual(Admission.archive_old(batch_size=7), 20)
+            recent = timezone.now() - timedelta(days=1)
+            patient, doctor = User.objects.get(username='pat'), User.objects.get(username='doc')
+            live = [
+                Admission.objects.create(
+                    patient=patient, doctor=doctor, hospital=self.hospital, admission_time=recent + timedelta(minutes=i), discharge_time=recent + timedelta(hours=1),
+                ).pk for i in range(5)
+            ]
+            self.client.force_login(self.hosp_user)
+            response = self.client.get(reverse('hospitals:admin_admissions'))
+            page = response.context['page_obj']
+            self.assertEqual(page.total, 25)
+            archived = list(ArchivedAdmission.objects.order_by('-admission_time', '-id').values_list('pk', flat=True))
+            self.assertEqual([a.pk for a in page], live[::-1] + archived[:10])
+            self.assertContains(response, 'Discharged')
+            response = self.client.get(reverse('hospitals:admin_admissions') + '?' + page.next_query)
+            self.assertEqual([a.pk for a in response.context['page_obj']], archived[10:])
+
+
+class HospitalsQueryBudgetTests(QueryBudgetTestCase):
+    """Every hospitals page stays within its query budget and does not scale with the data"""
+    namespace = 'hospitals'
+
+    def test_routes_within_budget(self):
+        self.check_budgets()
+
+
+class HospitalDetailCacheTests(TestCase):
+    """Doctor list and reviews of the hospital detail page are cached until a signal retires them."""
+
+    def setUp(self):
+        hospital_user = User.objects.create_user(
+            username='hosp', email='hosp@test.com', password='pass', role='HOSPITAL', is_approved=True,
+        )
+        self.hospital = Hospital.objects.create(user=hospital_user, name='City Hospital', registration_number='R1')
+        self.doctor_user = User.objects.create_user(
+            username='doc', email='doc@test.com', password='pass', role='DOCTOR', is_approved=True,
+            first_name='Asha',
+        )
+        self.profile = DoctorProfile.objects.create(
+            user=self.doctor_user, license_number='L1', qualification='MBBS', hospital=self.hospital,
+        )
+        self.patient = User.objects.create_user(
+            username='pat', email='pat@test.com', password='pass', role='PATIENT', is_approved=True,
+        )
+        self.client.force_login(self.patient)
+        self.url = reverse('hospitals:hospital_detail', kwargs={'pk': self.hospital.pk})
+
+    def doctor_names(self):
+        return [item['doctor'].user.first_name for item in self.client.get(self.url).context['doctors']]
+
+    def test_repeat_view_is_served_from_cache(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(self.url)
+        self.assertLess(len(warm), len(cold))
+
+    def test_doctor_and_review_changes_invalidate(self):
+        self.assertEqual(self.doctor_names(), ['Asha'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor_user.first_name = 'Asha R.'
+            self.doctor_user.save()
+        self.assertEqual(self.doctor_names(), ['Asha R.'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor_user.is_approved = False
+            self.doctor_user.save(update_fields=['is_approved'])
+        self.assertEqual(self.doctor_names(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            HospitalReview.objects.create(hospital=self.hospital, patient=self.patient, rating=4, comment='Good')
+        reviews = self.client.get(self.url).context['reviews']
+        self.assertEqual([r.comment for r in reviews], ['Good'])
+
+    def test_doctor_moving_hospital_leaves_old_page(self):
+        self.assertEqual(self.doctor_names(), ['Asha'])
+        self.profile.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.hospital = None
+            self.profile.save()
+        self.assertEqual(self.doctor_names(), [])
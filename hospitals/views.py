@@ -1,28 +1,47 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, DetailView
-from django.db.models import Q
+from django.db.models import Q, Exists, OuterRef
+from django.db import transaction
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils import timezone
 
-from .models import Hospital, HospitalReview
+from .models import Hospital, HospitalReview, Department
+from . import search
+from healthcare import cache
 from accounts.mixins import PatientRequiredMixin
 from appointments.models import Appointment
 
 
 class HospitalSearchView(LoginRequiredMixin, ListView):
-    """Search hospitals by name, city, or department (facilities)"""
+    """Search hospitals by name, city, or department"""
     model = Hospital
     template_name = 'hospitals/hospital_search.html'
     context_object_name = 'hospitals'
     paginate_by = 10
 
     def get_queryset(self):
-        qs = Hospital.objects.select_related('user').all()
+        qs = Hospital.objects.select_related('user').prefetch_related('departments')
         q = self.request.GET.get('q', '').strip()
         city = self.request.GET.get('city', '').strip()
         department = self.request.GET.get('department', '').strip()
+        sort = self.request.GET.get('sort', '')
 
+        if department:
+            # Indexed join on the normalized department key (exact name or its prefix)
+            key = Department.normalize(department)
+            qs = qs.filter(Exists(Hospital.departments.through.objects.filter(
+                hospital=OuterRef('pk'), department__key__gte=key, department__key__lt=key + '\uffff',
+            )))
+
+        # Ranked full-text search on name, city, address (and department names)
+        ranked = search.search_hospitals(qs, q, city) if (q or city) else None
+        if ranked is not None:
+            if sort == 'rating':
+                return ranked.order_by_rating()
+            return ranked.order_by('search_rank', 'name')
+
+        # Fallback for databases without FTS
         if q:
             qs = qs.filter(
                 Q(name__icontains=q) |
@@ -31,9 +50,9 @@ class HospitalSearchView(LoginRequiredMixin, ListView):
             )
         if city:
             qs = qs.filter(city__icontains=city)
-        if department:
-            qs = qs.filter(facilities__icontains=department)
 
+        if sort == 'rating':
+            return qs.order_by_rating()
         return qs.order_by('name')
 
     def get_context_data(self, **kwargs):
@@ -41,6 +60,7 @@ class HospitalSearchView(LoginRequiredMixin, ListView):
         context['search_q'] = self.request.GET.get('q', '')
         context['search_city'] = self.request.GET.get('city', '')
         context['search_department'] = self.request.GET.get('department', '')
+        context['search_sort'] = self.request.GET.get('sort', '')
         return context
 
 
@@ -51,29 +71,15 @@ class HospitalDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'hospital'
 
     def get_queryset(self):
-        return Hospital.objects.select_related('user').prefetch_related('reviews__patient')
+        return Hospital.objects.select_related('user').prefetch_related('departments')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         hospital = self.object
-        doctors_qs = hospital.get_doctors().select_related('user').filter(
-            user__is_approved=True,
-            user__is_active=True
-        )
-        # Safe profile image URL per doctor (avoid ValueError when no file)
-        doctors_with_extra = []
-        for doc in doctors_qs:
-            url = None
-            for obj in (doc, doc.user):
-                if getattr(obj, 'profile_picture', None):
-                    try:
-                        url = obj.profile_picture.url
-                        break
-                    except (ValueError, AttributeError):
-                        pass
-            doctors_with_extra.append({'doctor': doc, 'profile_image_url': url})
-        context['doctors'] = doctors_with_extra
-        context['reviews'] = hospital.reviews.select_related('patient').order_by('-created_at')[:20]
+        # Doctor list and latest reviews are cached per hospital (see hospitals.signals)
+        read_model = cache.get_or_build(cache.HOSPITAL, hospital.pk, lambda: self.build_read_model(hospital))
+        context['doctors'] = read_model['doctors']
+        context['reviews'] = read_model['reviews']
 
         # Can patient review? Only if they have completed appointment at this hospital
         can_review = False
@@ -96,15 +102,24 @@ class HospitalDetailView(LoginRequiredMixin, DetailView):
                 req = hospital.doctor_requests.filter(doctor=doc_profile).first()
                 can_request_join = req is None or req.status == 'REJECTED'
         context['can_request_join'] = can_request_join
-        # Safe logo URL (avoid ValueError when no file)
-        context['hospital_logo_url'] = None
-        if getattr(hospital, 'logo', None):
-            try:
-                context['hospital_logo_url'] = hospital.logo.url
-            except (ValueError, AttributeError):
-                pass
         return context
 
+    @staticmethod
+    def build_read_model(hospital):
+        """Approved doctors (with their profile image) and the 20 latest reviews"""
+        doctors_qs = hospital.get_doctors().select_related('user').filter(
+            user__is_approved=True,
+            user__is_active=True
+        )
+        doctors_with_extra = []
+        for doc in doctors_qs:
+            image = next((obj.profile_picture for obj in (doc, doc.user) if obj.profile_picture), None)
+            doctors_with_extra.append({'doctor': doc, 'profile_image': image})
+        return {
+            'doctors': doctors_with_extra,
+            'reviews': list(hospital.reviews.select_related('patient').order_by('-created_at')[:20]),
+        }
+
 
 def submit_review(request, pk):
     """Submit hospital review - patient only, after completed appointment"""
@@ -131,12 +146,14 @@ def submit_review(request, pk):
         try:
             rating = int(rating)
             if 1 <= rating <= 5:
-                HospitalReview.objects.create(
-                    hospital=hospital,
-                    patient=request.user,
-                    rating=rating,
-                    comment=comment
-                )
+                with transaction.atomic():
+                    # Counted in the stored aggregates by hospitals.signals
+                    HospitalReview.objects.create(
+                        hospital=hospital,
+                        patient=request.user,
+                        rating=rating,
+                        comment=comment
+                    )
                 messages.success(request, 'Thank you for your review!')
             else:
                 messages.error(request, 'Rating must be between 1 and 5.')
@@ -0,0 +1,13 @@
+from django.contrib import admin
+from .models import Task, PeriodicSchedule
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_at', 'locked_by', 'finished_at']
+    list_filter = ['status']
+    search_fields = ['name']
+
+
+@admin.register(PeriodicSchedule)
+class PeriodicScheduleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'next_run_at']
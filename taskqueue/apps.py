@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class TaskqueueConfig(AppConfig):
+    name = 'taskqueue'
+
+    def ready(self):
+        # Register every app's tasks (and their periodic schedules) with the queue
+        from django.utils.module_loading import autodiscover_modules
+        autodiscover_modules('tasks')
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from taskqueue.worker import Worker, requeue_stale, run_pending, schedule_periodic
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background tasks (taskqueue) until stopped with SIGTERM/Ctrl-C. Also queues '
+        'periodic tasks when due and re-queues tasks of workers that died. Several workers, on one '
+        'or more hosts, can share the queue.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Tasks run at the same time (default 2)')
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread',
+                            help='Run tasks in threads (I/O-bound work, default) or processes (CPU-bound work)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds an idle slot waits before looking for tasks again')
+        parser.add_argument('--batch', type=int, default=1, help='Tasks claimed at once by each slot')
+        parser.add_argument('--worker-id', default=None, help='Name recorded on claimed tasks (default host:pid)')
+        parser.add_argument('--once', action='store_true', help='Run the tasks due now in this process, then exit')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            requeue_stale()
+            schedule_periodic()
+            done = run_pending(options['worker_id'] or 'once', batch=max(options['batch'], 1))
+            self.stdout.write(self.style.SUCCESS(f'Ran {done} task(s).'))
+            return
+        worker = Worker(
+            concurrency=max(options['concurrency'], 1), pool=options['pool'],
+            poll_interval=options['poll_interval'], batch=max(options['batch'], 1), worker_id=options['worker_id'],
+        )
+        self.stdout.write(f'Worker {worker.worker_id}: {worker.concurrency} {worker.pool} slot(s). Ctrl-C to stop.')
+        worker.run()
+        self.stdout.write('Worker stopped.')
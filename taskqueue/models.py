@@ -0,0 +1,53 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """A queued call of a @task function (taskqueue.queue), run by ``manage.py run_worker``"""
+
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200, help_text='Dotted path of the task function')
+    args = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    priority = models.SmallIntegerField(default=0, help_text='Lower runs first')
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    last_error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'task_queue'
+        indexes = [
+            # Claim order of runnable tasks
+            models.Index(fields=['priority', 'run_at'], condition=Q(status='QUEUED'), name='task_queued_idx'),
+            models.Index(fields=['status', 'locked_at'], name='task_status_locked_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} [{self.status}]"
+
+
+class PeriodicSchedule(models.Model):
+    """Next run of a periodic task; workers advance it with a compare-and-set so one enqueues it"""
+
+    name = models.CharField(max_length=200, primary_key=True)
+    next_run_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'task_schedules'
+
+    def __str__(self):
+        return f"{self.name} at {self.next_run_at}"
@@ -0,0 +1,90 @@
+"""Background tasks stored in the application database.
+
+    from taskqueue.queue import task
+
+    @task(max_attempts=3)
+    def send_report(document_id):
+        ...
+
+    send_report.delay(document.pk)                       # as soon as a worker is free
+    send_report.enqueue(args=[document.pk], countdown=60)  # in a minute
+
+    @task(every=timedelta(minutes=5))
+    def reconcile():                                      # every 5 minutes
+        ...
+
+delay() inserts a Task row in the caller's transaction: if the request rolls
+back, the task was never queued, and a worker cannot see it before the data it
+needs is committed. ``manage.py run_worker`` claims and runs the rows
+(taskqueue.worker). Delivery is at-least-once (a task whose worker died is run
+again after TASK_QUEUE_LEASE), so tasks must be safe to repeat. Arguments are
+stored as JSON: pass ids, not model instances.
+
+With TASK_QUEUE_EAGER = True tasks run in-process right after the commit
+instead, without a worker.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# task name -> TaskFunction
+REGISTRY = {}
+
+
+class TaskFunction:
+    def __init__(self, func, name=None, max_attempts=5, priority=0, every=None):
+        self.func = func
+        self.name = name or f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts
+        self.priority = priority
+        self.every = timedelta(seconds=every) if isinstance(every, (int, float)) else every
+        self.__doc__ = func.__doc__
+        self.__name__ = func.__name__
+
+    def __call__(self, *args, **kwargs):
+        # Calling the task directly runs it inline
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<task {self.name}>'
+
+    def delay(self, *args, **kwargs):
+        return self.enqueue(args=args, kwargs=kwargs)
+
+    def enqueue(self, args=(), kwargs=None, run_at=None, countdown=None, priority=None):
+        """Queue a call; ``run_at`` (datetime) or ``countdown`` (seconds) delays it"""
+        from .models import Task
+        if countdown is not None:
+            run_at = timezone.now() + timedelta(seconds=countdown)
+        if getattr(settings, 'TASK_QUEUE_EAGER', False):
+            transaction.on_commit(lambda: self.func(*args, **(kwargs or {})))
+            return None
+        return Task.objects.create(
+            name=self.name, args=list(args), kwargs=kwargs or {}, run_at=run_at or timezone.now(),
+            priority=self.priority if priority is None else priority, max_attempts=self.max_attempts,
+        )
+
+
+def task(func=None, *, name=None, max_attempts=5, priority=0, every=None):
+    """Make ``func`` a queueable task; ``every`` (timedelta or seconds) also runs it periodically"""
+    def register(func):
+        task_function = TaskFunction(func, name=name, max_attempts=max_attempts, priority=priority, every=every)
+        REGISTRY[task_function.name] = task_function
+        return task_function
+    return register(func) if func is not None else register
+
+
+def resolve(name):
+    """TaskFunction registered as ``name`` (importing its module if needed)"""
+    if name not in REGISTRY:
+        candidate = import_string(name)
+        if isinstance(candidate, TaskFunction):
+            REGISTRY.setdefault(candidate.name, candidate)
+    return REGISTRY[name]
+
+
+def periodic_tasks():
+    return [task_function for task_function in REGISTRY.values() if task_function.every]
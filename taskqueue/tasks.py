@@ -0,0 +1,14 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Task
+from .queue import task
+
+
+@task(every=timedelta(hours=6))
+def purge_finished():
+    """Delete finished tasks older than TASK_QUEUE_KEEP_FINISHED seconds (failed ones are kept)"""
+    cutoff = timezone.now() - timedelta(seconds=settings.TASK_QUEUE_KEEP_FINISHED)
+    return Task.objects.filter(status='DONE', finished_at__lt=cutoff).delete()[0]
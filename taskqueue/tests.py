@@ -0,0 +1,141 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import PeriodicSchedule, Task
+from .queue import REGISTRY, task
+from .worker import claim, execute, requeue_stale, run_pending, schedule_periodic
+
+calls = []
+
+
+@task(max_attempts=2)
+def record(value, suffix=''):
+    calls.append(f'{value}{suffix}')
+
+
+@task(max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+@task(every=timedelta(minutes=5))
+def tick():
+    calls.append('tick')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def tearDown(self):
+        # Keep periodic tasks of other apps out of schedule_periodic() in other tests
+        PeriodicSchedule.objects.all().delete()
+
+    def test_delay_queues_row_run_by_worker(self):
+        queued = record.delay(1, suffix='x')
+        self.assertEqual((queued.name, queued.args, queued.kwargs), ('taskqueue.tests.record', [1], {'suffix': 'x'}))
+        self.assertEqual(calls, [])
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, ['1x'])
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('DONE', 1))
+        self.assertIs(REGISTRY['taskqueue.tests.record'], record)
+
+    def test_delayed_and_priority_order(self):
+        record.enqueue(args=['later'], countdown=60)
+        record.enqueue(args=['low'], priority=5)
+        record.enqueue(args=['high'], priority=-5)
+        run_pending()
+        self.assertEqual(calls, ['high', 'low'])
+
+    def test_failure_retries_with_backoff_then_fails(self):
+        queued = explode.delay()
+        with self.assertLogs('taskqueue.worker', 'WARNING'):
+            run_pending()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('QUEUED', 1))
+        self.assertIn('RuntimeError: boom', queued.last_error)
+        self.assertGreater(queued.run_at, timezone.now() + timedelta(seconds=20))
+
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        with self.assertLogs('taskqueue.worker', 'ERROR'):
+            run_pending()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('FAILED', 2))
+        self.assertIsNotNone(queued.finished_at)
+
+    def test_unknown_task_fails_without_retry(self):
+        queued = Task.objects.create(name='taskqueue.tests.missing')
+        with self.assertLogs('taskqueue.worker', 'ERROR'):
+            run_pending()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('FAILED', 1))
+
+    def test_claimed_task_is_not_claimed_again(self):
+        record.delay('once')
+        self.assertEqual(len(claim('a', batch=5)), 1)
+        self.assertEqual(claim('b', batch=5), [])
+
+    def test_stale_running_task_is_requeued(self):
+        record.delay('again')
+        [claimed] = claim('dead-worker')
+        self.assertEqual(requeue_stale(), 0)
+        later = timezone.now() + timedelta(hours=1)
+        self.assertEqual(requeue_stale(now=later), 1)
+        requeued = Task.objects.get(pk=claimed.pk)
+        self.assertEqual(requeued.status, 'QUEUED')
+        self.assertGreater(requeued.run_at, later + timedelta(seconds=20))
+        Task.objects.filter(pk=claimed.pk).update(run_at=timezone.now())
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, ['again'])
+
+    def test_stale_task_without_attempts_left_fails(self):
+        record.delay('crash')
+        claim('dead-worker')
+        Task.objects.update(run_at=timezone.now(), status='QUEUED')
+        [claimed] = claim('dead-worker-2')
+        self.assertEqual(claimed.attempts, 2)
+        with self.assertLogs('taskqueue.worker', 'ERROR'):
+            self.assertEqual(requeue_stale(now=timezone.now() + timedelta(hours=1)), 0)
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, 'FAILED')
+        self.assertEqual(claimed.last_error, 'Worker lease expired')
+        self.assertIsNotNone(claimed.finished_at)
+        self.assertEqual(run_pending(), 0)
+        self.assertEqual(calls, [])
+
+    def test_lost_lease_result_is_not_recorded(self):
+        record.delay('late')
+        [claimed] = claim('slow-worker')
+        requeue_stale(now=timezone.now() + timedelta(hours=1))
+        # The worker whose lease expired finishing late does not overwrite the new state
+        execute(claimed, 'slow-worker')
+        self.assertEqual(Task.objects.get(pk=claimed.pk).status, 'QUEUED')
+
+    def test_periodic_task_is_queued_once_per_interval(self):
+        now = timezone.now()
+        schedule_periodic(now=now)
+        schedule_periodic(now=now + timedelta(minutes=1))
+        self.assertEqual(Task.objects.filter(name='taskqueue.tests.tick').count(), 1)
+        schedule_periodic(now=now + timedelta(minutes=6))
+        self.assertEqual(Task.objects.filter(name='taskqueue.tests.tick').count(), 2)
+
+    @override_settings(TASK_QUEUE_EAGER=True)
+    def test_eager_runs_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(record.delay('now'))
+        self.assertEqual(calls, ['now'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_run_worker_once(self):
+        record.delay('cmd')
+        out = StringIO()
+        call_command('run_worker', '--once', stdout=out)
+        self.assertIn('tick', calls)
+        self.assertIn('cmd', calls)
+        self.assertTrue(PeriodicSchedule.objects.filter(name='hospitals.tasks.reconcile_beds').exists())
+        self.assertFalse(Task.objects.exclude(status='DONE').exists())
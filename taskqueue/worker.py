@@ -0,0 +1,230 @@
+"""Claiming and running queued tasks (see taskqueue.queue).
+
+Claiming marks up to ``batch`` runnable rows RUNNING under the worker's id.
+On databases with ``SELECT ... FOR UPDATE SKIP LOCKED`` (PostgreSQL, MySQL 8,
+Oracle) concurrent workers skip each other's rows without waiting. SQLite has
+no row locks but serialises writers, so each candidate is claimed with a
+compare-and-set UPDATE (``WHERE status = 'QUEUED'``) and a row another worker
+won is simply skipped.
+
+A failed task is retried after an exponential backoff until ``max_attempts``.
+RUNNING rows whose lease (TASK_QUEUE_LEASE seconds) expired belong to a worker
+that died; they are queued again with the same backoff, or FAILED once they
+have used up ``max_attempts`` (a task that kills its worker is not run forever).
+"""
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PeriodicSchedule, Task
+from .queue import periodic_tasks, resolve
+
+logger = logging.getLogger(__name__)
+
+HOUSEKEEPING_INTERVAL = 30
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _skip_locked_supported():
+    return connections[router.db_for_write(Task)].features.has_select_for_update_skip_locked
+
+
+def claim(worker_id, batch=1):
+    """Mark up to ``batch`` due tasks RUNNING for ``worker_id`` and return them"""
+    now = timezone.now()
+    due = Task.objects.filter(status='QUEUED', run_at__lte=now).order_by('priority', 'run_at', 'id')
+    running = {'status': 'RUNNING', 'locked_by': worker_id, 'locked_at': now, 'attempts': F('attempts') + 1}
+    if _skip_locked_supported():
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:batch])
+            Task.objects.filter(id__in=ids).update(**running)
+    else:
+        ids = []
+        for pk in due.values_list('id', flat=True)[:batch * 4]:
+            if Task.objects.filter(id=pk, status='QUEUED').update(**running):
+                ids.append(pk)
+                if len(ids) == batch:
+                    break
+    return list(Task.objects.filter(id__in=ids).order_by('priority', 'run_at', 'id'))
+
+
+def backoff(attempts):
+    """Seconds before retry number ``attempts``: 30s, 1m, 2m, ... up to TASK_QUEUE_MAX_BACKOFF, +-20%"""
+    delay = min(settings.TASK_QUEUE_RETRY_DELAY * 2 ** (attempts - 1), settings.TASK_QUEUE_MAX_BACKOFF)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def execute(task, worker_id):
+    """Run one claimed task and record the outcome; returns True on success"""
+    owned = Task.objects.filter(pk=task.pk, locked_by=worker_id, status='RUNNING')
+    try:
+        func = resolve(task.name).func
+    except (ImportError, KeyError):
+        # An unknown task name cannot succeed on a retry
+        owned.update(status='FAILED', last_error=f'Unknown task {task.name}', finished_at=timezone.now(),
+                     locked_by='', locked_at=None)
+        logger.error('Task %s has unknown name %s', task.pk, task.name)
+        return False
+    try:
+        func(*task.args, **task.kwargs)
+    except Exception:
+        now = timezone.now()
+        error = traceback.format_exc(limit=20)
+        if task.attempts >= task.max_attempts:
+            owned.update(status='FAILED', last_error=error, finished_at=now, locked_by='', locked_at=None)
+            logger.error('Task %s (%s) failed after %s attempt(s)', task.pk, task.name, task.attempts, exc_info=True)
+        else:
+            run_at = now + timedelta(seconds=backoff(task.attempts))
+            owned.update(status='QUEUED', last_error=error, run_at=run_at, locked_by='', locked_at=None)
+            logger.warning('Task %s (%s) failed, retrying at %s', task.pk, task.name, run_at, exc_info=True)
+        return False
+    owned.update(status='DONE', finished_at=timezone.now(), last_error='', locked_by='', locked_at=None)
+    return True
+
+
+def requeue_stale(now=None):
+    """Queue RUNNING tasks again whose worker has held them longer than the lease, or fail
+    them if they have no attempts left; returns how many were requeued"""
+    now = now or timezone.now()
+    stale = Task.objects.filter(status='RUNNING', locked_at__lt=now - timedelta(seconds=settings.TASK_QUEUE_LEASE))
+    error = 'Worker lease expired'
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='FAILED', last_error=error, finished_at=now, locked_by='', locked_at=None,
+    )
+    if failed:
+        logger.error('%s task(s) failed after their worker died on the last attempt', failed)
+    requeued = 0
+    for pk, locked_by, attempts in stale.values_list('pk', 'locked_by', 'attempts'):
+        # Guarded by the lease holder, in case the worker finishes meanwhile
+        requeued += Task.objects.filter(pk=pk, status='RUNNING', locked_by=locked_by).update(
+            status='QUEUED', last_error=error, run_at=now + timedelta(seconds=backoff(attempts)),
+            locked_by='', locked_at=None,
+        )
+    return requeued
+
+
+def schedule_periodic(now=None):
+    """Queue each periodic task that is due; returns how many were queued"""
+    now = now or timezone.now()
+    queued = 0
+    for task_function in periodic_tasks():
+        schedule, _ = PeriodicSchedule.objects.get_or_create(name=task_function.name, defaults={'next_run_at': now})
+        if schedule.next_run_at > now:
+            continue
+        with transaction.atomic():
+            # Only the worker that moves next_run_at on queues the run
+            if PeriodicSchedule.objects.filter(name=schedule.name, next_run_at=schedule.next_run_at).update(
+                next_run_at=now + task_function.every,
+            ):
+                task_function.delay()
+                queued += 1
+    return queued
+
+
+def run_pending(worker_id='inline', batch=10):
+    """Run every due task in this process until none are left (tests, ``run_worker --once``)"""
+    done = 0
+    while tasks := claim(worker_id, batch):
+        for task in tasks:
+            execute(task, worker_id)
+            done += 1
+    return done
+
+
+def work_loop(worker_id, stop, poll_interval=1.0, batch=1):
+    """Claim and run tasks until ``stop`` is set (one pool slot)"""
+    while not stop.is_set():
+        try:
+            tasks = claim(worker_id, batch)
+            for task in tasks:
+                execute(task, worker_id)
+        except Exception:
+            # Database unavailable or similar: keep the slot alive
+            logger.exception('Worker %s could not claim tasks', worker_id)
+            tasks = []
+        finally:
+            close_old_connections()
+        if not tasks:
+            stop.wait(poll_interval)
+
+
+def _process_slot(worker_id, stop, poll_interval, batch):
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        # Spawned (not forked) child
+        django.setup()
+    # The parent stops the slots through ``stop``, after their current task
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    work_loop(worker_id, stop, poll_interval, batch)
+
+
+class Worker:
+    """``concurrency`` slots (threads or processes) running work_loop, plus housekeeping
+    (periodic schedules, stale leases) in the main thread"""
+
+    def __init__(self, concurrency=2, pool='thread', poll_interval=1.0, batch=1, worker_id=None):
+        self.concurrency = concurrency
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.batch = batch
+        self.worker_id = worker_id or default_worker_id()
+        # Set from signal handlers, so never a multiprocessing Event (its lock is not reentrant)
+        self.stopping = threading.Event()
+        if pool == 'process':
+            import multiprocessing
+            self.mp = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+            self.slot_stop = self.mp.Event()
+        else:
+            self.slot_stop = threading.Event()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        slots = []
+        if self.pool == 'process':
+            # Children must open their own connections
+            connections.close_all()
+        for n in range(self.concurrency):
+            args = (f'{self.worker_id}/{n}', self.slot_stop, self.poll_interval, self.batch)
+            if self.pool == 'process':
+                slot = self.mp.Process(target=_process_slot, args=args, daemon=True)
+            else:
+                slot = threading.Thread(target=work_loop, args=args, daemon=True)
+            slot.start()
+            slots.append(slot)
+        try:
+            next_housekeeping = 0
+            while not self.stopping.wait(0.5):
+                if time.monotonic() < next_housekeeping:
+                    continue
+                try:
+                    schedule_periodic()
+                    requeue_stale()
+                except Exception:
+                    logger.exception('Task queue housekeeping failed')
+                finally:
+                    close_old_connections()
+                next_housekeeping = time.monotonic() + HOUSEKEEPING_INTERVAL
+        finally:
+            self.slot_stop.set()
+            for slot in slots:
+                slot.join()